@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+下载流程端到端吞吐量基准测试
+
+使用离线替身服务器（scripts/jm_offline_server.py）提供合成的本子，
+通过 download_album / download_batch 走完整的下载流程（请求、解密、写盘、插件），
+并对以下配置做组合测试:
+- download.threading.image
+- download.threading.photo
+- download.image.decode 开/关
+- 缓存模式: off（不使用缓存）、client（client.cache）、disk（download.cache，图片已存在时跳过）
+
+每个组合输出 图片/秒、MB/秒、峰值RSS、峰值线程数、单张图片耗时的p50/p99，
+结果为json，带有git提交号，可以保存下来和其他提交的结果对比。
+
+服务器默认运行在子进程中，避免和下载流程抢占GIL。
+
+用法:
+    python scripts/bench_download_pipeline.py --output bench.json
+    python scripts/bench_download_pipeline.py --image-threads 10 30 --decode on --cache off --compare bench.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scripts'))
+
+CACHE_MODES = ('off', 'client', 'disk')
+
+
+def run_server(dataset_kwargs, fault_kwargs, queue):
+    from jm_offline_server import OfflineDataset, OfflineJmServer
+
+    server = OfflineJmServer(OfflineDataset(**dataset_kwargs))
+    server.set_fault(**fault_kwargs)
+    server.prepare_images()
+    server.start()
+    queue.put(server.port)
+    threading.Event().wait()
+
+
+class BenchServer:
+    """
+    在子进程或当前进程中运行离线服务器
+    """
+
+    def __init__(self, dataset_kwargs, fault_kwargs, in_process=False):
+        from jm_offline_server import OfflineDataset, OfflineJmServer
+
+        self.process = None
+        if in_process:
+            self.server = OfflineJmServer(OfflineDataset(**dataset_kwargs))
+            self.server.set_fault(**fault_kwargs)
+            self.server.prepare_images()
+            self.server.start()
+            return
+
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.Queue()
+        self.process = ctx.Process(target=run_server, args=(dataset_kwargs, fault_kwargs, queue), daemon=True)
+        self.process.start()
+        # 子进程里只跑服务，这里用同样的参数构造一个不启动的server，用来生成option
+        self.server = OfflineJmServer(OfflineDataset(**dataset_kwargs), port=queue.get(timeout=300))
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+        else:
+            self.server.stop()
+
+
+class ResourceSampler:
+    """
+    后台采样RSS和线程数的峰值
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        from jmcomic.jm_profiler import JmMemoryTracker
+        self.peak_rss = max(self.peak_rss, JmMemoryTracker.current_rss() or 0)
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+
+
+def new_timing_downloader():
+    """
+    记录每张图片耗时的Downloader
+    """
+    from jmcomic import JmDownloader
+
+    class TimingDownloader(JmDownloader):
+        image_latencies = []
+        lock = threading.Lock()
+
+        def download_by_image_detail(self, image):
+            start = time.perf_counter()
+            try:
+                return super().download_by_image_detail(image)
+            finally:
+                cost = time.perf_counter() - start
+                with self.lock:
+                    self.image_latencies.append(cost)
+
+    return TimingDownloader
+
+
+def image_bytes_total():
+    from jmcomic import JmMetrics
+    return JmMetrics.counter('jm_download_bytes_total', '下载的字节数', ('kind',)).snapshot().get('image', 0)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_scenario(bench_server: BenchServer, args, image_threads, photo_threads, decode, cache):
+    from jmcomic import download_album, JmModuleConfig, CacheRegistry
+
+    server = bench_server.server
+    base_dir = tempfile.mkdtemp(prefix='jm_bench_')
+    threading_conf = {'image': image_threads}
+    if photo_threads is not None:
+        # 不配置时使用默认值（CPU核数）
+        threading_conf['photo'] = photo_threads
+
+    option = server.new_option(
+        base_dir,
+        impl=args.impl,
+        postman_type=args.postman,
+        download={
+            'cache': cache == 'disk',
+            'image': {'decode': decode},
+            'threading': threading_conf,
+        },
+        cache=True if cache == 'client' else None,
+    )
+
+    downloader = new_timing_downloader()
+    album_ids = server.dataset.album_ids
+
+    def download():
+        if args.api == 'batch':
+            download_album(album_ids, option, downloader)
+        else:
+            for aid in album_ids:
+                download_album(aid, option, downloader)
+
+    if cache == 'disk':
+        # 先完整下载一次，计时的那一轮图片都已存在
+        download()
+
+    downloader.image_latencies = []
+    JmModuleConfig.SCRAMBLE_CACHE.clear()
+    CacheRegistry.REGISTRY.clear()
+    bytes_before = image_bytes_total()
+
+    try:
+        with ResourceSampler() as sampler:
+            start = time.perf_counter()
+            download()
+            cost = time.perf_counter() - start
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+    latencies = downloader.image_latencies
+    mb = (image_bytes_total() - bytes_before) / 1024 / 1024
+    return {
+        'key': f'image={image_threads},photo={photo_threads},decode={"on" if decode else "off"},cache={cache}',
+        'image_threads': image_threads,
+        'photo_threads': photo_threads,
+        'decode': decode,
+        'cache': cache,
+        'images': len(latencies),
+        'seconds': round(cost, 3),
+        'img_per_s': round(len(latencies) / cost, 1),
+        'mb_per_s': round(mb / cost, 2),
+        'peak_rss_mb': round(sampler.peak_rss / 1024 / 1024, 1),
+        'peak_threads': sampler.peak_threads,
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+    }
+
+
+def median_result(results):
+    """
+    多次运行取各数值的中位数
+    """
+    ret = dict(results[0])
+    for k, v in ret.items():
+        if isinstance(v, float):
+            ret[k] = round(statistics.median(r[k] for r in results), 3)
+    return ret
+
+
+def git_revision():
+    def git(*cmd):
+        try:
+            return subprocess.run(['git', *cmd], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return None
+
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def compare(results, baseline_file):
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {r['key']: r for r in json.load(f)['results']}
+
+    print(f'\n对比基线: {baseline_file}', file=sys.stderr)
+    for r in results:
+        old = baseline.get(r['key'], None)
+        if old is None or not old['img_per_s']:
+            continue
+        change = (r['img_per_s'] - old['img_per_s']) / old['img_per_s']
+        print(f'{r["key"]:<48}{old["img_per_s"]:>10} → {r["img_per_s"]:<10}{change:+.1%}', file=sys.stderr)
+
+
+def parse_photo_threads(value):
+    return None if value == 'auto' else int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='下载流程端到端吞吐量基准测试')
+    parser.add_argument('--albums', type=int, default=4, help='本子数')
+    parser.add_argument('--photos', type=int, default=3, help='每个本子的章节数')
+    parser.add_argument('--images', type=int, default=20, help='每个章节的图片数')
+    parser.add_argument('--image-size', default='800x1200', help='图片尺寸，宽x高')
+    parser.add_argument('--latency', type=float, default=0.02, help='服务器每个响应的延迟（秒）')
+    parser.add_argument('--bandwidth', type=int, default=0, help='单个响应的带宽上限（KB/s），0为不限制')
+    parser.add_argument('--image-threads', type=int, nargs='+', default=[10, 30])
+    parser.add_argument('--photo-threads', type=parse_photo_threads, nargs='+', default=[None],
+                        help='章节并发数，auto表示使用默认值')
+    parser.add_argument('--decode', choices=['on', 'off'], nargs='+', default=['on', 'off'])
+    parser.add_argument('--cache', choices=CACHE_MODES, nargs='+', default=list(CACHE_MODES))
+    parser.add_argument('--impl', choices=['api', 'html'], default='api')
+    parser.add_argument('--postman', default='curl_cffi', help='client.postman.type')
+    parser.add_argument('--api', choices=['album', 'batch'], default='batch',
+                        help='album: 逐个调用download_album，batch: 一次性download_batch')
+    parser.add_argument('--repeat', type=int, default=1, help='每个组合运行的次数，取中位数')
+    parser.add_argument('--in-process', action='store_true', help='服务器和下载运行在同一进程')
+    parser.add_argument('--output', help='把结果写入json文件')
+    parser.add_argument('--compare', help='和之前保存的结果对比')
+    args = parser.parse_args()
+
+    from jmcomic import disable_jm_log
+    disable_jm_log()
+
+    width, height = map(int, args.image_size.lower().split('x'))
+    dataset_kwargs = dict(album_count=args.albums, photos_per_album=args.photos,
+                          images_per_photo=args.images, image_size=(width, height))
+    fault_kwargs = dict(latency=args.latency, bandwidth=args.bandwidth * 1024)
+
+    bench_server = BenchServer(dataset_kwargs, fault_kwargs, args.in_process)
+    results = []
+    try:
+        for image_threads, photo_threads, decode, cache in itertools.product(
+                args.image_threads, args.photo_threads, args.decode, args.cache):
+            runs = [run_scenario(bench_server, args, image_threads, photo_threads, decode == 'on', cache)
+                    for _ in range(args.repeat)]
+            result = median_result(runs)
+            results.append(result)
+            print(f'{result["key"]:<48}{result["img_per_s"]:>8} img/s{result["mb_per_s"]:>8} MB/s'
+                  f'  p50 {result["p50_ms"]}ms  p99 {result["p99_ms"]}ms'
+                  f'  rss {result["peak_rss_mb"]}MB  threads {result["peak_threads"]}',
+                  file=sys.stderr)
+    finally:
+        bench_server.stop()
+
+    report = {
+        'git': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'results': results,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
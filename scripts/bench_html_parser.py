@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+网页端解析（正则）基准测试
+
+JmcomicText.reflect_new_instance 和 JmPageTool 会对完整的网页html执行几十个正则，
+其中使用 [\\s\\S]*? 的正则在页面结构变化、页面被截断时可能退化成 O(n²)。
+
+本脚本:
+1. 对语料中的每个页面，统计每个正则的耗时（按解析器实际的用法: search / findall / 先缩小范围再findall），
+   以及完整解析一个页面的耗时。
+2. 检测病态输入: 对内置的各种畸形页面（缺少章节标题、缺少标签div、页面截断等），
+   按 --scales 逐步放大页面，根据耗时随页面长度的增长率判断正则是否超线性。
+   增长指数 >= --max-exponent 且耗时 >= --min-ms 的组合视为病态，脚本返回非0。
+3. 检查本子/章节页面按区域解析（JmcomicText.html_field_regions）和全文解析的结果是否一致，不一致时脚本返回非0。
+
+语料:
+- 内置的合成页面（结构参照禁漫网页，带有脚本、推荐本子等填充内容），可以用 --scale 放大
+- --corpus 指定的目录中保存的真实页面，文件名以 album / photo / search / category / favorite 开头，
+  每个真实页面还会额外生成截断到 25% / 50% / 75% 的版本
+
+用法:
+    python scripts/bench_html_parser.py
+    python scripts/bench_html_parser.py --corpus ./saved_pages --output parser.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+PAGE_KINDS = ('album', 'photo', 'search', 'category', 'favorite', 'json', 'pub')
+
+
+# 合成页面
+
+def padding(kb):
+    """
+    页面中和解析无关的内容: 压缩过的js、推荐本子、广告位，长度约为kb千字节
+    """
+    script = ('!function(e,t){var n=e||{},r=t&&t.a||0;for(var i in n){if(n[i]||r){r++}}'
+              'return{a:r,b:"x|y|z"}}(window,{a:1});\n')
+    related = ('<div class="col-xs-6 col-sm-3 list-col">\n'
+               '<div class="thumb-overlay">\n'
+               '<a href="/album/{id}/related-{id}">\n'
+               '<img class="lazy_img img-responsive" data-original="/media/albums/{id}_3x4.jpg" title="推荐本子{id}" alt="">\n'
+               '</a>\n</div>\n'
+               '<span class="video-title title-truncate">推荐本子{id}</span>\n'
+               '</div>\n')
+    chunks = []
+    size = 0
+    i = 0
+    while size < kb * 1024:
+        chunk = f'<script>{script * 5}</script>\n' + related.format(id=100000 + i)
+        chunks.append(chunk)
+        size += len(chunk)
+        i += 1
+    return ''.join(chunks)
+
+
+def album_page(scale=1, broken=None):
+    episodes = []
+    for i in range(1, 50 * scale + 1):
+        title = f'Ch.{i} 章节{i}' if broken == 'episode_title' else f'第{i}話 章节{i}'
+        episodes.append(f'<a href="/photo/{500000 + i}" data-album="{500000 + i}">\n'
+                        f'<li class="list-group-item visible-lg visible-md">\n{title}\n'
+                        f'<span class="hidden-xs" style="float: right">2024-01-01</span>\n</li>\n</a>\n')
+
+    tags = ''.join(f'<a href="/search/photos?search_query=tag{i}" target="_blank">tag{i}</a>\n' for i in range(10))
+    return f'''<html><head><title>本子名称|禁漫天堂</title></head><body>
+{padding(60 * scale)}
+<h1 class="book-name" id="book-name">本子名称</h1>
+<span class="number">禁漫車號：JM500000</span>
+<span class="pagecount">頁數:{50 * scale * 20}</span>
+<span itemprop="datePublished">上架日期 : 2024-01-01</span>
+<span itemprop="dateModified">更新日期 : 2024-01-02</span>
+<span itemprop="author" data-type="works">{tags}</span>
+<span itemprop="author" data-type="actor">{tags}</span>
+<span itemprop="genre" data-type="tags">{tags}</span>
+<span itemprop="author" data-type="author">{tags}</span>
+<span id="albim_likes_500000">1.2K</span>
+<span>3.4K</span>
+<span>次觀看</span>
+<div class="badge" id="total_video_comments">12</div>
+<h2 class="p-t-5 p-b-5">叙述：本子描述</h2>
+<div class="episode">
+<ul class="btn-toolbar">
+{''.join(episodes)}</ul>
+</div>
+{padding(60 * scale)}
+<script>
+var scramble_id = 220980;
+</script>
+</body></html>'''
+
+
+def photo_page(scale=1, broken=None):
+    images = [f'{i:05d}.webp' for i in range(1, 30 * scale + 1)]
+    title = '章节名称 禁漫天堂' if broken == 'title_bar' else '章节名称|禁漫天堂'
+    return f'''<html><head><title>{title}</title>
+<meta property="og:url" content="https://18comic.vip/photo/500001/">
+<meta name="keywords" content="tag1,tag2,tag3">
+</head><body>
+{padding(80 * scale)}
+<img src="https://cdn-msp.jmapinodeudzn.net/media/albums/blank.jpg">
+<img data-original="https://cdn-msp.jmapinodeudzn.net/media/photos/500001/{images[0]}" class="lazy_img" id="album_photo_{images[0]}" data-page="0">
+{padding(80 * scale)}
+<script>
+var scramble_id = 220980;
+var series_id = 500000;
+var sort = 1;
+var page_arr = {json.dumps(images)};
+</script>
+</body></html>'''
+
+
+def search_page(scale=1, broken=None):
+    items = []
+    for i in range(80 * scale):
+        tags = ''.join(f'<a class="tag" href="/search/photos?search_query=tag{j}">tag{j}</a>' for j in range(6))
+        tag_div = '' if broken == 'tags' else f'<div class="title-truncate tags ">\n{tags}\n</div>\n'
+        items.append(f'''<div class="col-xs-6 col-sm-6 col-md-4 col-lg-3 list-col">
+<div class="thumb-overlay-albums">
+<a href="/album/{500000 + i}/search-{i}">
+<img class="lazy_img img-responsive" title="搜索结果{i}" alt="搜索结果{i}">
+</a>
+<div class="label-category">同人</div>
+<div class="label-sub">漢化</div>
+</div>
+<span class="video-title title-truncate">搜索结果{i}</span>
+{tag_div}</div>
+''')
+
+    return f'''<html><body>
+{padding(40 * scale)}
+<div class="well well-sm">
+<span class="text-white">{len(items)}</span> A漫.
+{''.join(items)}<div class="row">
+{padding(40 * scale)}
+</div>
+</div>
+</body></html>'''
+
+
+def category_page(scale=1, broken=None):
+    items = []
+    for i in range(80 * scale):
+        tags = ''.join(f'<a class="tag" href="/search/photos?search_query=tag{j}">tag{j}</a>' for j in range(6))
+        end = '' if broken == 'clearfix' else '<div class="clearfix"></div>\n'
+        items.append(f'''<div class="thumb-overlay-albums">
+<a href="/album/{500000 + i}/category-{i}">
+<img class="lazy_img" title="分类结果{i}" alt="">
+</a>
+<div class="label-loveicon">
+{tags}
+</div>
+{end}</div>
+''')
+
+    return f'''<html><body>
+<span class="text-white">{len(items)}</span> A漫.
+{padding(40 * scale)}
+{''.join(items)}
+{padding(40 * scale)}
+</body></html>'''
+
+
+def favorite_page(scale=1, broken=None):
+    items = []
+    for i in range(40 * scale):
+        title = '' if broken == 'title' else f'<div class="video-title title-truncate">收藏本子{i}</div>\n'
+        items.append(f'''<div id="favorites_album_{500000 + i}" class="col-xs-6">
+<div class="thumb-overlay">
+<a href="/album/{500000 + i}/favorite-{i}">
+<img class="lazy_img" alt="">
+</a>
+</div>
+{title}</div>
+''')
+
+    return f'''<html><body>
+<div class="pull-left"> : {len(items)} / 400</div>
+{padding(40 * scale)}
+{''.join(items)}
+<select class="user-select" name="movefolder-fid">
+<option value="0">全部</option>
+<option value="1">收藏夹1</option>
+</select>
+{padding(40 * scale)}
+</body></html>'''
+
+
+def json_text(scale=1, broken=None):
+    data = {'code': 200, 'data': {'list': [{'id': str(i), 'name': f'本子{i}', 'tags': ['a', 'b']}
+                                           for i in range(200 * scale)]}}
+    text = 'PHP Notice: something happened\n' + json.dumps(data, ensure_ascii=False)
+    if broken == 'truncated':
+        # 接口返回值在传输中被截断，后半部分没有任何 }
+        text = text[:text.index('"list"')] + '"list": [' + '{"id": "1", "tags": [' * (200 * scale)
+    return text
+
+
+def pub_page(scale=1, broken=None):
+    domains = ''.join(f'<a href="https://jm{i}-comic.vip/">jm{i}-comic.vip</a>\n' for i in range(10))
+    token = ''
+    if broken == 'long_token':
+        # 页面中内联的长标识符（例如无分隔符的hex字符串），中间没有 .
+        token = 'a1b2c3d4-' * (2000 * scale)
+    return f'<html><body>{padding(20 * scale)}<div>{token}</div>{domains}</body></html>'
+
+
+GENERATORS = {
+    'album': album_page,
+    'photo': photo_page,
+    'search': search_page,
+    'category': category_page,
+    'favorite': favorite_page,
+    'json': json_text,
+    'pub': pub_page,
+}
+
+# 用于检测病态输入的畸形页面: (名称, 页面类型, broken参数)
+PATHOLOGICAL_CASES = [
+    ('album', 'album', None),
+    ('album-episode-without-title', 'album', 'episode_title'),
+    ('photo', 'photo', None),
+    ('photo-title-without-bar', 'photo', 'title_bar'),
+    ('search', 'search', None),
+    ('search-without-tags', 'search', 'tags'),
+    ('category', 'category', None),
+    ('category-without-clearfix', 'category', 'clearfix'),
+    ('favorite', 'favorite', None),
+    ('favorite-without-title', 'favorite', 'title'),
+    ('json-truncated', 'json', 'truncated'),
+    ('pub-long-token', 'pub', 'long_token'),
+]
+
+
+# 解析器中的正则
+
+def page_patterns(kind):
+    """
+    返回 [(正则名, pattern, 用法)]，用法和解析器中一致:
+    search: 取第一个匹配；findall: 取所有匹配；narrow: 先用前面的正则缩小范围，再用最后一个findall；
+    json: 和 try_parse_json_object 一样，只在最后一个 } 之前finditer
+    """
+    from jmcomic import JmcomicText, JmPageTool
+
+    if kind == 'json':
+        return [('pattern_api_response_json_object', JmcomicText.pattern_api_response_json_object, 'json')]
+    if kind == 'pub':
+        return [('pattern_html_jm_pub_domain', JmcomicText.pattern_html_jm_pub_domain, 'findall')]
+
+    if kind in ('album', 'photo'):
+        clazz, prefixes = JmcomicText, (f'pattern_html_{kind}_',)
+    elif kind == 'search':
+        clazz, prefixes = JmPageTool, ('pattern_html_search_',)
+    elif kind == 'category':
+        clazz, prefixes = JmPageTool, ('pattern_html_category_', 'pattern_html_search_total', 'pattern_html_search_tags')
+    else:
+        clazz, prefixes = JmPageTool, ('pattern_html_favorite_',)
+
+    ret = []
+    for name, pattern in vars(clazz).items():
+        if not name.startswith(prefixes):
+            continue
+        if isinstance(pattern, tuple):
+            pattern = pattern[0]
+        if isinstance(pattern, list):
+            usage = 'narrow'
+        elif name.endswith(('_list', '_content', '_tags')):
+            usage = 'findall'
+        else:
+            usage = 'search'
+        ret.append((name, pattern, usage))
+    return ret
+
+
+def apply_pattern(pattern, usage, text):
+    if usage == 'search':
+        return pattern.search(text)
+    if usage == 'findall':
+        return pattern.findall(text)
+    if usage == 'json':
+        return list(pattern.finditer(text, 0, text.rfind('}') + 1))
+
+    for p in pattern[:-1]:
+        match = p.search(text)
+        if match is None:
+            return None
+        text = match[0]
+    return pattern[-1].findall(text)
+
+
+def parse_page(kind, text):
+    from jmcomic import JmcomicText, JmPageTool
+
+    if kind == 'album':
+        return JmcomicText.analyse_jm_album_html(text)
+    if kind == 'photo':
+        return JmcomicText.analyse_jm_photo_html(text)
+    if kind == 'search':
+        return JmPageTool.parse_html_to_search_page(text)
+    if kind == 'category':
+        return JmPageTool.parse_html_to_category_page(text)
+    if kind == 'favorite':
+        return JmPageTool.parse_html_to_favorite_page(text)
+    if kind == 'json':
+        return JmcomicText.try_parse_json_object(text)
+    return JmcomicText.analyse_jm_pub_html(text)
+
+
+def measure(func, min_time=0.05, max_repeat=20):
+    """
+    多次运行取最小值（毫秒），单次耗时超过min_time时只运行一次
+    """
+    best = None
+    total = 0.0
+    repeat = 0
+    while repeat < max_repeat and (repeat == 0 or total < min_time):
+        start = time.perf_counter()
+        func()
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+        total += cost
+        repeat += 1
+    return best * 1000
+
+
+# 语料
+
+def load_corpus(corpus_dir):
+    """
+    读取保存的页面，返回 [(名称, 页面类型, 文本)]
+    """
+    ret = []
+    for filename in sorted(os.listdir(corpus_dir)):
+        kind = next((k for k in PAGE_KINDS if filename.startswith(k)), None)
+        if kind is None:
+            print(f'[WARN] 无法从文件名判断页面类型，跳过: {filename}', file=sys.stderr)
+            continue
+        with open(os.path.join(corpus_dir, filename), 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        ret.append((filename, kind, text))
+        for percent in (25, 50, 75):
+            ret.append((f'{filename}[:{percent}%]', kind, text[:len(text) * percent // 100]))
+    return ret
+
+
+def builtin_corpus(scale):
+    return [(f'{name}@x{scale}', kind, GENERATORS[kind](scale, broken))
+            for name, kind, broken in PATHOLOGICAL_CASES]
+
+
+def bench_corpus(corpus):
+    """
+    每个页面: 每个正则的耗时 + 完整解析的耗时
+    """
+    rows = []
+    for name, kind, text in corpus:
+        for pattern_name, pattern, usage in page_patterns(kind):
+            rows.append({
+                'page': name,
+                'kind': kind,
+                'size_kb': round(len(text) / 1024, 1),
+                'pattern': pattern_name,
+                'ms': round(measure(lambda: apply_pattern(pattern, usage, text)), 3),
+            })
+
+        error = None
+
+        def parse():
+            nonlocal error
+            try:
+                parse_page(kind, text)
+            except Exception as e:
+                error = type(e).__name__
+
+        rows.append({
+            'page': name,
+            'kind': kind,
+            'size_kb': round(len(text) / 1024, 1),
+            'pattern': '<parse>',
+            'ms': round(measure(parse), 3),
+            'error': error,
+        })
+    return rows
+
+
+def check_region_parity(corpus):
+    """
+    本子/章节页面: 按区域解析和全文解析的字段不一致的页面，返回 [(页面, 字段, 区域解析结果, 全文解析结果)]
+    """
+    from jmcomic import JmcomicText
+
+    mismatches = []
+    for name, kind, text in corpus:
+        if kind not in ('album', 'photo'):
+            continue
+
+        html = JmcomicText.parse_jm_base64_html(text) if kind == 'album' else text
+        prefix = f'pattern_html_{kind}_'
+        try:
+            full = JmcomicText.reflect_field_dict(html, prefix, use_region=False)
+        except Exception:
+            # 截断的页面可能缺少字段，全文解析也失败时无需比较
+            continue
+
+        region = JmcomicText.reflect_field_dict(html, prefix)
+        for field in full:
+            if region[field] != full[field]:
+                mismatches.append((name, field, region[field], full[field]))
+    return mismatches
+
+
+def detect_pathological(scales, max_exponent, min_ms):
+    """
+    按scales放大每个畸形页面，耗时增长指数 = log(t2/t1) / log(len2/len1)，线性为1，平方为2
+    """
+    findings = []
+    for case, kind, broken in PATHOLOGICAL_CASES:
+        texts = [GENERATORS[kind](scale, broken) for scale in scales]
+        for pattern_name, pattern, usage in page_patterns(kind):
+            costs = [measure(lambda: apply_pattern(pattern, usage, text)) for text in texts]
+            t1, t2 = costs[-2], costs[-1]
+            n1, n2 = len(texts[-2]), len(texts[-1])
+            exponent = math.log(max(t2, 1e-6) / max(t1, 1e-6)) / math.log(n2 / n1)
+            findings.append({
+                'case': case,
+                'pattern': pattern_name,
+                'size_kb': [round(len(t) / 1024, 1) for t in texts],
+                'ms': [round(c, 3) for c in costs],
+                'exponent': round(exponent, 2),
+                'pathological': exponent >= max_exponent and t2 >= min_ms,
+            })
+    return findings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='网页端解析（正则）基准测试')
+    parser.add_argument('--corpus', help='保存的真实页面所在目录')
+    parser.add_argument('--scale', type=int, default=4, help='内置语料的放大倍数')
+    parser.add_argument('--scales', type=int, nargs='+', default=[2, 4, 8], help='病态检测时页面的放大倍数')
+    parser.add_argument('--max-exponent', type=float, default=1.5, help='耗时增长指数超过此值视为超线性')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='耗时低于此值时不判定为病态')
+    parser.add_argument('--top', type=int, default=15, help='打印耗时最多的前N项')
+    parser.add_argument('--output', help='把结果写入json文件')
+    args = parser.parse_args()
+
+    from jmcomic import disable_jm_log
+    disable_jm_log()
+
+    corpus = builtin_corpus(args.scale)
+    if args.corpus:
+        corpus += load_corpus(args.corpus)
+
+    rows = bench_corpus(corpus)
+    print(f'{"page":<40}{"pattern":<44}{"size_kb":>10}{"ms":>10}', file=sys.stderr)
+    for row in sorted(rows, key=lambda r: -r['ms'])[:args.top]:
+        print(f'{row["page"]:<40}{row["pattern"]:<44}{row["size_kb"]:>10}{row["ms"]:>10}', file=sys.stderr)
+
+    findings = detect_pathological(args.scales, args.max_exponent, args.min_ms)
+    pathological = [f for f in findings if f['pathological']]
+    print(f'\n病态输入检测（增长指数 >= {args.max_exponent}，耗时 >= {args.min_ms}ms）:', file=sys.stderr)
+    for f in pathological:
+        print(f'[FAIL] {f["case"]:<32}{f["pattern"]:<44}size_kb={f["size_kb"]} ms={f["ms"]} '
+              f'exponent={f["exponent"]}', file=sys.stderr)
+    if not pathological:
+        print('[OK] 没有发现超线性的正则', file=sys.stderr)
+
+    mismatches = check_region_parity(corpus)
+    print('\n区域解析和全文解析的一致性检查:', file=sys.stderr)
+    for page, field, region, full in mismatches:
+        print(f'[FAIL] {page:<40}{field:<20}区域: {str(region)[:60]!r} 全文: {str(full)[:60]!r}', file=sys.stderr)
+    if not mismatches:
+        print('[OK] 结果一致', file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'corpus': rows, 'pathological': findings,
+                       'region_mismatches': [list(m) for m in mismatches]}, f, indent=2, ensure_ascii=False, default=str)
+
+    sys.exit(1 if pathological or mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+import jmcomic 耗时基准测试
+
+在子进程中多次执行 python -X importtime -c "import jmcomic"，取中位数，统计:
+- total:   import jmcomic 的总耗时
+- common:  其中依赖库 commonX 的耗时（第三方库，不受本项目控制）
+- own:     total - common，即jmcomic自身及其余依赖的耗时
+
+同时检查不应在import时加载的模块（PIL、Crypto、jm_plugin、jm_kavita 等）。
+
+用法:
+    # 检查并与基线对比，耗时超出基线 --max-regression 比例时返回非0
+    python scripts/bench_import_time.py
+    # 记录新的基线
+    python scripts/bench_import_time.py --save-baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, 'src')
+BASELINE_FILE = os.path.join(PROJECT_ROOT, 'scripts', 'import_time_baseline.json')
+
+# 这些模块只应在第一次使用时加载
+LAZY_MODULES = [
+    'PIL',
+    'Crypto',
+    'jmcomic.jm_plugin',
+    'jmcomic.jm_kavita',
+    'urllib.request',
+]
+
+
+def run_once():
+    code = (
+        'import sys, json, jmcomic;'
+        f'print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))'
+    )
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, env=env, check=True)
+
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        try:
+            cumulative_us = int(parts[1])
+        except ValueError:
+            continue
+        name = parts[2].strip()
+        cumulative[name] = cumulative.get(name, 0) + cumulative_us
+
+    loaded_lazy_modules = json.loads(proc.stdout.strip().splitlines()[-1])
+    return cumulative.get('jmcomic', 0), cumulative.get('common', 0), loaded_lazy_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='import jmcomic 耗时基准测试')
+    parser.add_argument('--runs', type=int, default=15, help='运行次数，取中位数')
+    parser.add_argument('--max-regression', type=float, default=0.3, help='相对基线允许的最大增幅，0.3表示30%%')
+    parser.add_argument('--threshold-ms', type=float, default=None, help='own耗时的绝对上限（毫秒）')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    args = parser.parse_args()
+
+    totals, commons, loaded = [], [], set()
+    for _ in range(args.runs):
+        total, common, loaded_lazy_modules = run_once()
+        totals.append(total)
+        commons.append(common)
+        loaded.update(loaded_lazy_modules)
+
+    result = {
+        'total_ms': round(statistics.median(totals) / 1000, 2),
+        'common_ms': round(statistics.median(commons) / 1000, 2),
+        'own_ms': round(statistics.median([t - c for t, c in zip(totals, commons)]) / 1000, 2),
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f'[INFO] 已保存基线: {BASELINE_FILE}')
+        return
+
+    failures = []
+    if loaded:
+        failures.append(f'import时加载了应延迟加载的模块: {sorted(loaded)}')
+
+    if args.threshold_ms is not None and result['own_ms'] > args.threshold_ms:
+        failures.append(f'own耗时 {result["own_ms"]}ms 超过上限 {args.threshold_ms}ms')
+
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        limit = baseline['own_ms'] * (1 + args.max_regression)
+        if result['own_ms'] > limit:
+            failures.append(f'own耗时 {result["own_ms"]}ms 超过基线 {baseline["own_ms"]}ms 的 {args.max_regression:.0%} 增幅')
+
+    for msg in failures:
+        print(f'[FAIL] {msg}')
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
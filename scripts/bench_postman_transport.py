@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+图片下载传输层基准测试
+
+对比不同 client.postman.type 下载图片的吞吐量和建立的连接数：
+- curl_cffi:       默认实现，每个请求一个新会话
+- curl_cffi_pool:  keep-alive会话池
+- httpx_http1:     httpx + HTTP/1.1 连接池
+- httpx:           httpx + HTTP/2 多路复用
+
+测试使用本地服务器（同一端口同时支持 HTTP/1.1 和 HTTP/2 prior knowledge），不访问外网。
+可以通过 --latency 模拟CDN的首字节延迟。
+
+用法:
+    python scripts/bench_postman_transport.py --images 300 --threads 30 --size 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+H2_PREFACE = b'PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n'
+
+
+class LocalImageServer:
+    """
+    本地图片服务器，按连接的前几个字节区分 HTTP/1.1 和 HTTP/2，并统计连接数
+    """
+
+    def __init__(self, body_size, latency):
+        self.body = os.urandom(body_size)
+        self.latency = latency
+        self.connections = {'HTTP/1.1': 0, 'HTTP/2': 0}
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            server = self.loop.run_until_complete(asyncio.start_server(self.handle, '127.0.0.1', 0))
+            self.port = server.sockets[0].getsockname()[1]
+            ready.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self
+
+    def reset_stats(self):
+        for k in self.connections:
+            self.connections[k] = 0
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readexactly(len(H2_PREFACE))
+        except asyncio.IncompleteReadError:
+            writer.close()
+            return
+
+        try:
+            if head == H2_PREFACE:
+                self.connections['HTTP/2'] += 1
+                await self.handle_h2(reader, writer, head)
+            else:
+                self.connections['HTTP/1.1'] += 1
+                await self.handle_h1(reader, writer, head)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_h1(self, reader, writer, buf):
+        while True:
+            while b'\r\n\r\n' not in buf:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                buf += chunk
+
+            _, buf = buf.split(b'\r\n\r\n', 1)
+            await asyncio.sleep(self.latency)
+            writer.write(b'HTTP/1.1 200 OK\r\n'
+                         b'Content-Type: image/jpeg\r\n'
+                         b'Content-Length: %d\r\n\r\n' % len(self.body))
+            writer.write(self.body)
+            await writer.drain()
+
+    async def handle_h2(self, reader, writer, data):
+        import h2.config
+        import h2.connection
+        import h2.events
+        import h2.exceptions
+
+        conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        window_updated = asyncio.Condition()
+
+        async def flush():
+            writer.write(conn.data_to_send())
+            await writer.drain()
+
+        async def respond(stream_id):
+            await asyncio.sleep(self.latency)
+            body = self.body
+            try:
+                conn.send_headers(stream_id, [
+                    (':status', '200'),
+                    ('content-type', 'image/jpeg'),
+                    ('content-length', str(len(body))),
+                ])
+                pos = 0
+                while pos < len(body):
+                    size = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size)
+                    if size <= 0:
+                        async with window_updated:
+                            await window_updated.wait()
+                        continue
+                    conn.send_data(stream_id, body[pos:pos + size])
+                    pos += size
+                    await flush()
+                conn.end_stream(stream_id)
+                await flush()
+            except h2.exceptions.StreamClosedError:
+                pass
+
+        while True:
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    asyncio.ensure_future(respond(event.stream_id))
+                elif isinstance(event, h2.events.WindowUpdated):
+                    async with window_updated:
+                        window_updated.notify_all()
+                elif isinstance(event, h2.events.ConnectionTerminated):
+                    return
+            await flush()
+
+            data = await reader.read(65536)
+            if not data:
+                return
+
+
+TRANSPORTS = {
+    'curl_cffi': {'type': 'curl_cffi', 'meta_data': {'impersonate': 'chrome'}},
+    'curl_cffi_pool': {'type': 'curl_cffi_pool', 'meta_data': {'impersonate': 'chrome', 'pool': {'prewarm': False}}},
+    'httpx_http1': {'type': 'httpx', 'meta_data': {'httpx': {'http1': True, 'http2': False}}},
+    # 本地服务器没有TLS，无法通过ALPN协商，所以使用 HTTP/2 prior knowledge
+    'httpx': {'type': 'httpx', 'meta_data': {'httpx': {'http1': False, 'http2': True}}},
+}
+
+
+def bench_transport(name, server: LocalImageServer, images, threads):
+    from jmcomic import JmModuleConfig
+    from common import Postmans
+    from copy import deepcopy
+
+    postman = Postmans.create(data=deepcopy(TRANSPORTS[name]))
+    urls = [f'http://127.0.0.1:{server.port}/media/photos/1/{i:05}.jpg' for i in range(images)]
+    latencies = []
+
+    def download(url):
+        start = time.perf_counter()
+        resp = postman.get(url, headers=JmModuleConfig.new_html_headers(), timeout=(10, 30))
+        latencies.append(time.perf_counter() - start)
+        return len(resp.content)
+
+    server.reset_stats()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        total_bytes = sum(executor.map(download, urls))
+    cost = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'transport': name,
+        'images': images,
+        'seconds': round(cost, 3),
+        'img_per_s': round(images / cost, 1),
+        'mb_per_s': round(total_bytes / cost / 1024 / 1024, 2),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+        'connections': sum(server.connections.values()),
+        'http_versions': {k: v for k, v in server.connections.items() if v != 0},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片下载传输层基准测试')
+    parser.add_argument('--images', type=int, default=300, help='图片数')
+    parser.add_argument('--threads', type=int, default=30, help='下载线程数')
+    parser.add_argument('--size', type=int, default=200, help='单张图片大小（KB）')
+    parser.add_argument('--latency', type=float, default=0.02, help='服务器首字节延迟（秒）')
+    parser.add_argument('--transport', nargs='*', default=list(TRANSPORTS), choices=list(TRANSPORTS))
+    parser.add_argument('--json', action='store_true', help='以json格式输出')
+    args = parser.parse_args()
+
+    from jmcomic import disable_jm_log
+    disable_jm_log()
+
+    server = LocalImageServer(args.size * 1024, args.latency).start()
+
+    results = []
+    for name in args.transport:
+        try:
+            results.append(bench_transport(name, server, args.images, args.threads))
+        except ImportError as e:
+            print(f'[SKIP] {name}: {e}', file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"transport":<16}{"img/s":>10}{"MB/s":>10}{"p50(ms)":>10}{"p99(ms)":>10}{"conns":>8}')
+    for r in results:
+        print(f'{r["transport"]:<16}{r["img_per_s"]:>10}{r["mb_per_s"]:>10}'
+              f'{r["p50_ms"]:>10}{r["p99_ms"]:>10}{r["connections"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
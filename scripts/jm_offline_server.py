@@ -0,0 +1,677 @@
+#!/usr/bin/env python3
+"""
+离线的禁漫替身服务器，用于基准测试和本地调试，不需要访问外网
+
+模拟了jmcomic用到的接口:
+- 移动端API（JmApiClient）: /setting /album /chapter /chapter_view_template /search，返回值按APP的方式AES加密
+- 网页端（JmHtmlClient）: /album/{id} /photo/{id} /search/photos，页面能被 JmcomicText / JmPageTool 的正则解析
+- 图片: /media/photos/{photo_id}/{name}，按 JmImageTool.get_num 的规则切割打乱，客户端解密后得到原图
+
+可以按请求类型（api/html/image）注入延迟、错误和带宽限制。
+
+在代码中使用:
+    server = OfflineJmServer(OfflineDataset(album_count=5)).start()
+    option = server.new_option(base_dir='./download', impl='api')
+    download_album(server.dataset.album_ids[0], option)
+
+命令行启动:
+    python scripts/jm_offline_server.py --port 8000 --albums 10 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit, parse_qs
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from jmcomic import JmModuleConfig, JmMagicConstants, JmImageTool, JmCryptoTool, JmOption  # noqa: E402
+
+
+class OfflineDataset:
+    """
+    确定性生成的本子/章节/图片数据，相同参数每次生成的数据都一样
+    """
+
+    def __init__(self,
+                 album_count=10,
+                 photos_per_album=3,
+                 images_per_photo=20,
+                 image_size=(800, 1200),
+                 image_suffix='.jpg',
+                 start_id=500000,
+                 scramble_id=JmMagicConstants.SCRAMBLE_220980,
+                 seed=0,
+                 ):
+        """
+        :param photos_per_album: 每个本子的章节数，为1时是单章本子
+        :param start_id: 第一个本子的id，大于 SCRAMBLE_421926 时使用最新的图片切割算法
+        """
+        self.photos_per_album = photos_per_album
+        self.images_per_photo = images_per_photo
+        self.image_size = image_size
+        self.image_suffix = image_suffix
+        self.scramble_id = scramble_id
+        self.seed = seed
+
+        # 留出章节id的空间
+        self.album_ids = [str(start_id + i * 1000) for i in range(album_count)]
+        self.albums: Dict[str, dict] = {}
+        self.photos: Dict[str, dict] = {}
+        for i, aid in enumerate(self.album_ids):
+            self.build_album(i, aid)
+
+    def build_album(self, i, aid):
+        author = f'作者{i % 7}'
+        album = {
+            'id': aid,
+            'name': f'离线测试本子{i} [{author}]',
+            'author': [author],
+            'tags': ['全彩', '中文', f'标签{i % 5}'],
+            'works': [f'作品{i % 3}'],
+            'actors': [f'角色{i % 4}'],
+            'description': f'第{i}个离线测试本子',
+            'likes': str(100 + i),
+            'total_views': str(1000 + i * 10),
+            'comment_total': str(i % 10),
+            'photo_ids': [],
+        }
+
+        single = self.photos_per_album == 1
+        for sort in range(1, self.photos_per_album + 1):
+            pid = aid if single else str(int(aid) + sort - 1)
+            album['photo_ids'].append(pid)
+            self.photos[pid] = {
+                'id': pid,
+                'album_id': aid,
+                'name': album['name'] if single else f'{album["name"]}-第{sort}話',
+                'sort': sort,
+                'series_id': '0' if single else aid,
+                'images': [f'{k:05}{self.image_suffix}' for k in range(1, self.images_per_photo + 1)],
+            }
+
+        self.albums[aid] = album
+
+    def album_series(self, album: dict) -> List[dict]:
+        if self.photos_per_album == 1:
+            return []
+        return [{'id': pid, 'name': f'第{self.photos[pid]["sort"]}話', 'sort': str(self.photos[pid]['sort'])}
+                for pid in album['photo_ids']]
+
+    def search(self, query: str) -> List[dict]:
+        query = query.lower()
+        return [album for album in self.albums.values()
+                if query in album['name'].lower() or any(query in tag for tag in album['tags'])]
+
+    @property
+    def image_count(self) -> int:
+        return len(self.photos) * self.images_per_photo
+
+    def original_image(self, photo_id: str, filename: str):
+        """
+        解密后应该得到的原图
+        """
+        from PIL import Image
+        w, h = self.image_size
+        rnd = random.Random(f'{self.seed}/{photo_id}/{filename}')
+        # 低分辨率噪声放大，压缩后的大小和真实漫画图片接近
+        small = Image.frombytes('RGB', (max(w // 8, 1), max(h // 8, 1)),
+                                bytes(rnd.getrandbits(8) for _ in range(max(w // 8, 1) * max(h // 8, 1) * 3)))
+        return small.resize((w, h))
+
+    def scrambled_image(self, photo_id: str, filename: str):
+        """
+        按禁漫的规则打乱图片，是 JmImageTool.decode_image 的逆操作
+        """
+        from PIL import Image
+        img = self.original_image(photo_id, filename)
+        num = JmImageTool.get_num(self.scramble_id, photo_id, os.path.splitext(filename)[0])
+        if num == 0:
+            return img
+
+        w, h = img.size
+        scrambled = Image.new('RGB', (w, h))
+        over = h % num
+        for i in range(num):
+            move = h // num
+            y_src = h - (move * (i + 1)) - over
+            y_dst = move * i
+            if i == 0:
+                move += over
+            else:
+                y_dst += over
+            scrambled.paste(img.crop((0, y_dst, w, y_dst + move)), (0, y_src, w, y_src + move))
+        return scrambled
+
+
+class FaultConfig:
+    """
+    故障注入配置
+    """
+
+    ERROR_MODES = ('status', 'reset', 'garbage')
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_mode='status', bandwidth=0):
+        """
+        :param latency: 响应前的固定延迟（秒）
+        :param jitter: 在latency上叠加的随机延迟上限（秒）
+        :param error_rate: 注入错误的概率
+        :param error_mode: status=返回502，reset=直接断开连接，garbage=返回非json/损坏的数据
+        :param bandwidth: 单个响应的带宽上限（字节/秒），0表示不限制
+        """
+        assert error_mode in self.ERROR_MODES, error_mode
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_mode = error_mode
+        self.bandwidth = bandwidth
+
+
+class OfflineHTTPServer(ThreadingHTTPServer):
+    # 默认的listen队列只有5，并发下载时会出现连接被丢弃、1秒后重传的情况
+    request_queue_size = 256
+
+
+class OfflineJmServer:
+    """
+    离线替身服务器，API、网页、图片都由同一个端口提供
+    """
+
+    KINDS = ('api', 'html', 'image')
+
+    def __init__(self, dataset: OfflineDataset = None, host='127.0.0.1', port=0, check_token=True):
+        self.dataset = dataset or OfflineDataset()
+        self.host = host
+        self.port = port
+        self.check_token = check_token
+        self.faults: Dict[str, FaultConfig] = {kind: FaultConfig() for kind in self.KINDS}
+        self.httpd: Optional[ThreadingHTTPServer] = None
+        self.image_cache: Dict[str, bytes] = {}
+        self.image_cache_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+
+    @property
+    def address(self) -> str:
+        return f'{self.host}:{self.port}'
+
+    def start(self):
+        server = self
+
+        class Handler(OfflineJmRequestHandler):
+            jm_server = server
+
+        self.httpd = OfflineHTTPServer((self.host, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name='jm-offline-server', daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def set_fault(self, kind=None, **kwargs):
+        """
+        :param kind: api / html / image，为None时设置全部类型
+        """
+        for k in ([kind] if kind is not None else self.KINDS):
+            self.faults[k] = FaultConfig(**kwargs)
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {
+                'connections': 0,
+                'requests': {kind: 0 for kind in self.KINDS},
+                'errors': {kind: 0 for kind in self.KINDS},
+                'bytes': 0,
+            }
+
+    def count(self, field, kind=None, amount=1):
+        with self.stats_lock:
+            if kind is None:
+                self.stats[field] += amount
+            else:
+                self.stats[field][kind] += amount
+
+    def get_stats(self) -> dict:
+        with self.stats_lock:
+            return json.loads(json.dumps(self.stats))
+
+    def image_bytes(self, photo_id: str, filename: str) -> bytes:
+        key = f'{photo_id}/{filename}'
+        data = self.image_cache.get(key, None)
+        if data is not None:
+            return data
+
+        img = self.dataset.scrambled_image(photo_id, filename)
+        buffer = io.BytesIO()
+        fmt = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP'}[os.path.splitext(filename)[1]]
+        img.save(buffer, fmt, **({'quality': 85} if fmt != 'PNG' else {}))
+        data = buffer.getvalue()
+
+        with self.image_cache_lock:
+            self.image_cache[key] = data
+        return data
+
+    def prepare_images(self, threads=8):
+        """
+        预先生成全部图片，避免基准测试时把服务端生成图片的耗时算进去
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        keys = [(pid, name) for pid, photo in self.dataset.photos.items() for name in photo['images']]
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(lambda k: self.image_bytes(*k), keys))
+
+    def configure_module(self):
+        """
+        让jmcomic模块级的域名配置指向本服务器，并关闭会访问外网的功能
+        """
+        JmModuleConfig.PROT = 'http://'
+        JmModuleConfig.DOMAIN_API_LIST = [self.address]
+        JmModuleConfig.DOMAIN_IMAGE_LIST = [self.address]
+        JmModuleConfig.DOMAIN_HTML_LIST = [self.address]
+        JmModuleConfig.FLAG_API_CLIENT_AUTO_UPDATE_DOMAIN = False
+        # 避免把本服务器的cookies写入用户的启动状态缓存
+        JmModuleConfig.FLAG_ENABLE_BOOTSTRAP_CACHE = False
+        JmModuleConfig.APP_COOKIES = None
+        JmModuleConfig.SCRAMBLE_CACHE.clear()
+
+    def new_option(self, base_dir, impl='api', postman_type='curl_cffi', download=None, **client_kwargs) -> JmOption:
+        """
+        创建一个使用本服务器的option，会先调用 configure_module
+
+        :param download: option的download配置
+        :param client_kwargs: option的client配置
+        """
+        self.configure_module()
+        client = {
+            'impl': impl,
+            'domain': [self.address],
+            'postman': {'type': postman_type, 'meta_data': {'impersonate': 'chrome', 'proxies': {}}},
+            **client_kwargs,
+        }
+        return JmOption.construct({
+            'dir_rule': {'base_dir': base_dir, 'rule': 'Bd_Aid_Pindex'},
+            'download': download or {},
+            'client': client,
+            'plugins': {'after_album': []},
+        })
+
+
+class OfflineJmRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    jm_server: OfflineJmServer = None
+
+    pattern_image = re.compile(r'^/media/photos/(\d+)/([^/?]+)$')
+    pattern_html_album = re.compile(r'^/album/(\d+)/?')
+    pattern_html_photo = re.compile(r'^/photo/(\d+)/?')
+
+    # noinspection PyShadowingBuiltins
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.jm_server.count('connections')
+
+    @property
+    def dataset(self) -> OfflineDataset:
+        return self.jm_server.dataset
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        if length:
+            self.rfile.read(length)
+        self.handle_request()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def handle_request(self):
+        split = urlsplit(self.path)
+        path, query = split.path, {k: v[0] for k, v in parse_qs(split.query).items()}
+        kind = self.kind_of(path)
+        self.jm_server.count('requests', kind)
+
+        fault = self.jm_server.faults[kind]
+        delay = fault.latency + (random.random() * fault.jitter if fault.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if fault.error_rate and random.random() < fault.error_rate:
+            self.jm_server.count('errors', kind)
+            return self.send_fault(fault.error_mode, kind)
+
+        try:
+            if kind == 'image':
+                return self.handle_image(path, fault)
+            if kind == 'api':
+                return self.handle_api(path, query)
+            return self.handle_html(path, query)
+        except KeyError:
+            return self.send_body(404, b'Not Found', 'text/plain')
+
+    def kind_of(self, path: str) -> str:
+        if path.startswith('/media/'):
+            return 'image'
+        if path in ('/setting', '/album', '/chapter', '/chapter_view_template', '/search', '/categories/filter'):
+            return 'api'
+        return 'html'
+
+    def send_fault(self, mode, kind):
+        if mode == 'reset':
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+
+        if mode == 'garbage':
+            body = b'\x00' * 64 if kind == 'image' else '<html>Could not connect to mysql! 服务器繁忙</html>'.encode()
+            return self.send_body(200, body, 'text/html')
+
+        return self.send_body(502, b'Bad Gateway', 'text/plain')
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: Optional[dict] = None, bandwidth=0):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.jm_server.count('bytes', amount=len(body))
+
+        if bandwidth <= 0:
+            self.wfile.write(body)
+        else:
+            # 按 1/20 秒的配额分块写出
+            chunk = max(int(bandwidth / 20), 1)
+            for i in range(0, len(body), chunk):
+                self.wfile.write(body[i:i + chunk])
+                self.wfile.flush()
+                time.sleep(len(body[i:i + chunk]) / bandwidth)
+
+    # 图片
+
+    def handle_image(self, path, fault: FaultConfig):
+        match = self.pattern_image.match(path)
+        if match is None or match[1] not in self.dataset.photos:
+            raise KeyError(path)
+
+        photo_id, filename = match[1], match[2]
+        data = self.jm_server.image_bytes(photo_id, filename)
+        content_type = 'image/' + {'.jpg': 'jpeg'}.get(os.path.splitext(filename)[1],
+                                                       os.path.splitext(filename)[1][1:])
+        self.send_body(200, data, content_type, bandwidth=fault.bandwidth)
+
+    # 移动端API
+
+    def handle_api(self, path, query):
+        if path == '/chapter_view_template':
+            if not self.token_valid(JmMagicConstants.APP_TOKEN_SECRET_2):
+                return self.send_body(403, b'Forbidden', 'text/plain')
+            html = f'<script>\nvar scramble_id = {self.dataset.scramble_id};\nvar aid = {query.get("id", "")};\n</script>'
+            return self.send_body(200, html.encode(), 'text/html; charset=utf-8',
+                                  bandwidth=self.jm_server.faults['api'].bandwidth)
+
+        if not self.token_valid(JmMagicConstants.APP_TOKEN_SECRET):
+            return self.send_api_error('token错误')
+
+        headers = None
+        if path == '/setting':
+            data = {'jm3_version': JmMagicConstants.APP_VERSION, 'img_host': f'http://{self.jm_server.address}'}
+            headers = {'Set-Cookie': 'AVS=offline-jm-server; path=/'}
+        elif path == '/album':
+            data = self.api_album(query['id'])
+        elif path == '/chapter':
+            data = self.api_chapter(query['id'])
+        else:
+            data = self.api_search(query.get('search_query', ''), int(query.get('page', 1)))
+
+        self.send_api_data(data, headers)
+
+    def token_valid(self, secret) -> bool:
+        if not self.jm_server.check_token:
+            return True
+
+        token, tokenparam = self.headers.get('token', ''), self.headers.get('tokenparam', '')
+        ts = tokenparam.split(',')[0]
+        return token == JmCryptoTool.md5hex(f'{ts}{secret}')
+
+    def send_api_data(self, data, headers=None):
+        from Crypto.Cipher import AES
+
+        ts = self.headers.get('tokenparam', '').split(',')[0]
+        key = JmCryptoTool.md5hex(f'{ts}{JmMagicConstants.APP_DATA_SECRET}').encode('utf-8')
+        raw = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        pad = 16 - len(raw) % 16
+        encrypted = AES.new(key, AES.MODE_ECB).encrypt(raw + bytes([pad]) * pad)
+
+        body = json.dumps({'code': 200, 'errorMsg': '', 'data': base64.b64encode(encrypted).decode()})
+        self.send_body(200, body.encode(), 'application/json', headers, bandwidth=self.jm_server.faults['api'].bandwidth)
+
+    def send_api_error(self, msg, code=401):
+        body = json.dumps({'code': code, 'errorMsg': msg, 'data': []}, ensure_ascii=False)
+        self.send_body(200, body.encode(), 'application/json')
+
+    def api_album(self, aid):
+        album = self.dataset.albums[aid]
+        first_photo = self.dataset.photos[album['photo_ids'][0]]
+        return {
+            'id': int(aid),
+            'name': album['name'],
+            'author': album['author'],
+            'images': first_photo['images'],
+            'description': album['description'],
+            'total_views': album['total_views'],
+            'likes': album['likes'],
+            'series': self.dataset.album_series(album),
+            'series_id': '0',
+            'comment_total': album['comment_total'],
+            'tags': album['tags'],
+            'works': album['works'],
+            'actors': album['actors'],
+            'related_list': [],
+            'liked': False,
+            'is_favorite': False,
+        }
+
+    def api_chapter(self, pid):
+        photo = self.dataset.photos[pid]
+        album = self.dataset.albums[photo['album_id']]
+        return {
+            'id': int(pid),
+            'series': self.dataset.album_series(album),
+            'tags': ' '.join(album['tags']),
+            'name': photo['name'],
+            'images': photo['images'],
+            'series_id': photo['series_id'],
+            'is_favorite': False,
+            'liked': False,
+        }
+
+    def api_search(self, query, page, page_size=80):
+        if query.isdigit() and query in self.dataset.albums:
+            return {'search_query': query, 'total': 1, 'redirect_aid': query, 'content': []}
+
+        result = self.dataset.search(query)
+        return {
+            'search_query': query,
+            'total': str(len(result)),
+            'content': [{
+                'id': album['id'],
+                'author': album['author'][0],
+                'description': album['description'],
+                'name': album['name'],
+                'image': '',
+                'category': {'id': '1', 'title': '同人'},
+                'category_sub': {'id': '1', 'title': '同人'},
+                'tags': album['tags'],
+            } for album in result[(page - 1) * page_size: page * page_size]],
+        }
+
+    # 网页端
+
+    def handle_html(self, path, query):
+        match = self.pattern_html_album.match(path)
+        if match is not None:
+            return self.send_html(self.html_album(match[1]))
+
+        match = self.pattern_html_photo.match(path)
+        if match is not None:
+            return self.send_html(self.html_photo(match[1]))
+
+        if path.startswith('/search/photos'):
+            search_query = query.get('search_query', '')
+            if search_query.isdigit() and search_query in self.dataset.albums:
+                self.send_body(301, b'', 'text/html', {'Location': f'/album/{search_query}/'})
+                return
+            return self.send_html(self.html_search(search_query))
+
+        raise KeyError(path)
+
+    def send_html(self, html: str):
+        self.send_body(200, html.encode('utf-8'), 'text/html; charset=utf-8',
+                       bandwidth=self.jm_server.faults['html'].bandwidth)
+
+    def html_album(self, aid):
+        album = self.dataset.albums[aid]
+
+        def links(values):
+            return ''.join(f'<a href="/search/photos?search_query={v}">{v}</a>' for v in values)
+
+        episodes = ''
+        if self.dataset.photos_per_album != 1:
+            episodes = ''.join(
+                f'<a href="/photo/{pid}" data-album="{pid}">\n'
+                f'<li class="list-group-item">第{self.dataset.photos[pid]["sort"]}話 章节{self.dataset.photos[pid]["sort"]}'
+                f'<span class="hidden-xs">2024-01-01</span></li>\n</a>\n'
+                for pid in album['photo_ids']
+            )
+
+        return f'''<html><head><title>{album['name']}|禁漫天堂</title></head><body>
+<h1 class="book-name" id="book-name">{album['name']}</h1>
+<span class="number">禁漫車號：JM{aid}</span>
+<span class="pagecount">頁數:{self.dataset.images_per_photo * len(album['photo_ids'])}</span>
+<span itemprop="datePublished">上架日期 : 2024-01-01</span>
+<span itemprop="dateModified">更新日期 : 2024-01-02</span>
+<span itemprop="author" data-type="works">{links(album['works'])}</span>
+<span itemprop="author" data-type="actor">{links(album['actors'])}</span>
+<span itemprop="genre" data-type="tags">{links(album['tags'])}</span>
+<span itemprop="author" data-type="author">{links(album['author'])}</span>
+<span id="albim_likes_{aid}">{album['likes']}</span>
+<span>{album['total_views']}</span>
+<span>次觀看</span>
+<div class="badge" id="total_video_comments">{album['comment_total']}</div>
+<h2 class="p-t-5 p-b-5">叙述：{album['description']}</h2>
+<div class="episode">
+{episodes}</div>
+<script>
+var scramble_id = {self.dataset.scramble_id};
+</script>
+</body></html>'''
+
+    def html_photo(self, pid):
+        photo = self.dataset.photos[pid]
+        album = self.dataset.albums[photo['album_id']]
+        address = self.jm_server.address
+        first = photo['images'][0]
+        return f'''<html><head><title>{photo['name']}|禁漫天堂</title>
+<meta property="og:url" content="http://{address}/photo/{pid}/">
+<meta name="keywords" content="{','.join(album['tags'])}">
+</head><body>
+<img src="https://{address}/media/albums/blank.jpg">
+<img data-original="http://{address}/media/photos/{pid}/{first}" class="lazy_img" id="album_photo_{first}" data-page="0">
+<script>
+var scramble_id = {self.dataset.scramble_id};
+var series_id = {photo['series_id']};
+var sort = {photo['sort']};
+var page_arr = {json.dumps(photo['images'])};
+</script>
+</body></html>'''
+
+    def html_search(self, query):
+        result = self.dataset.search(query)
+        items = ''.join(f'''<div class="thumb-overlay-albums">
+<a href="/album/{album['id']}/">
+<img class="lazy_img" title="{album['name']}" alt="{album['name']}">
+</a>
+<div class="title-truncate tags ">
+{''.join(f'<a class="tag" href="/search/photos?search_query={t}">{t}</a>' for t in album['tags'])}
+</div>
+</div>
+''' for album in result)
+
+        return f'''<html><body>
+<div class="well well-sm">
+<span class="text-white">{len(result)}</span> A漫.
+{items}<div class="row">
+</div>
+</div>
+</body></html>'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线的禁漫替身服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--albums', type=int, default=10, help='本子数')
+    parser.add_argument('--photos', type=int, default=3, help='每个本子的章节数')
+    parser.add_argument('--images', type=int, default=20, help='每个章节的图片数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个响应的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='随机附加延迟的上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入错误的概率')
+    parser.add_argument('--error-mode', default='status', choices=FaultConfig.ERROR_MODES)
+    parser.add_argument('--bandwidth', type=int, default=0, help='单个响应的带宽上限（KB/s），0为不限制')
+    args = parser.parse_args()
+
+    dataset = OfflineDataset(album_count=args.albums, photos_per_album=args.photos, images_per_photo=args.images)
+    server = OfflineJmServer(dataset, args.host, args.port)
+    server.set_fault(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     error_mode=args.error_mode, bandwidth=args.bandwidth * 1024)
+    server.start()
+
+    print(f'离线禁漫服务器已启动: http://{server.address}')
+    print(f'本子id: {", ".join(dataset.album_ids)}')
+    print('在jmcomic中使用前，需要设置:')
+    print("    JmModuleConfig.PROT = 'http://'")
+    print(f"    JmModuleConfig.DOMAIN_API_LIST = JmModuleConfig.DOMAIN_IMAGE_LIST = ['{server.address}']")
+    print('    JmModuleConfig.FLAG_API_CLIENT_AUTO_UPDATE_DOMAIN = False')
+    print('    JmModuleConfig.FLAG_ENABLE_BOOTSTRAP_CACHE = False')
+    print('或者直接使用 OfflineJmServer.new_option(base_dir)')
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
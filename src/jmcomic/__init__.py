@@ -5,7 +5,6 @@
 __version__ = '2.7.0'
 
 from .api import *
-from .jm_plugin import *
 
 def launch_gui():
     from .jm_gui_flet import FletGUI
@@ -14,7 +13,7 @@ def launch_gui():
     ft.app(target=app.build)
     return app
 
-# 下面进行注册组件（客户端、插件）
+# 下面进行注册组件（客户端）
 gb = dict(filter(lambda pair: isinstance(pair[1], type), globals().items()))
 
 
@@ -29,8 +28,23 @@ register_jmcomic_component(gb,
                            JmModuleConfig.register_client,
                            JmcomicClient,
                            )
-# 注册插件
-register_jmcomic_component(gb,
-                           JmModuleConfig.register_plugin,
-                           JmOptionPlugin,
-                           )
+
+
+# 插件模块 jm_plugin 延迟加载，以减少 import jmcomic 的耗时，
+# 第一次访问插件相关的名字（例如 jmcomic.ZipPlugin）或执行 from jmcomic import * 时才会加载，
+# 插件会在 jm_plugin 加载时自行注册。
+def __getattr__(name):
+    if name.startswith('__') and name != '__all__':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # 不能用 from . import jm_plugin，它会先访问本模块的属性，导致递归调用 __getattr__
+    from importlib import import_module
+    jm_plugin = import_module('.jm_plugin', __name__)
+
+    if name == '__all__':
+        return [k for k in {**globals(), **vars(jm_plugin)} if not k.startswith('_')]
+
+    try:
+        return getattr(jm_plugin, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
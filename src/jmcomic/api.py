@@ -138,7 +138,8 @@ create_option = create_option_by_file
 def pack_album_to_kavita(album_dir,
                         output_dir,
                         overwrite=True,
-                        compress_level=1):
+                        compress_level=1,
+                        append=False):
     """
     打包单个专辑为Kavita CBZ格式
 
@@ -146,6 +147,7 @@ def pack_album_to_kavita(album_dir,
     :param output_dir: 输出目录
     :param overwrite: 是否覆盖已存在的CBZ，默认True
     :param compress_level: 压缩级别 (0-9)，1为最快，9为最小体积
+    :param append: CBZ已存在时只追加新增的图片，默认False
     :return: 生成的CBZ文件路径，失败返回None
 
     示例:
@@ -153,13 +155,14 @@ def pack_album_to_kavita(album_dir,
         cbz_path = pack_album_to_kavita('D:/comic/album_123', 'D:/kavita')
     """
     from .jm_kavita import pack_album_to_kavita as _pack
-    return _pack(album_dir, output_dir, overwrite, compress_level)
+    return _pack(album_dir, output_dir, overwrite, compress_level, append)
 
 
 def pack_albums_to_kavita(source_dir,
                           output_dir,
                           overwrite=True,
-                          compress_level=1):
+                          compress_level=1,
+                          append=False):
     """
     批量打包专辑为Kavita CBZ格式
 
@@ -167,6 +170,7 @@ def pack_albums_to_kavita(source_dir,
     :param output_dir: 输出目录
     :param overwrite: 是否覆盖已存在的CBZ，默认True
     :param compress_level: 压缩级别 (0-9)
+    :param append: CBZ已存在时只追加新增的图片，默认False
     :return: 统计信息字典 {'success': 成功数, 'failed': 失败数, 'total': 总数}
 
     示例:
@@ -175,14 +179,15 @@ def pack_albums_to_kavita(source_dir,
         print(f"成功: {stats['success']}/{stats['total']}")
     """
     from .jm_kavita import pack_albums_to_kavita as _pack
-    return _pack(source_dir, output_dir, overwrite, compress_level)
+    return _pack(source_dir, output_dir, overwrite, compress_level, append)
 
 
 def download_and_pack_to_kavita(jm_album_id,
                                  kavita_output_dir,
                                  option=None,
                                  overwrite_cbz=True,
-                                 compress_level=1):
+                                 compress_level=1,
+                                 append_cbz=False):
     """
     下载专辑并直接打包为Kavita CBZ格式
 
@@ -191,6 +196,7 @@ def download_and_pack_to_kavita(jm_album_id,
     :param option: 下载选项
     :param overwrite_cbz: 是否覆盖已存在的CBZ
     :param compress_level: CBZ压缩级别
+    :param append_cbz: CBZ已存在时只追加新增的图片
     :return: (album_detail, cbz_path) 元组，失败则cbz_path为None
 
     示例:
@@ -205,7 +211,7 @@ def download_and_pack_to_kavita(jm_album_id,
 
     # 打包
     from .jm_kavita import KavitaPacker, KavitaConfig
-    config = KavitaConfig(overwrite=overwrite_cbz, compress_level=compress_level)
+    config = KavitaConfig(overwrite=overwrite_cbz, compress_level=compress_level, append=append_cbz)
     packer = KavitaPacker(config)
     cbz_path = packer.pack_from_album_detail(album, source_dir, kavita_output_dir)
 
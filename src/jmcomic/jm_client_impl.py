@@ -1,6 +1,119 @@
 from threading import Lock
 
-from .jm_client_interface import *
+from .jm_postman import *
+
+
+class RequestWatchdog:
+    """
+    请求看门狗
+
+    后台守护线程定期巡检进行中的请求，
+    对超过总期限的请求：打印其所在线程的调用栈、计数、并标记为已取消。
+
+    Python无法从外部中断阻塞中的线程，所以取消是协作式的：
+    请求本身受 connect/read 期限约束必然会返回，返回后发现已被取消，就会抛出 RequestTimeoutException，
+    交由重试机制处理，而不会把一个超时的响应交给下游。
+    """
+
+    class Record:
+        __slots__ = ('url', 'kind', 'thread_id', 'start', 'deadline', 'cancelled')
+
+        def __init__(self, url, kind, thread_id, start, deadline):
+            self.url = url
+            self.kind = kind
+            self.thread_id = thread_id
+            self.start = start
+            self.deadline = deadline
+            self.cancelled = False
+
+    instance: Optional['RequestWatchdog'] = None
+    instance_lock = Lock()
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.lock = Lock()
+        self.records: Dict[int, RequestWatchdog.Record] = {}
+        self.cancelled_count = 0
+        self.cancelled_count_by_kind: Dict[str, int] = {}
+
+    @classmethod
+    def get_instance(cls) -> Optional['RequestWatchdog']:
+        """
+        返回全局唯一的看门狗，首次调用时启动巡检线程
+
+        :returns: 关闭看门狗时返回None
+        """
+        if JmModuleConfig.FLAG_ENABLE_REQUEST_WATCHDOG is not True:
+            return None
+
+        if cls.instance is not None:
+            return cls.instance
+
+        with cls.instance_lock:
+            if cls.instance is None:
+                watchdog = cls(JmModuleConfig.VAR_REQUEST_WATCHDOG_INTERVAL)
+                watchdog.start()
+                cls.instance = watchdog
+
+        return cls.instance
+
+    def start(self):
+        from threading import Thread
+        Thread(target=self.run, name='jm-request-watchdog', daemon=True).start()
+
+    def run(self):
+        import time
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                jm_log('req.watchdog.error', f'看门狗巡检异常: {e}')
+
+    def watch(self, url, kind, total: Optional[float]) -> Record:
+        import time
+        from threading import get_ident
+        start = time.time()
+        # 额外留出一个巡检间隔，优先让请求自身的期限生效
+        deadline = start + total + self.interval if total else None
+        record = self.Record(url, kind, get_ident(), start, deadline)
+        with self.lock:
+            self.records[id(record)] = record
+        return record
+
+    def unwatch(self, record: Record):
+        with self.lock:
+            self.records.pop(id(record), None)
+
+    def check(self):
+        import time
+        now = time.time()
+
+        with self.lock:
+            expired = [r for r in self.records.values()
+                       if r.deadline is not None and not r.cancelled and now > r.deadline]
+            for record in expired:
+                record.cancelled = True
+                self.cancelled_count += 1
+                self.cancelled_count_by_kind[record.kind] = self.cancelled_count_by_kind.get(record.kind, 0) + 1
+
+        for record in expired:
+            jm_log('req.watchdog',
+                   f'请求超过总期限，已取消: [{record.url}], '
+                   f'类型: [{record.kind}], '
+                   f'已耗时: [{now - record.start:.1f}s], '
+                   f'累计取消数: [{self.cancelled_count}], '
+                   f'线程调用栈:\n{self.format_thread_stack(record.thread_id)}'
+                   )
+
+    @classmethod
+    def format_thread_stack(cls, thread_id) -> str:
+        import sys
+        import traceback
+        frame = sys._current_frames().get(thread_id, None)
+        if frame is None:
+            return '(线程已结束)'
+        return ''.join(traceback.format_stack(frame))
 
 
 # 抽象基类，实现了域名管理，发请求，重试机制，log，缓存等功能
@@ -16,6 +129,7 @@ class AbstractJmClient(
                  domain_list: List[str],
                  retry_times=0,
                  domain_retry_strategy=None,
+                 timeout=None,
                  ):
         """
         创建JM客户端
@@ -23,9 +137,11 @@ class AbstractJmClient(
         :param postman: 负责实现HTTP请求的对象，持有cookies、headers、proxies等信息
         :param domain_list: 禁漫域名
         :param retry_times: 重试次数
+        :param timeout: 请求期限配置，格式为 {请求类型: {'connect': x, 'read': x, 'total': x}}，请求类型为api/html/image
         """
         super().__init__(postman)
         self.retry_times = retry_times
+        self.timeout = timeout or {}
         self.domain_list = domain_list
         self.domain_retry_strategy = domain_retry_strategy
         self.CLIENT_CACHE = None
@@ -34,10 +150,26 @@ class AbstractJmClient(
             domain_retry_strategy(self)
         self.enable_cache()
         self.after_init()
+        self.prewarm_connections()
 
     def after_init(self):
         pass
 
+    def prewarm_connections(self):
+        """
+        postman支持连接预热时（例如curl_cffi_pool），预热常用域名的连接
+        """
+        prewarm = getattr(self.postman.get_root_postman(), 'prewarm', None)
+        if prewarm is None:
+            return
+
+        prewarm(self.prewarm_url_list())
+
+    def prewarm_url_list(self) -> List[str]:
+        if len(self.domain_list) == 0:
+            return []
+        return [self.of_api_url('/', self.domain_list[0])]
+
     def get(self, url, **kwargs):
         return self.request_with_retry(self.postman.get, url, **kwargs)
 
@@ -72,6 +204,8 @@ class AbstractJmClient(
         :param is_image: 是否是图片请求
         :param kwargs: 请求方法的kwargs
         """
+        self.update_request_with_timeout(kwargs, is_image)
+
         if self.domain_retry_strategy:
             return self.domain_retry_strategy(self,
                                               request,
@@ -108,12 +242,21 @@ class AbstractJmClient(
                    )
 
         try:
-            resp = request(url, **kwargs)
-            # 在最后返回之前，还可以判断resp是否重试
-            resp = self.raise_if_resp_should_retry(resp, is_image)
+            with JmTracer.span('request', 'http',
+                               url=url,
+                               kind=self.request_kind(is_image),
+                               domain_index=domain_index,
+                               retry_count=retry_count,
+                               ):
+                resp = self.send_request(request, url, is_image, **kwargs)
+                # 在最后返回之前，还可以判断resp是否重试
+                resp = self.raise_if_resp_should_retry(resp, is_image)
             return resp
         except Exception as e:
             if self.retry_times == 0:
+                # 不重试时也要处理启动状态缓存失效的情况
+                if not is_image and self.invalidate_bootstrap_cache():
+                    return self.request_with_retry(request, url_backup, 0, 0, is_image, **kwargs)
                 raise e
 
             self.before_retry(e, kwargs, retry_count, url)
@@ -140,6 +283,81 @@ class AbstractJmClient(
         """
         pass
 
+    def send_request(self, request, url, is_image=False, **kwargs):
+        """
+        发出单次请求，并交给看门狗监视，同时记录请求指标
+        """
+        import time
+        kind = self.request_kind(is_image)
+        watchdog = RequestWatchdog.get_instance()
+        record = None
+        total = None
+        if watchdog is not None:
+            total = self.decide_request_timeout(kind)[2]
+            record = watchdog.watch(url, kind, total)
+
+        JmMetrics.record_request_inflight(kind, 1)
+        start = time.perf_counter()
+        resp = None
+        try:
+            resp = request(url, **kwargs)
+        finally:
+            JmMetrics.record_request_inflight(kind, -1)
+            JmMetrics.record_request(kind,
+                                     self.domain_of(url),
+                                     resp is not None and resp.status_code < 400,
+                                     time.perf_counter() - start,
+                                     len(resp.content) if resp is not None else 0,
+                                     )
+            if record is not None:
+                watchdog.unwatch(record)
+
+        if record is not None and record.cancelled:
+            ExceptionTool.raises(f'请求超过总期限[{total}s]，已被取消: [{url}]', {}, RequestTimeoutException)
+
+        return resp
+
+    @staticmethod
+    def domain_of(url: str) -> str:
+        from urllib.parse import urlsplit
+        return urlsplit(url).netloc
+
+    def request_kind(self, is_image: bool) -> str:
+        """
+        请求类型，用于选择请求期限配置: image / api / html
+        """
+        return 'image' if is_image else self.client_key
+
+    def decide_request_timeout(self, kind: str) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """
+        :returns: (connect, read, total)，未配置的项为None
+        """
+        conf = self.timeout.get(kind, None)
+        if conf is None:
+            return None, None, None
+
+        if isinstance(conf, (int, float)):
+            return None, None, conf
+
+        connect, read, total = conf.get('connect', None), conf.get('read', None), conf.get('total', None)
+        if total is not None and connect is not None and read is not None:
+            # curl在非流式请求下的总期限为 connect + read，这里把它收紧到total以内
+            read = max(min(read, total - connect), 1)
+        return connect, read, total
+
+    def update_request_with_timeout(self, kwargs: dict, is_image: bool):
+        """
+        为请求设置期限，除非调用方或postman元数据中已经指定了timeout
+        """
+        if 'timeout' in kwargs or self.get_meta_data('timeout') is not None:
+            return
+
+        connect, read, total = self.decide_request_timeout(self.request_kind(is_image))
+        if connect is not None and read is not None:
+            kwargs['timeout'] = (connect, read)
+        elif total is not None:
+            kwargs['timeout'] = total
+
     # noinspection PyMethodMayBeStatic
     def log_topic(self):
         return self.client_key
@@ -147,6 +365,7 @@ class AbstractJmClient(
     # noinspection PyMethodMayBeStatic, PyUnusedLocal
     def before_retry(self, e, kwargs, retry_count, url):
         jm_log('req.error', str(e))
+        JmMetrics.record_retry(self.domain_of(url))
 
     def enable_cache(self):
         # noinspection PyDefaultArgument,PyShadowingBuiltins
@@ -185,8 +404,10 @@ class AbstractJmClient(
 
                 result = cache.get(key, sentinel)
                 if result is not sentinel:
+                    JmMetrics.record_cache('client', True)
                     return result
 
+                JmMetrics.record_cache('client', False)
                 result = func(*args, **kwargs)
                 cache[key] = result
                 return result
@@ -210,10 +431,23 @@ class AbstractJmClient(
 
     # noinspection PyUnusedLocal
     def fallback(self, request, url, domain_index, retry_count, is_image, **kwargs):
+        if not is_image and self.invalidate_bootstrap_cache():
+            jm_log('req.fallback', f'请求重试全部失败，已删除失效的启动状态缓存，使用最新获取的状态重试: [{url}]')
+            return self.request_with_retry(request, url, 0, 0, is_image, **kwargs)
+
         msg = f"请求重试全部失败: [{url}], {self.domain_list}"
         jm_log('req.fallback', msg)
         ExceptionTool.raises(msg, {}, RequestRetryAllFailException)
 
+    # noinspection PyMethodMayBeStatic
+    def invalidate_bootstrap_cache(self) -> bool:
+        """
+        请求全部失败时回调，删除本client用到的启动状态缓存（见 JmBootstrapCache），并同步获取最新值
+
+        :returns: 是否删除了缓存，为True时会从第一个域名开始重试一轮
+        """
+        return False
+
     # noinspection PyMethodMayBeStatic
     def append_params_to_url(self, url, params):
         from urllib.parse import urlencode
@@ -473,6 +707,18 @@ class JmHtmlClient(AbstractJmClient):
         base_headers.update(latest_headers or {})
         kwargs['headers'] = base_headers
 
+    def invalidate_bootstrap_cache(self) -> bool:
+        cached_domain_list = JmModuleConfig.DOMAIN_HTML_LIST
+        if not JmBootstrapCache.discard('html_domain_list'):
+            return False
+
+        JmModuleConfig.DOMAIN_HTML_LIST = None
+        domain_list = JmModuleConfig.get_html_domain_all_concurrently()
+        # 只替换来自缓存的域名，用户自己配置的域名不动
+        if domain_list and cached_domain_list is not None and sorted(self.domain_list) == sorted(cached_domain_list):
+            self.domain_list = domain_list
+        return True
+
     @classmethod
     def raise_request_error(cls, resp, msg: Optional[str] = None):
         """
@@ -983,16 +1229,23 @@ class JmApiClient(AbstractJmClient):
         if JmModuleConfig.FLAG_API_CLIENT_REQUIRE_COOKIES:
             self.ensure_have_cookies()
 
+    def prewarm_url_list(self) -> List[str]:
+        # 移动端的图片url会随机选用图片域名，所以全部预热
+        return super().prewarm_url_list() + [JmcomicText.format_url('/', domain)
+                                             for domain in JmModuleConfig.DOMAIN_IMAGE_LIST]
+
     client_update_domain_lock = Lock()
 
     def req_api_domain_server(self, url):
-        resp = self.postman.get(url)
+        kwargs = {}
+        self.update_request_with_timeout(kwargs, False)
+        resp = self.postman.get(url, **kwargs)
         text: str = resp.text
         # 去掉开头非ascii字符
         while text and not text[0].isascii():
             text = text[1:]
         res_json = JmCryptoTool.decode_resp_data(text, '', JmMagicConstants.API_DOMAIN_SERVER_SECRET)
-        res_data = json_loads(res_json)
+        res_data = JmModuleConfig.json_loads(res_json)
 
         # 检查返回值
         if not res_data.get('Server', None):
@@ -1002,6 +1255,29 @@ class JmApiClient(AbstractJmClient):
         else:
             return res_data['Server']
 
+    def invalidate_bootstrap_cache(self) -> bool:
+        cached_domain_list = JmModuleConfig.DOMAIN_API_UPDATED_LIST
+        cached_cookies = JmModuleConfig.APP_COOKIES
+        discard_domain = JmBootstrapCache.discard('api_domain_list')
+        discard_cookies = JmBootstrapCache.discard('app_cookies')
+        if not discard_domain and not discard_cookies:
+            return False
+
+        if discard_domain:
+            JmModuleConfig.DOMAIN_API_UPDATED_LIST = None
+            new_server_list = self.fetch_latest_api_domain_for_module()
+            # 只替换来自缓存的域名，用户自己配置的域名不动
+            if new_server_list and cached_domain_list and sorted(self.domain_list) == sorted(cached_domain_list):
+                self.domain_list = new_server_list
+
+        if discard_cookies and JmModuleConfig.APP_COOKIES is cached_cookies:
+            JmModuleConfig.APP_COOKIES = None
+            # 登录等方式设置的cookies不动
+            if cached_cookies is not None and self.get_meta_data('cookies') == cached_cookies:
+                self['cookies'] = self.get_cookies()
+
+        return True
+
     def update_old_api_domain(self, new_server_list: List[str]):
         if new_server_list and sorted(self.domain_list) == sorted(JmModuleConfig.DOMAIN_API_LIST):
             self.domain_list = new_server_list
@@ -1015,25 +1291,18 @@ class JmApiClient(AbstractJmClient):
             if JmModuleConfig.DOMAIN_API_UPDATED_LIST is not None:
                 return JmModuleConfig.DOMAIN_API_UPDATED_LIST
 
-            # 遍历多个域名服务器
-            for url in JmModuleConfig.API_URL_DOMAIN_SERVER_LIST:
-                try:
-                    # 获取域名列表
-                    new_server_list = self.req_api_domain_server(url)
-                    if new_server_list is None:
-                        continue
-                    old_server_list = JmModuleConfig.DOMAIN_API_LIST
-                    jm_log('api.update_domain.success',
-                           f'获取到最新的API域名，替换jmcomic内置域名：(new){new_server_list} ---→ (old){old_server_list}'
-                           )
-                    JmModuleConfig.DOMAIN_API_UPDATED_LIST = new_server_list
-                    return new_server_list
-                except Exception as e:
-                    jm_log('api.update_domain.error',
-                           f'通过[{url}]自动更新API域名失败，尝试下一个地址。'
-                           f'可通过代码[JmModuleConfig.FLAG_API_CLIENT_AUTO_UPDATE_DOMAIN=False]关闭自动更新API域名. 异常： {e}'
-                           )
-                    continue
+            # 优先使用启动状态缓存
+            new_server_list = JmBootstrapCache.get('api_domain_list', self.refresh_api_domain_list)
+            if new_server_list:
+                jm_log('api.update_domain.cache', f'使用缓存的API域名: {new_server_list}')
+                JmModuleConfig.DOMAIN_API_UPDATED_LIST = new_server_list
+                return new_server_list
+
+            new_server_list = self.fetch_api_domain_from_server_list()
+            if new_server_list is not None:
+                JmBootstrapCache.put('api_domain_list', new_server_list)
+                JmModuleConfig.DOMAIN_API_UPDATED_LIST = new_server_list
+                return new_server_list
 
             # 走到这里，说明没有获取到域名更新
             # 为了本方法不被重复执行，把新域名字段修改为空列表
@@ -1041,6 +1310,37 @@ class JmApiClient(AbstractJmClient):
             JmModuleConfig.DOMAIN_API_UPDATED_LIST = []
             return JmModuleConfig.DOMAIN_API_UPDATED_LIST
 
+    def fetch_api_domain_from_server_list(self) -> Optional[List[str]]:
+        # 遍历多个域名服务器
+        for url in JmModuleConfig.API_URL_DOMAIN_SERVER_LIST:
+            try:
+                # 获取域名列表
+                new_server_list = self.req_api_domain_server(url)
+                if new_server_list is None:
+                    continue
+                old_server_list = JmModuleConfig.DOMAIN_API_LIST
+                jm_log('api.update_domain.success',
+                       f'获取到最新的API域名，替换jmcomic内置域名：(new){new_server_list} ---→ (old){old_server_list}'
+                       )
+                return new_server_list
+            except Exception as e:
+                jm_log('api.update_domain.error',
+                       f'通过[{url}]自动更新API域名失败，尝试下一个地址。'
+                       f'可通过代码[JmModuleConfig.FLAG_API_CLIENT_AUTO_UPDATE_DOMAIN=False]关闭自动更新API域名. 异常： {e}'
+                       )
+                continue
+
+        return None
+
+    def refresh_api_domain_list(self):
+        """
+        后台刷新启动状态缓存中的API域名，新域名对之后创建的client生效
+        """
+        new_server_list = self.fetch_api_domain_from_server_list()
+        if new_server_list:
+            JmModuleConfig.DOMAIN_API_UPDATED_LIST = new_server_list
+        return new_server_list
+
     client_init_cookies_lock = Lock()
 
     def ensure_have_cookies(self):
@@ -1055,6 +1355,16 @@ class JmApiClient(AbstractJmClient):
 
     @field_cache("APP_COOKIES", obj=JmModuleConfig)
     def get_cookies(self):
+        # 优先使用启动状态缓存
+        cookies = JmBootstrapCache.get('app_cookies', self.fetch_cookies)
+        if cookies:
+            return cookies
+
+        cookies = self.fetch_cookies()
+        JmBootstrapCache.put('app_cookies', cookies)
+        return cookies
+
+    def fetch_cookies(self):
         resp = self.setting()
         cookies = dict(resp.resp.cookies)
         return cookies
@@ -1,4 +1,4 @@
-from .jm_toolkit import *
+from .jm_metrics import *
 
 """
 
@@ -81,13 +81,44 @@ class JmImageResp(JmResp):
                 path,
             )
 
+    def transfer_to_bytes(self,
+                          suffix,
+                          scramble_id,
+                          decode_image=True,
+                          img_url=None,
+                          ) -> bytes:
+        """
+        和 transfer_to 相同，但是返回图片文件的内容，不写入文件
+
+        :param suffix: 图片格式，例如 .jpg
+        """
+        img_url = img_url or self.url
+        index = img_url.find("?")
+        if index != -1:
+            img_url = img_url[0:index]
+
+        num = 0
+        if decode_image is True and scramble_id is not None:
+            num = JmImageTool.get_num_by_url(scramble_id, img_url)
+
+        if num == 0 and not suffix_not_equal(img_url, suffix):
+            # 不需要解密，也不需要转换格式，直接使用原始数据
+            return self.content
+
+        image = JmImageTool.open_image(self.content)
+        if num != 0:
+            with JmMetrics.time_image_decode():
+                image = JmImageTool.decode_image(num, image)
+
+        return JmImageTool.image_to_bytes(image, suffix)
+
 
 class JmJsonResp(JmResp):
 
     @field_cache()
     def json(self) -> Dict:
         try:
-            return self.resp.json()
+            return JmModuleConfig.json_loads(self.resp.content)
         except Exception as e:
             ExceptionTool.raises_resp(f'json解析失败: {e}', self, JsonResolveFailException)
 
@@ -131,8 +162,14 @@ class JmApiResp(JmJsonResp):
     def res_data(self) -> Any:
         self.require_success()
         self.require_have_data()
-        from json import loads
-        return loads(self.decoded_data)
+        return self.parsed_data()
+
+    @field_cache()
+    def parsed_data(self) -> Any:
+        """
+        解密并解析data，每个响应只执行一次，res_data和model_data共用结果
+        """
+        return JmModuleConfig.json_loads(self.decoded_data)
 
     @property
     def model_data(self) -> AdvancedDict:
@@ -271,7 +308,26 @@ class JmImageClient:
 
     # noinspection PyMethodMayBeStatic
     def save_image_resp(self, decode_image, img_save_path, img_url, resp, scramble_id):
-        resp.transfer_to(img_save_path, scramble_id, decode_image, img_url)
+        with JmTracer.span('image.save', 'io', decode=decode_image and scramble_id is not None):
+            resp.transfer_to(img_save_path, scramble_id, decode_image, img_url)
+
+    def download_image_bytes(self,
+                             img_url: str,
+                             suffix: str,
+                             scramble_id: Optional[int] = None,
+                             decode_image=True,
+                             ) -> bytes:
+        """
+        下载JM的图片，返回图片文件的内容而不是保存到文件，参数同 download_image
+
+        :param suffix: 图片格式，例如 .jpg
+        """
+        resp = self.get_jm_image(img_url)
+
+        resp.require_success()
+
+        with JmTracer.span('image.encode', 'io', decode=decode_image and scramble_id is not None):
+            return resp.transfer_to_bytes(suffix, scramble_id, decode_image, img_url)
 
     def download_by_image_detail(self,
                                  image: JmImageDetail,
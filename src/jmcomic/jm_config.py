@@ -1,3 +1,5 @@
+from typing import List
+
 from common import time_stamp, field_cache, ProxyBuilder
 
 
@@ -9,6 +11,43 @@ def shuffled(lines):
     return ls
 
 
+class lazy_class_field:
+    """
+    延迟计算的类属性，第一次访问时才计算，之后把结果写回类上，成为普通的类属性。
+
+    用于减少 import jmcomic 的耗时，也可以像普通类属性一样直接赋值覆盖。
+    """
+
+    def __init__(self, func):
+        from threading import Lock
+        self.func = func
+        self.lock = Lock()
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        with self.lock:
+            value = owner.__dict__.get(self.name, self)
+            if value is self:
+                value = self.func()
+                setattr(owner, self.name, value)
+            return value
+
+
+def lazy_shuffled(lines):
+    return lazy_class_field(lambda: shuffled(lines))
+
+
+def import_orjson():
+    try:
+        import orjson
+        return orjson
+    except ImportError:
+        return None
+
+
 def default_jm_logging(topic: str, msg: str):
     from common import format_ts, current_thread
     # 修复 Windows 控制台编码问题，使用 ASCII 兼容的括号
@@ -121,7 +160,7 @@ class JmModuleConfig:
     APP_COOKIES = None
 
     # 移动端图片域名
-    DOMAIN_IMAGE_LIST = shuffled('''
+    DOMAIN_IMAGE_LIST = lazy_shuffled('''
     cdn-msp.jmapiproxy1.cc
     cdn-msp.jmapiproxy2.cc
     cdn-msp2.jmapiproxy2.cc
@@ -131,7 +170,7 @@ class JmModuleConfig:
     ''')
 
     # 移动端API域名
-    DOMAIN_API_LIST = shuffled('''
+    DOMAIN_API_LIST = lazy_shuffled('''
     www.cdnaspa.vip
     www.cdnaspa.club
     www.cdnplaystation6.vip
@@ -141,7 +180,7 @@ class JmModuleConfig:
     DOMAIN_API_UPDATED_LIST = None
 
     # 获取最新移动端API域名的地址
-    API_URL_DOMAIN_SERVER_LIST = shuffled('''
+    API_URL_DOMAIN_SERVER_LIST = lazy_shuffled('''
     https://rup4a04-c01.tos-ap-southeast-1.bytepluses.com/newsvr-2025.txt
     https://rup4a04-c02.tos-cn-hongkong.bytepluses.com/newsvr-2025.txt
     ''')
@@ -152,12 +191,12 @@ class JmModuleConfig:
                       'like Gecko) Version/4.0 Chrome/91.0.4472.114 Safari/537.36',
     }
 
-    APP_HEADERS_IMAGE = {
+    APP_HEADERS_IMAGE = lazy_class_field(lambda: {
         'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
         'X-Requested-With': 'com.JMComic3.app',
-        'Referer': PROT + DOMAIN_API_LIST[0],
+        'Referer': JmModuleConfig.PROT + JmModuleConfig.DOMAIN_API_LIST[0],
         'Accept-Language': 'zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7',
-    }
+    })
 
     # 网页端headers
     HTML_HEADERS_TEMPLATE = {
@@ -221,6 +260,14 @@ class JmModuleConfig:
     FLAG_DECODE_URL_WHEN_LOGGING = True
     # 当内置的版本号落后时，使用最新的禁漫app版本号
     FLAG_USE_VERSION_NEWER_IF_BEHIND = True
+    # 启用请求看门狗，巡检并取消超过总期限的请求
+    FLAG_ENABLE_REQUEST_WATCHDOG = True
+    # 启用运行指标（metrics）记录，详见 JmMetrics
+    FLAG_ENABLE_METRICS = True
+    # 启用追踪（trace），把本子/章节/图片/请求/插件各阶段的耗时写入文件，详见 JmTracer
+    FLAG_ENABLE_TRACE = False
+    # 启用启动状态缓存，把API域名和移动端cookies持久化到文件，详见 JmBootstrapCache
+    FLAG_ENABLE_BOOTSTRAP_CACHE = True
 
     # 关联dir_rule的自定义字段与对应的处理函数
     # 例如:
@@ -232,6 +279,27 @@ class JmModuleConfig:
     # 把文件名限制在指定个字符以内
     VAR_FILE_NAME_LENGTH_LIMIT = 100
 
+    # 请求看门狗的巡检间隔（秒）
+    VAR_REQUEST_WATCHDOG_INTERVAL = 1
+    # JmModuleConfig.new_postman 创建的postman的默认请求期限 (connect, read)
+    VAR_POSTMAN_TIMEOUT = (10, 30)
+
+    # 启动状态缓存文件，为None时使用 ~/.jmcomic/bootstrap_cache.json
+    VAR_BOOTSTRAP_CACHE_FILE = None
+    # 启动状态缓存超过该时间（秒）后，会在后台刷新，刷新期间继续使用旧值
+    VAR_BOOTSTRAP_CACHE_TTL = 6 * 60 * 60
+    # 启动状态缓存超过该时间（秒）后视为无效，需要同步重新获取
+    VAR_BOOTSTRAP_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+    # 解析接口返回值使用的json库
+    # auto: 安装了orjson时使用orjson（pip install orjson），否则使用标准库json
+    # json: 始终使用标准库json
+    VAR_JSON_BACKEND = 'auto'
+    # orjson模块，未安装时为None，首次访问时导入
+    MODULE_ORJSON = lazy_class_field(import_orjson)
+    # 追踪文件路径，为None时使用 ./jmcomic_trace_{进程号}.json
+    # 后缀为 .jsonl 时每行写一个span，否则写Chrome trace event格式，可用 chrome://tracing 或 ui.perfetto.dev 打开
+    VAR_TRACE_FILE = None
+
     @classmethod
     def downloader_class(cls):
         if cls.CLASS_DOWNLOADER is not None:
@@ -314,6 +382,10 @@ class JmModuleConfig:
 
         :returns: ['18comic.vip', ..., 'jm365.xyz/ZNPJam'], 最后一个是【APP軟件下載】
         """
+        return cls.fetch_html_domain_all(postman)
+
+    @classmethod
+    def fetch_html_domain_all(cls, postman=None):
         postman = postman or cls.new_postman(session=True)
 
         resp = postman.get(cls.JM_PUB_URL)
@@ -337,21 +409,11 @@ class JmModuleConfig:
         通过禁漫官方的github号的repo获取最新的禁漫域名
         https://github.com/jmcmomic/jmcmomic.github.io
         """
-        postman = postman or cls.new_postman(headers={
-            'authority': 'github.com',
-            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 '
-                          'Safari/537.36'
-        })
+        postman = postman or cls.new_github_postman()
         domain_set = set()
 
         def fetch_domain(url):
-            resp = postman.get(url, allow_redirects=False)
-            text = resp.text
-            from .jm_toolkit import JmcomicText
-            for domain in JmcomicText.analyse_jm_pub_html(text):
-                if domain.startswith('jm365'):
-                    continue
-                domain_set.add(domain)
+            domain_set.update(cls.fetch_html_domain_via_github_page(url, postman))
 
         from common import multi_thread_launcher
 
@@ -362,6 +424,114 @@ class JmModuleConfig:
 
         return domain_set
 
+    @classmethod
+    def new_github_postman(cls):
+        return cls.new_postman(headers={
+            'authority': 'github.com',
+            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 '
+                          'Safari/537.36'
+        })
+
+    @classmethod
+    def fetch_html_domain_via_github_page(cls, url, postman=None) -> List[str]:
+        postman = postman or cls.new_github_postman()
+        resp = postman.get(url, allow_redirects=False)
+        from .jm_toolkit import JmcomicText
+        return [domain for domain in JmcomicText.analyse_jm_pub_html(resp.text) if not domain.startswith('jm365')]
+
+    @classmethod
+    @field_cache("DOMAIN_HTML_LIST")
+    def get_html_domain_all_concurrently(cls):
+        """
+        获取禁漫网页域名，用于网页端client的冷启动
+
+        优先使用启动状态缓存（见 JmBootstrapCache），
+        否则同时向全部来源（永久网域跳转、发布页、github的各个页面）请求，
+        任意一个来源拿到有效域名就立即返回，不再等待其余来源。
+        """
+        domain_list = JmBootstrapCache.get('html_domain_list', cls.race_html_domain_sources)
+        if domain_list:
+            cls.jm_log('module.html_domain_race', f'使用缓存的禁漫网页域名: {domain_list}')
+            return domain_list
+
+        domain_list = cls.race_html_domain_sources()
+        JmBootstrapCache.put('html_domain_list', domain_list)
+        return domain_list
+
+    @classmethod
+    def race_html_domain_sources(cls,
+                                 github_template='https://jmcmomic.github.io/go/{}.html',
+                                 github_index_range=(300, 309),
+                                 ) -> List[str]:
+        """
+        同时请求全部域名来源，返回最先拿到的有效域名，
+        并合并、去重此时已经完成的其他来源的结果。
+
+        尚未完成的来源会被取消：它们之后的结果直接丢弃，
+        由于无法从外部中断线程，正在进行的请求会在postman的期限内自行结束。
+        """
+        from queue import Queue, Empty
+        from threading import Thread, Event
+        from .jm_toolkit import JmcomicText
+
+        sources = {
+            cls.JM_REDIRECT_URL: lambda: [JmcomicText.parse_to_jm_domain(cls.get_html_url())],
+            cls.JM_PUB_URL: lambda: cls.fetch_html_domain_all(),
+        }
+        for i in range(*github_index_range):
+            url = github_template.format(i)
+            sources[url] = lambda u=url: cls.fetch_html_domain_via_github_page(u)
+
+        cancelled = Event()
+        result_queue = Queue()
+
+        def run_source(name, fetch):
+            try:
+                # 发布页的最后一个是APP下载地址，不是网页域名
+                result = [domain for domain in fetch() if '/' not in domain and not domain.startswith('jm365')]
+            except Exception as e:
+                result = e
+            if not cancelled.is_set():
+                result_queue.put((name, result))
+
+        for name, fetch in sources.items():
+            Thread(target=run_source, args=(name, fetch), name='jm-domain-race', daemon=True).start()
+
+        def is_valid(result):
+            return isinstance(result, list) and len(result) != 0
+
+        winner = None
+        finished = []
+        for _ in range(len(sources)):
+            name, result = result_queue.get()
+            finished.append((name, result))
+            if is_valid(result):
+                winner = name
+                break
+
+        # 取消其余来源，并收下已经完成的结果
+        cancelled.set()
+        while True:
+            try:
+                finished.append(result_queue.get_nowait())
+            except Empty:
+                break
+
+        if winner is None:
+            from .jm_toolkit import ExceptionTool
+            ExceptionTool.raises(f'获取禁漫网页域名失败，全部来源均不可用: {[f"{n}: {r}" for n, r in finished]}')
+
+        domain_list = []
+        for _, result in finished:
+            if not is_valid(result):
+                continue
+            for domain in result:
+                if domain not in domain_list:
+                    domain_list.append(domain)
+
+        cls.jm_log('module.html_domain_race', f'获取禁漫网页域名: 最快来源[{winner}] → {domain_list}')
+        return domain_list
+
     @classmethod
     def new_html_headers(cls, domain='18comic.vip'):
         """
@@ -393,11 +563,29 @@ class JmModuleConfig:
     def disable_jm_log(cls):
         cls.FLAG_ENABLE_JM_LOG = False
 
+    @classmethod
+    def json_loads(cls, data):
+        """
+        按 VAR_JSON_BACKEND 解析json
+
+        :param data: str或bytes
+        """
+        if cls.VAR_JSON_BACKEND == 'auto' and cls.MODULE_ORJSON is not None:
+            try:
+                return cls.MODULE_ORJSON.loads(data)
+            except ValueError:
+                # orjson比标准库更严格，解析失败时交给标准库
+                pass
+
+        import json
+        return json.loads(data)
+
     @classmethod
     def new_postman(cls, session=False, **kwargs):
         kwargs.setdefault('impersonate', 'chrome')
         kwargs.setdefault('headers', JmModuleConfig.new_html_headers())
         kwargs.setdefault('proxies', JmModuleConfig.DEFAULT_PROXIES)
+        kwargs.setdefault('timeout', JmModuleConfig.VAR_POSTMAN_TIMEOUT)
 
         from common import Postmans
 
@@ -412,7 +600,7 @@ class JmModuleConfig:
     JM_OPTION_VER = '2.1'
     DEFAULT_CLIENT_IMPL = 'api'  # 默认Client实现类型为网页端
     DEFAULT_CLIENT_CACHE = None  # 默认关闭Client缓存。缓存的配置详见 CacheRegistry
-    DEFAULT_PROXIES = ProxyBuilder.system_proxy()  # 默认使用系统代理
+    DEFAULT_PROXIES = lazy_class_field(ProxyBuilder.system_proxy)  # 默认使用系统代理，首次访问时读取
 
     DEFAULT_OPTION_DICT: dict = {
         'log': None,
@@ -423,6 +611,21 @@ class JmModuleConfig:
             'threading': {
                 'image': 30,
                 'photo': None,
+                # 后台执行 after_photo/after_album 插件的线程数，0表示在下载线程中同步执行
+                'post_process': 0,
+                # 后台插件任务的排队上限，排满后下载线程会等待，为None时为线程数的4倍
+                'post_process_queue': None,
+            },
+            # 把图片直接写入每个章节的压缩包，不保存图片文件，见 JmArchiveSink
+            'archive': {
+                'enable': False,
+                'suffix': 'cbz',
+                # 压缩包所在文件夹，为None时和章节文件夹同级，文件名为章节文件夹名
+                'dir': None,
+                # dir不为None时，压缩包的文件名规则
+                'filename_rule': 'Pid',
+                # store: 只存储不压缩（图片本身已经是压缩格式）；deflate: 压缩
+                'compression': 'store',
             },
         },
         'client': {
@@ -438,6 +641,13 @@ class JmModuleConfig:
             },
             'impl': None,
             'retry_times': 5,
+            # 请求期限（秒），按请求类型区分: api/html为接口请求，image为图片请求
+            # connect: 建立连接的期限，read: 读取响应的期限，total: 单次请求的总期限（超时后会被看门狗取消）
+            'timeout': {
+                'api': {'connect': 10, 'read': 30, 'total': 60},
+                'html': {'connect': 10, 'read': 30, 'total': 60},
+                'image': {'connect': 10, 'read': 60, 'total': 120},
+            },
         },
         'plugins': {
             'valid': 'log',
@@ -516,5 +726,165 @@ class JmModuleConfig:
         cls.REGISTRY_EXCEPTION_LISTENER[etype] = listener
 
 
+class JmBootstrapCache:
+    """
+    启动状态缓存
+
+    JmApiClient初始化时需要先获取最新API域名、再请求/setting拿到cookies，之后才能发出第一个真正的请求，
+    对于短时运行的命令行调用，这部分往往占了大部分耗时。
+
+    本类把这些状态连同写入时间保存到一个小的json文件，启动时直接读取:
+    - 未超过 TTL: 直接使用
+    - 超过 TTL 但未超过 MAX_AGE: 先使用旧值，同时在后台刷新
+    - 超过 MAX_AGE 或不存在: 返回None，由调用方同步获取后 put
+
+    缓存的值可能已经失效（例如域名列表已轮换、cookies被拒绝），
+    使用方在请求全部失败时应调用 discard 删除本次用到的键，再同步获取最新值。
+    """
+
+    from threading import Lock
+    lock = Lock()
+    data = None
+    refreshing_keys = set()
+    # 本进程中实际用到了缓存值的键
+    used_keys = set()
+
+    @classmethod
+    def filepath(cls) -> str:
+        if JmModuleConfig.VAR_BOOTSTRAP_CACHE_FILE is not None:
+            return JmModuleConfig.VAR_BOOTSTRAP_CACHE_FILE
+
+        import os
+        return os.path.join(os.path.expanduser('~'), '.jmcomic', 'bootstrap_cache.json')
+
+    @classmethod
+    def load(cls) -> dict:
+        if cls.data is not None:
+            return cls.data
+
+        with cls.lock:
+            if cls.data is None:
+                cls.data = cls.read_file()
+
+        return cls.data
+
+    @classmethod
+    def read_file(cls) -> dict:
+        import json
+        try:
+            with open(cls.filepath(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            JmModuleConfig.jm_log('bootstrap_cache.error', f'读取启动状态缓存失败: {e}')
+            return {}
+
+    @classmethod
+    def get(cls, key, refresh=None):
+        """
+        读取缓存
+
+        :param key: 缓存键
+        :param refresh: 缓存过期时用于后台刷新的函数，返回新值，返回空值表示刷新失败
+        :returns: 缓存值，不存在或已失效时返回None
+        """
+        if JmModuleConfig.FLAG_ENABLE_BOOTSTRAP_CACHE is not True:
+            return None
+
+        entry = cls.load().get(key, None)
+        if not entry or not entry.get('value', None):
+            return None
+
+        age = time_stamp(False) - entry.get('ts', 0)
+        if age > JmModuleConfig.VAR_BOOTSTRAP_CACHE_MAX_AGE:
+            return None
+
+        if age > JmModuleConfig.VAR_BOOTSTRAP_CACHE_TTL and refresh is not None:
+            cls.refresh_in_background(key, refresh)
+
+        with cls.lock:
+            cls.used_keys.add(key)
+        return entry['value']
+
+    @classmethod
+    def put(cls, key, value):
+        if JmModuleConfig.FLAG_ENABLE_BOOTSTRAP_CACHE is not True or not value:
+            return
+
+        with cls.lock:
+            # 以文件中的最新内容为准，避免覆盖其他进程写入的键
+            data = cls.read_file()
+            data[key] = {'value': value, 'ts': time_stamp(False)}
+            cls.write_file(data)
+
+    @classmethod
+    def discard(cls, key) -> bool:
+        """
+        删除缓存的键，用于缓存值已经失效的情况
+
+        :returns: 本进程是否用到过这个键的缓存值，
+                  为False时说明失败与缓存无关，调用方无需重新获取
+        """
+        with cls.lock:
+            if key not in cls.used_keys:
+                return False
+            cls.used_keys.discard(key)
+
+            data = cls.read_file()
+            if data.pop(key, None) is not None:
+                cls.write_file(data)
+            else:
+                cls.data = data
+
+        JmModuleConfig.jm_log('bootstrap_cache.discard', f'启动状态缓存已失效，删除: [{key}]')
+        return True
+
+    @classmethod
+    def write_file(cls, data: dict):
+        import os
+        import json
+        cls.data = data
+
+        filepath = cls.filepath()
+        tmp_filepath = f'{filepath}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with open(tmp_filepath, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_filepath, filepath)
+        except Exception as e:
+            JmModuleConfig.jm_log('bootstrap_cache.error', f'保存启动状态缓存失败: {e}')
+
+    @classmethod
+    def refresh_in_background(cls, key, refresh):
+        with cls.lock:
+            if key in cls.refreshing_keys:
+                return
+            cls.refreshing_keys.add(key)
+
+        def do_refresh():
+            try:
+                cls.put(key, refresh())
+            except Exception as e:
+                JmModuleConfig.jm_log('bootstrap_cache.error', f'后台刷新启动状态缓存失败: [{key}], 异常: {e}')
+            finally:
+                with cls.lock:
+                    cls.refreshing_keys.discard(key)
+
+        from threading import Thread
+        Thread(target=do_refresh, name=f'jm-bootstrap-refresh-{key}', daemon=True).start()
+
+    @classmethod
+    def clear(cls):
+        import os
+        with cls.lock:
+            cls.data = {}
+            cls.used_keys.clear()
+            if os.path.exists(cls.filepath()):
+                os.remove(cls.filepath())
+
+
 jm_log = JmModuleConfig.jm_log
 disable_jm_log = JmModuleConfig.disable_jm_log
@@ -0,0 +1,673 @@
+# 该文件存放jmcomic的去重工具：带持久化索引的重复文件检测、基于感知哈希的相似图片检测，
+# 不会在import jmcomic时加载，由插件（delete_duplicated_files / near_duplicate_images）按需导入，
+# 也可以单独用来扫描整个本子库
+import os
+import sqlite3
+import hashlib
+from threading import Lock
+
+from .jm_toolkit import *
+
+
+def scan_files(roots: List[str], accept: Callable[[str], bool]) -> Dict[str, Tuple[int, int]]:
+    """
+    递归扫描文件夹
+
+    :param accept: 文件路径 → 是否需要这个文件
+    :return: 文件路径 → (size, mtime_ns)
+    """
+    files = {}
+    stack = [os.path.abspath(root) for root in roots]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and accept(entry.path):
+                    stat = entry.stat(follow_symlinks=False)
+                    files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class JmFileHashIndex:
+    """
+    重复文件检测，分三步逐步缩小需要读取的文件范围:
+    1. 按文件大小分组，大小不同的文件不可能重复，不读取文件内容
+    2. 同大小的文件，比较首尾两块的哈希（partial）
+    3. 首尾都相同的文件，才计算整个文件的哈希（full）
+
+    哈希在线程池中计算（hashlib计算时会释放GIL，可以利用多核）。
+
+    计算结果以 (path, size, mtime) → hash 的形式保存在sqlite中，
+    再次扫描时，大小和修改时间都没变的文件直接使用缓存的哈希，不再读取。
+
+    用法:
+    index = JmFileHashIndex('D:/comic/.jm_file_hash.db')
+    for digest, paths in index.find_duplicates(['D:/comic']).items():
+        print(digest, paths)
+    """
+
+    # 首尾各读取的字节数
+    block_size = 64 * 1024
+    # 计算完整哈希时每次读取的字节数
+    chunk_size = 1024 * 1024
+
+    def __init__(self, index_path: Optional[str] = None, workers: Optional[int] = None):
+        """
+        :param index_path: sqlite文件路径，为None时不持久化（只在本次扫描中有效）
+        :param workers: 计算哈希的线程数，默认为cpu核数
+        """
+        self.index_path = index_path
+        self.workers = workers or os.cpu_count() or 1
+        self.lock = Lock()
+        self.conn = self.connect()
+
+    def connect(self) -> sqlite3.Connection:
+        if self.index_path is not None:
+            mkdir_if_not_exists(os.path.dirname(os.path.abspath(self.index_path)))
+
+        conn = sqlite3.connect(self.index_path or ':memory:', timeout=30, check_same_thread=False)
+        if self.index_path is not None:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS file_hash ('
+                     'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, partial TEXT, full TEXT)')
+        conn.commit()
+        return conn
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def is_index_file(self, path: str) -> bool:
+        if self.index_path is None:
+            return False
+        index_path = os.path.abspath(self.index_path)
+        return path in (index_path, index_path + '-wal', index_path + '-shm', index_path + '-journal')
+
+    def find_duplicates(self, roots: List[str], min_count=2) -> Dict[str, List[str]]:
+        """
+        查找内容相同的文件
+
+        :param roots: 要扫描的文件夹
+        :param min_count: 相同内容至少出现多少次才返回
+        :return: 哈希 → 文件路径列表（按路径排序）
+        """
+        files = scan_files(roots, lambda path: not self.is_index_file(path))
+
+        # 1. 按大小分组
+        candidates = [
+            paths
+            for paths in self.group_by(files, lambda path: files[path][0]).values()
+            if len(paths) >= min_count
+        ]
+        paths = [path for group in candidates for path in group]
+        cached = self.load_cached(paths, files)
+        # 本次新计算了哈希的文件
+        dirty = set()
+
+        # 2. 首尾哈希
+        partial = self.compute('partial', paths, files, cached, dirty)
+        candidates = [
+            group
+            for paths in candidates
+            for group in self.group_by(paths, lambda path: partial[path]).values()
+            if len(group) >= min_count
+        ]
+
+        # 3. 完整哈希
+        paths = [path for group in candidates for path in group]
+        full = self.compute('full', paths, files, cached, dirty)
+
+        self.save(files, cached, dirty)
+
+        duplicates = {}
+        for group in candidates:
+            for digest, paths in self.group_by(group, lambda path: full[path]).items():
+                if len(paths) >= min_count:
+                    duplicates[digest] = sorted(paths)
+        return duplicates
+
+    @staticmethod
+    def group_by(paths, key) -> Dict[Any, List[str]]:
+        groups = {}
+        for path in paths:
+            groups.setdefault(key(path), []).append(path)
+        return groups
+
+    def load_cached(self, paths: List[str], files: Dict[str, Tuple[int, int]]) -> Dict[str, list]:
+        """
+        读取大小和修改时间都没变的文件的缓存哈希
+
+        :return: 文件路径 → [partial, full]
+        """
+        cached = {}
+        with self.lock:
+            # sqlite单条语句的参数个数有上限
+            for i in range(0, len(paths), 500):
+                batch = paths[i:i + 500]
+                rows = self.conn.execute(
+                    f'SELECT path, size, mtime_ns, partial, full FROM file_hash '
+                    f'WHERE path IN ({",".join("?" * len(batch))})',
+                    batch,
+                )
+                for path, size, mtime_ns, partial, full in rows:
+                    if files[path] == (size, mtime_ns):
+                        cached[path] = [partial, full]
+        return cached
+
+    def compute(self, kind: str, paths: List[str], files, cached: Dict[str, list], dirty: set) -> Dict[str, str]:
+        """
+        计算哈希，有缓存的直接使用缓存
+
+        :param kind: partial / full
+        """
+        slot = 0 if kind == 'partial' else 1
+        result = {}
+        todo = []
+        for path in paths:
+            digest = cached.get(path, (None, None))[slot]
+            if digest is not None:
+                result[path] = digest
+            else:
+                todo.append(path)
+
+        if not todo:
+            return result
+
+        func = self.partial_hash if kind == 'partial' else self.full_hash
+        if self.workers <= 1 or len(todo) == 1:
+            digests = map(func, todo, (files[path][0] for path in todo))
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='file-hash') as executor:
+                digests = list(executor.map(func, todo, [files[path][0] for path in todo]))
+
+        for path, digest in zip(todo, digests):
+            result[path] = digest
+            entry = cached.setdefault(path, [None, None])
+            entry[slot] = digest
+            if kind == 'partial' and not digest.startswith('p'):
+                # 小文件的首尾哈希就是完整哈希
+                entry[1] = digest
+            dirty.add(path)
+        return result
+
+    @classmethod
+    def partial_hash(cls, path: str, size: int) -> str:
+        """
+        文件首尾两块的哈希，文件不大于两块时等于完整哈希
+        """
+        if size <= 2 * cls.block_size:
+            return cls.full_hash(path, size)
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            digest.update(f.read(cls.block_size))
+            f.seek(-cls.block_size, os.SEEK_END)
+            digest.update(f.read(cls.block_size))
+        return 'p' + digest.hexdigest()
+
+    @classmethod
+    def full_hash(cls, path: str, size: int = None) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def save(self, files, cached: Dict[str, list], dirty: set):
+        """
+        把本次计算的哈希写入索引，一个事务批量提交
+        """
+        rows = [(path, *files[path], *cached[path]) for path in dirty]
+        if not rows:
+            return
+
+        with self.lock:
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO file_hash VALUES (?, ?, ?, ?, ?)', rows)
+
+    def forget(self, paths: List[str]):
+        """
+        删除文件后，从索引中移除
+        """
+        with self.lock:
+            with self.conn:
+                self.conn.executemany('DELETE FROM file_hash WHERE path = ?', [(path,) for path in paths])
+
+
+class JmImageHashIndex:
+    """
+    基于感知哈希（pHash / dHash）的相似图片检测，用于找出重新编码、重新上传的本子中内容相同的图片，
+    这些图片的字节不同，JmFileHashIndex 检测不出来。
+
+    - 图片缩小为灰度小图后，用NumPy批量计算64位指纹
+    - 指纹保存在npz文件中（uint64数组 + 路径、大小、修改时间），再次扫描时只计算新增或修改过的图片
+    - 近邻查找使用multi-index hashing: 把64位指纹切成 max_distance+1 段，
+      汉明距离不超过max_distance的两个指纹至少有一段完全相同（抽屉原理），
+      只需要在每段取值相同的指纹之间计算汉明距离
+
+    依赖numpy，用法:
+    index = JmImageHashIndex('D:/comic/.jm_image_hash.npz')
+    index.update(['D:/comic'])
+    for paths in index.find_groups(max_distance=4):
+        print(paths)
+    """
+
+    img_suffixes = frozenset({'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'})
+    # 每批计算的图片数
+    batch_size = 1024
+
+    def __init__(self, index_path: Optional[str] = None, method='phash', workers: Optional[int] = None):
+        """
+        :param index_path: 指纹文件路径（npz），为None时不持久化
+        :param method: phash / dhash
+        :param workers: 解码图片的线程数，默认为cpu核数
+        """
+        import numpy as np
+        ExceptionTool.require_true(method in ('phash', 'dhash'), f'不支持的感知哈希算法: {method}')
+
+        self.index_path = index_path
+        self.method = method
+        self.workers = workers or os.cpu_count() or 1
+
+        self.paths: List[str] = []
+        self.sizes = np.zeros(0, dtype=np.int64)
+        self.mtimes = np.zeros(0, dtype=np.int64)
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.load()
+
+    def load(self):
+        import numpy as np
+        if self.index_path is None or not file_exists(self.index_path):
+            return
+
+        try:
+            with np.load(self.index_path) as data:
+                if str(data['method']) != self.method:
+                    return
+                self.paths = data['paths'].tolist()
+                self.sizes = data['sizes']
+                self.mtimes = data['mtimes']
+                self.hashes = data['hashes']
+        except (OSError, ValueError, KeyError) as e:
+            jm_log('dedup.index', f'指纹文件读取失败，将重新计算: {self.index_path}, {e}')
+
+    def save(self):
+        import numpy as np
+        if self.index_path is None:
+            return
+
+        mkdir_if_not_exists(os.path.dirname(os.path.abspath(self.index_path)))
+        part_path = self.index_path + '.part'
+        with open(part_path, 'wb') as f:
+            np.savez(f,
+                     method=np.array(self.method),
+                     paths=np.array(self.paths, dtype=str),
+                     sizes=self.sizes,
+                     mtimes=self.mtimes,
+                     hashes=self.hashes,
+                     )
+        os.replace(part_path, self.index_path)
+
+    def update(self, roots: List[str]):
+        """
+        扫描文件夹，计算新增和修改过的图片的指纹，已删除的图片从索引中移除
+        """
+        import numpy as np
+
+        files = scan_files(roots, lambda path: os.path.splitext(path)[1].lower() in self.img_suffixes)
+        roots = [os.path.join(os.path.abspath(root), '') for root in roots]
+
+        # 保留: 不在本次扫描范围内的，以及没有变化的
+        old = {path: i for i, path in enumerate(self.paths)}
+        keep = []
+        for path, i in old.items():
+            if path in files:
+                if files[path] == (self.sizes[i], self.mtimes[i]):
+                    keep.append(i)
+            elif not any(path.startswith(root) for root in roots):
+                keep.append(i)
+
+        keep_set = {self.paths[i] for i in keep}
+        todo = [path for path in files if path not in keep_set]
+        hashes, ok_paths = self.compute(todo)
+
+        keep = np.array(keep, dtype=np.int64)
+        self.paths = [self.paths[i] for i in keep] + ok_paths
+        self.sizes = np.concatenate([self.sizes[keep], np.array([files[p][0] for p in ok_paths], dtype=np.int64)])
+        self.mtimes = np.concatenate([self.mtimes[keep], np.array([files[p][1] for p in ok_paths], dtype=np.int64)])
+        self.hashes = np.concatenate([self.hashes[keep], hashes])
+        self.save()
+
+        jm_log('dedup.index', f'图片指纹更新完成: 共{len(self.paths)}张，本次计算{len(ok_paths)}张')
+
+    def compute(self, paths: List[str]):
+        """
+        分批计算指纹，图片在线程池中解码、缩小（PIL解码时会释放GIL）
+
+        :return: (指纹数组, 计算成功的图片路径)
+        """
+        import numpy as np
+        from concurrent.futures import ThreadPoolExecutor
+
+        size = (32, 32) if self.method == 'phash' else (9, 8)
+        hash_ls, ok_paths = [np.zeros(0, dtype=np.uint64)], []
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-hash') as executor:
+            for i in range(0, len(paths), self.batch_size):
+                batch = paths[i:i + self.batch_size]
+                pixels = list(executor.map(lambda path: self.load_gray(path, size), batch))
+                ok = [j for j, p in enumerate(pixels) if p is not None]
+                if not ok:
+                    continue
+
+                stack = np.stack([pixels[j] for j in ok])
+                hash_ls.append(self.phash(stack) if self.method == 'phash' else self.dhash(stack))
+                ok_paths.extend(batch[j] for j in ok)
+
+        return np.concatenate(hash_ls), ok_paths
+
+    @staticmethod
+    def load_gray(path: str, size: Tuple[int, int]):
+        """
+        :return: 缩小后的灰度图（height × width 的uint8数组），读取失败返回None
+        """
+        import numpy as np
+        from PIL import Image
+
+        try:
+            with Image.open(path) as img:
+                # jpg可以在解码时直接缩小，快很多
+                img.draft('L', (size[0] * 4, size[1] * 4))
+                return np.asarray(img.convert('L').resize(size, Image.BILINEAR), dtype=np.uint8)
+        except (OSError, ValueError) as e:
+            jm_log('dedup.image', f'图片读取失败: {path}, {e}')
+            return None
+
+    @staticmethod
+    def pack_bits(bits):
+        """
+        (N, 64) 的bool数组 → (N,) 的uint64
+        """
+        import numpy as np
+        return np.packbits(bits.reshape(len(bits), 64), axis=1).view('>u8').ravel().astype(np.uint64)
+
+    @classmethod
+    def dhash(cls, pixels):
+        """
+        :param pixels: (N, 8, 9) 的灰度图，每个像素和右边的像素比较
+        """
+        return cls.pack_bits(pixels[:, :, 1:] > pixels[:, :, :-1])
+
+    @classmethod
+    def phash(cls, pixels):
+        """
+        :param pixels: (N, 32, 32) 的灰度图，二维DCT后取左上角8×8的低频系数，和中位数比较（不含直流分量）
+        """
+        import numpy as np
+
+        n = pixels.shape[1]
+        k = np.arange(n)
+        dct = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+        dct[0] /= np.sqrt(2)
+
+        coefficients = dct @ pixels.astype(np.float64) @ dct.T
+        low = coefficients[:, :8, :8].reshape(len(pixels), 64)
+        median = np.median(low[:, 1:], axis=1)
+        return cls.pack_bits(low > median[:, None])
+
+    @staticmethod
+    def popcount(values):
+        import numpy as np
+        if hasattr(np, 'bitwise_count'):
+            return np.bitwise_count(values)
+
+        table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+        return table[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+    def find_pairs(self, max_distance=4, hashes=None):
+        """
+        查找汉明距离不超过max_distance的指纹对
+
+        :param hashes: 要查找的指纹，默认为索引中的全部指纹
+        :return: (指纹数组, 指纹对i, 指纹对j)，i和j是指纹数组的下标，指纹数组是去重后的
+        """
+        import numpy as np
+
+        # 完全相同的指纹（例如大量空白页）先合并，避免同一段内出现很长的相同段
+        unique = np.unique(self.hashes if hashes is None else hashes)
+        pair_i, pair_j = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+
+        segment_count = max_distance + 1
+        bounds = np.linspace(0, 64, segment_count + 1).astype(np.int64)
+
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if stop == start:
+                continue
+            keys = (unique >> np.uint64(start)) & np.uint64((1 << int(stop - start)) - 1)
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+
+            # 段值相同的指纹在排序后相邻，依次比较间隔为1、2、3...的指纹
+            offset = 1
+            while offset < len(keys):
+                same = np.nonzero(keys[offset:] == keys[:-offset])[0]
+                if len(same) == 0:
+                    break
+                i, j = order[same], order[same + offset]
+                near = self.popcount(unique[i] ^ unique[j]) <= max_distance
+                pair_i.append(i[near])
+                pair_j.append(j[near])
+                offset += 1
+
+        pair_i, pair_j = np.concatenate(pair_i), np.concatenate(pair_j)
+        # 同一对可能在多个段中都被找到
+        pairs = np.unique(np.stack([np.minimum(pair_i, pair_j), np.maximum(pair_i, pair_j)], axis=1), axis=0)
+        return unique, pairs[:, 0], pairs[:, 1]
+
+    def find_groups(self, max_distance=4, min_count=2, roots: Optional[List[str]] = None) -> List[List[str]]:
+        """
+        相似图片分组（相似关系传递: a和b相似、b和c相似，则a、b、c为一组）
+
+        :param roots: 只对这些文件夹下的图片分组，默认为索引中的全部图片。
+                      索引会保留扫描范围以外的图片（见 update），只检测部分文件夹时需要传这个参数
+        :return: [[图片路径, ...], ...]，每组按路径排序
+        """
+        import numpy as np
+
+        paths, hashes = self.paths, self.hashes
+        if roots is not None:
+            roots = tuple(os.path.join(os.path.abspath(root), '') for root in roots)
+            mask = np.array([path.startswith(roots) for path in paths], dtype=bool)
+            paths = [path for path, selected in zip(paths, mask.tolist()) if selected]
+            hashes = hashes[mask] if len(mask) != 0 else hashes
+
+        if len(hashes) == 0:
+            return []
+
+        unique, pair_i, pair_j = self.find_pairs(max_distance, hashes)
+
+        # 并查集
+        parent = np.arange(len(unique))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for i, j in zip(pair_i.tolist(), pair_j.tolist()):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        group_roots = np.array([find(x) for x in range(len(unique))])
+        group_of_path = group_roots[np.searchsorted(unique, hashes)]
+
+        groups = {}
+        for path, group in zip(paths, group_of_path.tolist()):
+            groups.setdefault(group, []).append(path)
+
+        return [sorted(paths) for paths in groups.values() if len(paths) >= min_count]
+
+
+class JmAlbumTitleIndex:
+    """
+    本子标题索引，用于在下载前发现同一作品的不同本子（例如不同汉化组的重新上传，本子id不同）。
+
+    标题用 JmcomicText.tokenize 切分，去掉括号中的汉化组、展会、语言等标签，
+    剩下的每个标题（中文译名、原名）归一化后和每个作者组成一个key，
+    两个本子只要有一个key相同，就认为可能是同一作品。
+    括号中的分篇标记（前篇/後篇、上/下、完結、番外、vol.2、第2卷等）不会去掉，而是加在key的末尾，
+    同一作品的不同分篇不会被当成重复。
+
+    key保存在sqlite中（key上有索引），本子库再大，每次查询也只是几次索引查找。
+
+    用法:
+    index = JmAlbumTitleIndex('D:/comic/.jm_album_title.db')
+    index.find(album.album_id, album.name, album.authors)  # → [(album_id, name), ...]
+    index.add(album.album_id, album.name, album.authors)
+    """
+
+    # key的生成规则变化时加1，旧版本的索引会被清空（由调用方重新导入）
+    key_version = 1
+    # 归一化之后的分篇标记，见 title_keys（没有安装zhconv时不会转为简体，所以繁体也要列出）
+    pattern_part = compile(
+        r'(?:前|中|后|後|上|下|续|續|最终|最終|总集|總集|特别|特別|番外)(?:篇|编|編|卷|部|话|話|集|册|冊|章|回)?'
+        r'|完结|完結|(?:vol|volume|part|no|ch|chapter|ep|第)?\d+(?:篇|编|編|卷|部|话|話|集|册|冊|章|回|弹|彈)?'
+        r'|第?[一二三四五六七八九十百零两兩]+(?:篇|编|編|卷|部|话|話|集|册|冊|章|回|弹|彈)?'
+    )
+
+    def __init__(self, index_path: Optional[str] = None):
+        """
+        :param index_path: sqlite文件路径，为None时不持久化
+        """
+        self.index_path = index_path
+        self.lock = Lock()
+
+        if index_path is not None:
+            mkdir_if_not_exists(os.path.dirname(os.path.abspath(index_path)))
+        self.conn = sqlite3.connect(index_path or ':memory:', timeout=30, check_same_thread=False)
+        if index_path is not None:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS album_key ('
+                          'key TEXT, album_id TEXT, name TEXT, PRIMARY KEY (key, album_id))')
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != self.key_version:
+            self.conn.execute('DELETE FROM album_key')
+            self.conn.execute(f'PRAGMA user_version = {self.key_version}')
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        全角转半角、小写、繁体转简体（安装了zhconv时），只保留文字和数字
+        """
+        import unicodedata
+        text = unicodedata.normalize('NFKC', text).lower()
+        try:
+            import zhconv
+            text = zhconv.convert(text, 'zh-cn')
+        except ImportError:
+            pass
+        return ''.join(c for c in text if c.isalnum())
+
+    @classmethod
+    def title_keys(cls, name: str, authors: Optional[List[str]]) -> List[str]:
+        words, parts = [], []
+        for word in JmcomicText.tokenize(name):
+            if word[0] not in JmcomicText.bracket_map:
+                words.append(word)
+                continue
+
+            # (前篇) (後篇) 等分篇标记要保留，否则同一作品的不同分篇会得到相同的key
+            part = cls.normalize(word)
+            if cls.pattern_part.fullmatch(part):
+                parts.append(part)
+
+        titles = {cls.normalize(word) for word in (words or [name])}
+        # 太短的标题（例如只有一个字）区分度太低
+        titles = {title for title in titles if len(title) >= 2}
+
+        suffix = ''.join(f'\t{part}' for part in parts)
+        author_keys = {cls.normalize(author) for author in authors or []} or {''}
+        return sorted(f'{author}\t{title}{suffix}' for author in author_keys for title in titles)
+
+    def find(self, album_id: str, name: str, authors: Optional[List[str]]) -> List[Tuple[str, str]]:
+        """
+        查找和这个本子可能是同一作品的其他本子
+
+        :return: [(album_id, name)]
+        """
+        keys = self.title_keys(name, authors)
+        if not keys:
+            return []
+
+        with self.lock:
+            rows = self.conn.execute(
+                f'SELECT DISTINCT album_id, name FROM album_key '
+                f'WHERE key IN ({",".join("?" * len(keys))}) AND album_id != ?',
+                [*keys, str(album_id)],
+            ).fetchall()
+        return rows
+
+    def add(self, album_id: str, name: str, authors: Optional[List[str]]):
+        self.add_all([(album_id, name, authors)])
+
+    def add_all(self, albums: List[Tuple[str, str, Optional[List[str]]]]):
+        """
+        批量添加，一个事务提交
+        """
+        rows = [
+            (key, str(album_id), name)
+            for album_id, name, authors in albums
+            for key in self.title_keys(name, authors)
+        ]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO album_key VALUES (?, ?, ?)', rows)
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM album_key LIMIT 1').fetchone() is None
+
+    def import_library(self, base_dir: str, max_depth=3) -> int:
+        """
+        从本地库的 metadata.json（见 MetadataPlugin）导入已下载的本子
+
+        :return: 导入的本子数
+        """
+        albums = []
+        base_dir = os.path.abspath(base_dir)
+        for root, dirs, files in os.walk(base_dir):
+            if root[len(base_dir):].count(os.sep) >= max_depth:
+                dirs.clear()
+
+            if 'metadata.json' not in files:
+                continue
+
+            try:
+                with open(os.path.join(root, 'metadata.json'), 'r', encoding='utf-8') as f:
+                    metadata = JmModuleConfig.json_loads(f.read())
+                albums.append((str(metadata['album_id']), metadata['name'], metadata.get('authors', [])))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                jm_log('dedup.title', f'读取metadata.json失败: {root}, {e}')
+
+        self.add_all(albums)
+        return len(albums)
@@ -14,6 +14,7 @@ def catch_exception(func):
             if detail.is_image():
                 detail: JmImageDetail
                 jm_log('image.failed', f'图片下载失败: [{detail.download_url}], 异常: [{e}]')
+                JmMetrics.record_image('failed')
                 self.download_failed_image.append((detail, e))
 
             elif detail.is_photo():
@@ -68,6 +69,122 @@ class DownloadCallback:
                f'图片下载完成: {image.tag}, [{image.img_url}] → [{img_save_path}]')
 
 
+class PhotoArchiveWriter:
+    """
+    按页码顺序把一个章节的图片写入压缩包
+
+    图片下载完成的顺序是乱的，前面还有页没到时，后到的页先缓存在内存中，等前面的页写入后再依次写入。
+    压缩包先写到 {path}.part，finish时再重命名为最终文件，中途失败不会留下不完整的压缩包。
+    """
+
+    def __init__(self, path: str, compression: str):
+        import zipfile
+        self.path = path
+        self.part_path = path + '.part'
+        self.zip = zipfile.ZipFile(
+            self.part_path,
+            'w',
+            zipfile.ZIP_STORED if compression == 'store' else zipfile.ZIP_DEFLATED,
+        )
+        self.lock = Lock()
+        # 下一个要写入的页码，从1开始
+        self.next_index = 1
+        # 页码 -> (压缩包内的文件名, 图片数据)
+        self.pending: Dict[int, Tuple[str, bytes]] = {}
+
+    def write(self, index: int, arcname: str, data: bytes):
+        with self.lock:
+            self.pending[index] = (arcname, data)
+            while self.next_index in self.pending:
+                self.zip.writestr(*self.pending.pop(self.next_index))
+                self.next_index += 1
+
+    def finish(self, success=True):
+        """
+        :param success: 为False时丢弃压缩包
+        """
+        with self.lock:
+            # 缺页（下载失败、被过滤）之后的页
+            for index in sorted(self.pending):
+                self.zip.writestr(*self.pending.pop(index))
+            self.zip.close()
+
+            if success:
+                os.replace(self.part_path, self.path)
+            else:
+                os.remove(self.part_path)
+
+
+class JmArchiveSink:
+    """
+    download.archive.enable 为 true 时，JmDownloader 不保存图片文件，
+    而是把解密后的图片直接写入每个章节的压缩包（cbz/zip），省去 写图片 → 读图片压缩 → 删除图片 的磁盘读写。
+
+    option配置示例:
+
+    download:
+      archive:
+        enable: true
+        suffix: cbz
+        dir: ./cbz # 为空时压缩包和章节文件夹同级
+        filename_rule: Pid
+        compression: store
+
+    章节的压缩包在 after_photo 插件执行前完成，有图片下载失败时不生成压缩包。
+    download.cache 为 true 且压缩包已存在时，跳过该章节的图片下载。
+    这个模式下没有图片文件，依赖图片文件的插件（zip、img2pdf、long_img等）不适用。
+    """
+
+    def __init__(self, option: JmOption):
+        self.option = option
+        self.lock = Lock()
+        # photo -> writer，为None表示压缩包已存在，不需要下载
+        self.writers: Dict[JmPhotoDetail, Optional[PhotoArchiveWriter]] = {}
+
+    @classmethod
+    def of(cls, option: JmOption) -> Optional['JmArchiveSink']:
+        archive = option.download.get('archive', None)
+        if not archive or archive.get('enable', False) is not True:
+            return None
+        return cls(option)
+
+    def archive_path(self, photo: JmPhotoDetail) -> str:
+        return self.option.decide_photo_archive_path(photo)
+
+    def open(self, photo: JmPhotoDetail):
+        path = self.archive_path(photo)
+        writer = None
+        if not (self.option.download.cache is True and file_exists(path)):
+            writer = PhotoArchiveWriter(path, self.option.download.archive.compression)
+
+        with self.lock:
+            self.writers[photo] = writer
+
+    def is_archived(self, photo: JmPhotoDetail) -> bool:
+        """
+        章节的压缩包已存在
+        """
+        with self.lock:
+            return self.writers.get(photo, None) is None
+
+    def write(self, image: JmImageDetail, arcname: str, data: bytes):
+        with self.lock:
+            writer = self.writers[image.from_photo]
+        writer.write(image.index, arcname, data)
+
+    def close(self, photo: JmPhotoDetail, success: bool):
+        with self.lock:
+            writer = self.writers.pop(photo, None)
+        if writer is None:
+            return
+
+        writer.finish(success)
+        if success:
+            jm_log('photo.archive', f'章节压缩包写入完成: [{photo.id}] → [{writer.path}]')
+        else:
+            jm_log('photo.archive', f'章节有图片下载失败，丢弃压缩包: [{photo.id}]')
+
+
 class JmDownloader(DownloadCallback):
     """
     JmDownloader = JmOption + 调度逻辑
@@ -81,69 +198,133 @@ class JmDownloader(DownloadCallback):
         # 下载失败的记录list
         self.download_failed_image: List[Tuple[JmImageDetail, BaseException]] = []
         self.download_failed_photo: List[Tuple[JmPhotoDetail, BaseException]] = []
+        # 直接写入压缩包的模式，未开启时为None
+        self.archive_sink: Optional[JmArchiveSink] = JmArchiveSink.of(option)
+        # with语句结束时执行的清理回调，见 add_exit_callback
+        self.exit_callbacks: List[Callable[[], None]] = []
+
+    def add_exit_callback(self, callback: Callable[[], None]):
+        """
+        注册with语句结束时执行的清理回调（无论下载成功、失败还是被跳过），
+        用于插件清理 before_album 中创建、但可能因为 after_album 没有执行而遗留的状态
+        """
+        self.exit_callbacks.append(callback)
 
     def download_album(self, album_id):
-        album = self.client.get_album_detail(album_id)
+        with JmTracer.span('album.fetch', 'download', id=album_id):
+            album = self.client.get_album_detail(album_id)
         self.download_by_album_detail(album)
+        # 等待这个本子在后台执行的插件
+        self.option.wait_post_process(album)
         return album
 
     def download_by_album_detail(self, album: JmAlbumDetail):
-        self.before_album(album)
-        if album.skip:
-            return
-        self.execute_on_condition(
-            iter_objs=album,
-            apply=self.download_by_photo_detail,
-            count_batch=self.option.decide_photo_batch_count(album)
-        )
-        self.after_album(album)
+        with JmTracer.span('album', 'download', id=album.id):
+            self.before_album(album)
+            if album.skip:
+                return
+            self.execute_on_condition(
+                iter_objs=album,
+                apply=self.download_by_photo_detail,
+                count_batch=self.option.decide_photo_batch_count(album)
+            )
+            self.after_album(album)
 
     def download_photo(self, photo_id):
-        photo = self.client.get_photo_detail(photo_id)
+        with JmTracer.span('photo.fetch', 'download', id=photo_id):
+            photo = self.client.get_photo_detail(photo_id)
         self.download_by_photo_detail(photo)
+        self.option.wait_post_process(photo.from_album)
         return photo
 
     @catch_exception
     def download_by_photo_detail(self, photo: JmPhotoDetail):
-        self.client.check_photo(photo)
-
-        self.before_photo(photo)
-        if photo.skip:
-            return
-        self.execute_on_condition(
-            iter_objs=photo,
-            apply=self.download_by_image_detail,
-            count_batch=self.option.decide_image_batch_count(photo)
-        )
-        self.after_photo(photo)
+        with JmTracer.span('photo', 'download', id=photo.photo_id):
+            with JmTracer.span('photo.check', 'download'):
+                self.client.check_photo(photo)
+
+            self.before_photo(photo)
+            if photo.skip:
+                return
+            try:
+                self.execute_on_condition(
+                    iter_objs=photo,
+                    apply=self.download_by_image_detail,
+                    count_batch=self.option.decide_image_batch_count(photo)
+                )
+            except BaseException:
+                if self.archive_sink is not None:
+                    self.archive_sink.close(photo, False)
+                raise
+            self.after_photo(photo)
 
     @catch_exception
     def download_by_image_detail(self, image: JmImageDetail):
-        img_save_path = self.option.decide_image_filepath(image)
+        if self.archive_sink is not None:
+            return self.download_image_to_archive(image)
 
-        image.save_path = img_save_path
-        image.exists = file_exists(img_save_path)
+        with JmTracer.span('image', 'download', photo_id=image.aid, index=image.index):
+            img_save_path = self.option.decide_image_filepath(image)
 
-        self.before_image(image, img_save_path)
+            image.save_path = img_save_path
+            image.exists = file_exists(img_save_path)
 
-        if image.skip:
-            return
+            self.before_image(image, img_save_path)
 
-        # let option decide use_cache and decode_image
-        use_cache = self.option.decide_download_cache(image)
-        decode_image = self.option.decide_download_image_decode(image)
+            if image.skip:
+                return
 
-        # skip download
-        if use_cache is True and image.exists:
-            return
+            # let option decide use_cache and decode_image
+            use_cache = self.option.decide_download_cache(image)
+            decode_image = self.option.decide_download_image_decode(image)
 
-        self.client.download_by_image_detail(
-            image,
-            img_save_path,
-            decode_image=decode_image,
-        )
+            # skip download
+            if use_cache is True and image.exists:
+                JmMetrics.record_image('cached')
+                return
+
+            self.client.download_by_image_detail(
+                image,
+                img_save_path,
+                decode_image=decode_image,
+            )
+            JmMetrics.record_image('downloaded')
+
+            self.after_image(image, img_save_path)
+
+    def download_image_to_archive(self, image: JmImageDetail):
+        """
+        download.archive 模式: 图片不落地，直接写入章节的压缩包
+        """
+        sink = self.archive_sink
+        photo = image.from_photo
+
+        with JmTracer.span('image', 'download', photo_id=image.aid, index=image.index):
+            archive_path = sink.archive_path(photo)
+
+            image.save_path = archive_path
+            image.exists = sink.is_archived(photo)
+
+            self.before_image(image, archive_path)
+
+            if image.skip:
+                return
 
-        self.after_image(image, img_save_path)
+            if image.exists:
+                JmMetrics.record_image('cached')
+                return
+
+            suffix = self.option.decide_image_suffix(image)
+            data = self.client.download_image_bytes(
+                image.download_url,
+                suffix,
+                int(image.scramble_id),
+                decode_image=self.option.decide_download_image_decode(image),
+            )
+            sink.write(image, fix_windir_name(self.option.decide_image_filename(image)) + suffix, data)
+            JmMetrics.record_image('downloaded')
+
+            self.after_image(image, archive_path)
 
     def execute_on_condition(self,
                              iter_objs: DetailEntity,
@@ -159,17 +340,31 @@ class JmDownloader(DownloadCallback):
         if count_real == 0:
             return
 
+        # 队列深度指标: 已调度但尚未完成的章节/图片数
+        stage = 'image' if iter_objs[0].is_image() else 'photo'
+        JmMetrics.record_queue_depth(stage, count_real)
+
+        # 子线程里的span以当前span为父span
+        parent_span = JmTracer.current_span()
+
+        def apply_and_count(obj):
+            try:
+                with JmTracer.attach(parent_span):
+                    return apply(obj)
+            finally:
+                JmMetrics.record_queue_depth(stage, -1)
+
         if count_batch >= count_real:
             # 一个图/章节 对应 一个线程
             multi_thread_launcher(
                 iter_objs=iter_objs,
-                apply_each_obj_func=apply,
+                apply_each_obj_func=apply_and_count,
             )
         else:
             # 创建batch个线程的线程池
             thread_pool_executor(
                 iter_objs=iter_objs,
-                apply_each_obj_func=apply,
+                apply_each_obj_func=apply_and_count,
                 max_workers=count_batch,
             )
 
@@ -240,9 +435,14 @@ class JmDownloader(DownloadCallback):
             photo=photo,
             downloader=self,
         )
+        if self.archive_sink is not None and not photo.skip:
+            self.archive_sink.open(photo)
 
     def after_photo(self, photo: JmPhotoDetail):
         super().after_photo(photo)
+        if self.archive_sink is not None:
+            self.archive_sink.close(photo, not any(image.from_photo is photo
+                                                   for image, _ in self.download_failed_image))
         self.option.call_all_plugin(
             'after_photo',
             photo=photo,
@@ -297,6 +497,12 @@ class JmDownloader(DownloadCallback):
                    f'{self.__class__.__name__} Exit with exception: {exc_type, str(exc_val)}'
                    )
 
+        while self.exit_callbacks:
+            try:
+                self.exit_callbacks.pop()()
+            except Exception as e:
+                jm_log('dler.exit_callback.error', f'清理回调执行失败: {e}')
+
     @classmethod
     def use(cls, *args, **kwargs):
         """
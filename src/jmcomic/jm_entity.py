@@ -1,11 +1,10 @@
-from functools import lru_cache
-
 from common import *
 
 from .jm_config import *
 
 
 class Downloadable:
+    __slots__ = ('save_path', 'exists', 'skip')
 
     def __init__(self):
         self.save_path: str = ''
@@ -14,6 +13,7 @@ class Downloadable:
 
 
 class JmBaseEntity:
+    __slots__ = ()
 
     def to_file(self, filepath):
         from common import PackerUtil
@@ -192,6 +192,17 @@ class DetailEntity(JmBaseEntity, IndexedEntity):
 
 
 class JmImageDetail(JmBaseEntity, Downloadable):
+    # 一个章节可能有上百张图片，长时间运行时会创建大量图片对象，这里不使用__dict__
+    __slots__ = (
+        'aid',
+        'scramble_id',
+        'img_url',
+        'img_file_name',
+        'img_file_suffix',
+        'from_photo',
+        'query_params',
+        'index',
+    )
 
     def __init__(self,
                  aid,
@@ -266,7 +277,8 @@ class JmImageDetail(JmBaseEntity, Downloadable):
             scramble_id=scramble_id,
             img_url=data_original,
             img_file_name=data_original[x + 1:y],
-            img_file_suffix=data_original[y:],
+            # 后缀只有几种，所有图片共用同一个字符串
+            img_file_suffix=sys.intern(data_original[y:]),
             from_photo=from_photo,
             query_params=query_params,
             index=index,
@@ -338,6 +350,9 @@ class JmPhotoDetail(DetailEntity, Downloadable):
         # self.data_original_query_params = self.get_data_original_query_params(data_original_0)
         self.data_original_query_params = None
 
+        # index -> JmImageDetail，见 getindex
+        self._image_cache: Dict[int, JmImageDetail] = {}
+
     @property
     def is_single_album(self) -> bool:
         return self._series_id == 0
@@ -433,9 +448,12 @@ class JmPhotoDetail(DetailEntity, Downloadable):
     def id(self):
         return self.photo_id
 
-    @lru_cache(None)
     def getindex(self, index) -> JmImageDetail:
-        return self.create_image_detail(index)
+        # 缓存在实例上，随章节对象一起回收，多次遍历章节得到的是同一批图片对象
+        image = self._image_cache.get(index)
+        if image is None:
+            image = self._image_cache.setdefault(index, self.create_image_detail(index))
+        return image
 
     def __getitem__(self, item) -> Union[JmImageDetail, List[JmImageDetail]]:
         return super().__getitem__(item)
@@ -499,6 +517,9 @@ class JmAlbumDetail(DetailEntity, Downloadable):
         self.episode_list = episode_list
         self.related_list = related_list
 
+        # index -> JmPhotoDetail，见 getindex
+        self._photo_cache: Dict[int, JmPhotoDetail] = {}
+
     @property
     def author(self):
         """
@@ -550,9 +571,12 @@ class JmAlbumDetail(DetailEntity, Downloadable):
 
         return photo
 
-    @lru_cache(None)
     def getindex(self, item) -> JmPhotoDetail:
-        return self.create_photo_detail(item)
+        # 缓存在实例上，随本子对象一起回收，多次遍历本子得到的是同一批章节对象
+        photo = self._photo_cache.get(item)
+        if photo is None:
+            photo = self._photo_cache.setdefault(item, self.create_photo_detail(item))
+        return photo
 
     def __getitem__(self, item) -> Union[JmPhotoDetail, List[JmPhotoDetail]]:
         return super().__getitem__(item)
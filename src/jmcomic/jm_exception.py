@@ -59,6 +59,10 @@ class RequestRetryAllFailException(JmcomicException):
     description = '请求重试全部失败异常'
 
 
+class RequestTimeoutException(JmcomicException):
+    description = '请求超过总期限异常'
+
+
 class PartialDownloadFailedException(JmcomicException):
     description = '部分章节或图片下载失败异常'
 
@@ -19,13 +19,15 @@ from .jm_config import JmModuleConfig, jm_log
 class KavitaConfig:
     """Kavita打包配置"""
 
-    def __init__(self, overwrite: bool = True, compress_level: int = 1):
+    def __init__(self, overwrite: bool = True, compress_level: int = 1, append: bool = False):
         """
         :param overwrite: 是否覆盖已存在的CBZ文件
         :param compress_level: 压缩级别 (0-9)，1为最快，9为最小体积
+        :param append: CBZ已存在时只追加新增的图片并更新ComicInfo.xml，图片顺序变化时才重写整个CBZ
         """
         self.overwrite = overwrite
         self.compress_level = compress_level
+        self.append = append
 
 
 def prettify_xml(elem: Element) -> bytes:
@@ -418,27 +420,75 @@ class KavitaPacker:
             cbz_name = re.sub(r'[<>:"|?*]', '_', f"{series_name}_c001.cbz")
             cbz_path = series_output_dir / cbz_name
 
-            if cbz_path.exists() and not self.config.overwrite:
+            if cbz_path.exists() and not self.config.overwrite and not self.config.append:
                 jm_log('kavita', f'CBZ已存在，跳过: {cbz_path}')
                 return [cbz_path]
 
+            xml_bytes = generate_comicinfo_xml(metadata, album_detail)
+            mode = self._write_cbz(cbz_path, all_images, album_dir, xml_bytes)
+            if mode is not None:
+                jm_log('kavita', f'[SUCCESS] 成功生成({mode}): {cbz_path.name}')
+                result_paths.append(cbz_path)
+
+        return result_paths
+
+    def _write_cbz(self, cbz_path: Path, images: List[Path], image_root: Path, xml_bytes: bytes) -> Optional[str]:
+        """
+        写入CBZ，图片按顺序命名为 001.webp, 002.webp ...
+
+        config.append 为 True 时，CBZ的注释中保存索引（已写入的图片、ComicInfo.xml的摘要），见 JmZipAppender。
+        已有的图片是新图片列表的前缀时，只追加新图片，并替换放在最后的ComicInfo.xml；否则重写整个CBZ。
+
+        :param image_root: 图片在索引中记录为相对此目录的路径
+        :return: 写入方式 write / append / unchanged，失败返回None
+        """
+        from hashlib import sha1
+        from .jm_toolkit import JmZipAppender
+
+        pages = [img.relative_to(image_root).as_posix() for img in images]
+        meta = sha1(xml_bytes).hexdigest()
+        index = JmZipAppender.read_index(str(cbz_path)) if self.config.append else None
+
+        if index is not None \
+                and index.get('tail') == 'ComicInfo.xml' \
+                and JmZipAppender.is_prefix(index.get('pages', []), pages):
+            start = len(index['pages'])
+            if start == len(pages) and index.get('meta') == meta:
+                return 'unchanged'
+
             try:
-                xml_bytes = generate_comicinfo_xml(metadata, album_detail)
-                with zipfile.ZipFile(cbz_path, 'w', zipfile.ZIP_DEFLATED,
+                with JmZipAppender(str(cbz_path), replace_tail='ComicInfo.xml',
+                                   compression=zipfile.ZIP_DEFLATED,
                                    compresslevel=self.config.compress_level) as zf:
+                    for img_idx in range(start, len(images)):
+                        img = images[img_idx]
+                        zf.write(img, arcname=f"{img_idx + 1:03d}{img.suffix.lower()}")
                     zf.writestr("ComicInfo.xml", xml_bytes)
-                    for img_idx, img in enumerate(all_images):
-                        new_img_name = f"{img_idx + 1:03d}{img.suffix.lower()}"
-                        zf.write(img, arcname=new_img_name)
-
-                jm_log('kavita', f'[SUCCESS] 成功生成: {cbz_path.name}')
-                result_paths.append(cbz_path)
+                    JmZipAppender.write_index(zf, {'pages': pages, 'meta': meta, 'tail': 'ComicInfo.xml'})
+                return 'append'
             except Exception as e:
-                jm_log('kavita', f'[ERROR] 打包失败: {str(e)[:100]}')
-                if cbz_path.exists():
-                    cbz_path.unlink(missing_ok=True)
+                # 追加失败时压缩包已恢复原状
+                jm_log('kavita', f'[ERROR] 追加失败: {str(e)[:100]}')
+                return None
 
-        return result_paths
+        try:
+            with zipfile.ZipFile(cbz_path, 'w', zipfile.ZIP_DEFLATED,
+                                 compresslevel=self.config.compress_level) as zf:
+                if not self.config.append:
+                    zf.writestr("ComicInfo.xml", xml_bytes)
+                for img_idx, img in enumerate(images):
+                    new_img_name = f"{img_idx + 1:03d}{img.suffix.lower()}"
+                    zf.write(img, arcname=new_img_name)
+                if self.config.append:
+                    # 放在最后，下次追加时可以直接替换
+                    zf.writestr("ComicInfo.xml", xml_bytes)
+                    JmZipAppender.write_index(zf, {'pages': pages, 'meta': meta, 'tail': 'ComicInfo.xml'})
+            return 'write'
+        except Exception as e:
+            jm_log('kavita', f'[ERROR] 打包失败: {str(e)[:100]}')
+            if cbz_path.exists():
+                cbz_path.unlink(missing_ok=True)
+            return None
 
     def _pack_chapter(self,
                       chapter_dir: Path,
@@ -474,27 +524,18 @@ class KavitaPacker:
         cbz_name = re.sub(r'[<>:"|?*]', '_', f"{series_name}_c{chapter_num:03d}.cbz")
         cbz_path = output_dir / cbz_name
 
-        if cbz_path.exists() and not self.config.overwrite:
+        if cbz_path.exists() and not self.config.overwrite and not self.config.append:
             jm_log('kavita', f'CBZ已存在，跳过: {cbz_path}')
             return cbz_path
 
-        try:
-            xml_bytes = generate_comicinfo_xml(metadata, album_detail)
-            with zipfile.ZipFile(cbz_path, 'w', zipfile.ZIP_DEFLATED,
-                               compresslevel=self.config.compress_level) as zf:
-                zf.writestr("ComicInfo.xml", xml_bytes)
-                for img_idx, img in enumerate(images):
-                    new_img_name = f"{img_idx + 1:03d}{img.suffix.lower()}"
-                    zf.write(img, arcname=new_img_name)
-
-            jm_log('kavita', f'[SUCCESS] 章节{chapter_num}/{total_chapters}: {cbz_path.name} ({len(images)}张)')
-            return cbz_path
-        except Exception as e:
-            jm_log('kavita', f'[ERROR] 章节打包失败: {str(e)[:100]}')
-            if cbz_path.exists():
-                cbz_path.unlink(missing_ok=True)
+        xml_bytes = generate_comicinfo_xml(metadata, album_detail)
+        mode = self._write_cbz(cbz_path, images, chapter_dir, xml_bytes)
+        if mode is None:
             return None
 
+        jm_log('kavita', f'[SUCCESS] 章节{chapter_num}/{total_chapters}({mode}): {cbz_path.name} ({len(images)}张)')
+        return cbz_path
+
     def pack_from_album_detail(self,
                                album_detail: 'JmAlbumDetail',
                                source_dir: Union[str, Path],
@@ -573,7 +614,8 @@ class KavitaPacker:
 def pack_album_to_kavita(album_dir: Union[str, Path],
                         output_dir: Union[str, Path],
                         overwrite: bool = True,
-                        compress_level: int = 1) -> List[Path]:
+                        compress_level: int = 1,
+                        append: bool = False) -> List[Path]:
     """
     便捷函数：打包单个专辑为Kavita CBZ格式
     多章节专辑会分别打包为多个CBZ文件
@@ -582,9 +624,10 @@ def pack_album_to_kavita(album_dir: Union[str, Path],
     :param output_dir: 输出目录
     :param overwrite: 是否覆盖已存在的CBZ
     :param compress_level: 压缩级别
+    :param append: 是否只追加新增的图片，见 KavitaConfig
     :return: 生成的CBZ文件路径列表
     """
-    config = KavitaConfig(overwrite=overwrite, compress_level=compress_level)
+    config = KavitaConfig(overwrite=overwrite, compress_level=compress_level, append=append)
     packer = KavitaPacker(config)
     return packer.pack_album(album_dir, output_dir)
 
@@ -592,7 +635,8 @@ def pack_album_to_kavita(album_dir: Union[str, Path],
 def pack_albums_to_kavita(source_dir: Union[str, Path],
                           output_dir: Union[str, Path],
                           overwrite: bool = True,
-                          compress_level: int = 1) -> Dict[str, int]:
+                          compress_level: int = 1,
+                          append: bool = False) -> Dict[str, int]:
     """
     批量打包专辑为Kavita CBZ格式
 
@@ -600,12 +644,13 @@ def pack_albums_to_kavita(source_dir: Union[str, Path],
     :param output_dir: 输出目录
     :param overwrite: 是否覆盖已存在的CBZ
     :param compress_level: 压缩级别
+    :param append: 是否只追加新增的图片，见 KavitaConfig
     :return: 统计信息字典 {'success': 成功数, 'failed': 失败数, 'total': 总数}
     """
     source_dir = Path(source_dir)
     output_dir = Path(output_dir)
 
-    config = KavitaConfig(overwrite=overwrite, compress_level=compress_level)
+    config = KavitaConfig(overwrite=overwrite, compress_level=compress_level, append=append)
     packer = KavitaPacker(config)
 
     album_dirs = sorted([d for d in source_dir.iterdir() if d.is_dir()], key=lambda x: x.name)
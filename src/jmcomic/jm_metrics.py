@@ -0,0 +1,508 @@
+# 该文件存放jmcomic的运行指标（metrics）和追踪（trace）机制，
+# 下载核心（client、downloader）在运行时更新指标，可以导出为Prometheus文本格式；
+# 追踪记录每个阶段的span，写入本地文件，可以离线查看
+from threading import Lock, local as thread_local
+
+from .jm_toolkit import *
+
+
+class JmMetric:
+    """
+    指标基类，按标签值分别记录
+    """
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.lock = Lock()
+        # 标签值tuple -> 指标值
+        self.values: Dict[Tuple[str, ...], Any] = {}
+
+    def label_values(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(k, '')) for k in self.labelnames)
+
+    def format_labels(self, label_values: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, label_values))
+        if extra:
+            pairs.extend(extra.items())
+        if len(pairs) == 0:
+            return ''
+
+        def escape(v: str):
+            return v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in pairs) + '}'
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} {self.metric_type}']
+        for label_values, value in self.collect():
+            lines.append(f'{self.name}{self.format_labels(label_values)} {value}')
+        return lines
+
+    def collect(self):
+        with self.lock:
+            return list(self.values.items())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {','.join(k) or '': v for k, v in self.collect()}
+
+
+class JmCounter(JmMetric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class JmGauge(JmMetric):
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class JmHistogram(JmMetric):
+    metric_type = 'histogram'
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        with self.lock:
+            data = self.values.get(key, None)
+            if data is None:
+                # [各bucket计数..., sum, count]
+                data = self.values[key] = [0] * len(self.buckets) + [0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def time(self, **labels):
+        """
+        计时上下文管理器，with代码块的耗时（秒）会被记录
+        """
+        return JmMetricTimer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} {self.metric_type}']
+        for label_values, data in self.collect():
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{self.format_labels(label_values, {"le": str(bound)})} {cumulative}')
+            lines.append(f'{self.name}_bucket{self.format_labels(label_values, {"le": "+Inf"})} {data[-1]}')
+            lines.append(f'{self.name}_sum{self.format_labels(label_values)} {data[-2]}')
+            lines.append(f'{self.name}_count{self.format_labels(label_values)} {data[-1]}')
+        return lines
+
+    def collect(self):
+        with self.lock:
+            return [(k, list(v)) for k, v in self.values.items()]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {','.join(k) or '': {'count': v[-1], 'sum': v[-2]} for k, v in self.collect()}
+
+
+class JmRate(JmMetric):
+    """
+    最近一段时间窗口内的每秒事件数，导出为gauge
+    """
+    metric_type = 'gauge'
+
+    def __init__(self, name, doc, labelnames=(), window=60):
+        super().__init__(name, doc, labelnames)
+        self.window = window
+
+    def mark(self, count=1, **labels):
+        from collections import deque
+        key = self.label_values(labels)
+        now = time_stamp(False)
+        with self.lock:
+            events = self.values.get(key, None)
+            if events is None:
+                events = self.values[key] = deque()
+            events.append((now, count))
+            self.expire(events, now)
+
+    def expire(self, events, now):
+        while events and events[0][0] < now - self.window:
+            events.popleft()
+
+    def collect(self):
+        now = time_stamp(False)
+        with self.lock:
+            ret = []
+            for key, events in self.values.items():
+                self.expire(events, now)
+                ret.append((key, round(sum(c for _, c in events) / self.window, 3)))
+            return ret
+
+
+class JmMetricTimer:
+
+    def __init__(self, histogram: JmHistogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        import time
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        import time
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class JmMetrics:
+    """
+    指标注册表
+
+    用法:
+    JmMetrics.counter('jm_request_total', '请求数', ('kind',)).inc(kind='image')
+
+    同名指标只会创建一次。
+    可通过 JmModuleConfig.FLAG_ENABLE_METRICS = False 关闭，此时不会再记录新的数据。
+    """
+
+    REGISTRY: Dict[str, JmMetric] = {}
+    registry_lock = Lock()
+
+    @classmethod
+    def get_or_create(cls, clazz, name, doc, labelnames, **kwargs):
+        metric = cls.REGISTRY.get(name, None)
+        if metric is not None:
+            return metric
+
+        with cls.registry_lock:
+            metric = cls.REGISTRY.get(name, None)
+            if metric is None:
+                metric = cls.REGISTRY[name] = clazz(name, doc, labelnames, **kwargs)
+
+        return metric
+
+    @classmethod
+    def counter(cls, name, doc='', labelnames=()) -> JmCounter:
+        return cls.get_or_create(JmCounter, name, doc, labelnames)
+
+    @classmethod
+    def gauge(cls, name, doc='', labelnames=()) -> JmGauge:
+        return cls.get_or_create(JmGauge, name, doc, labelnames)
+
+    @classmethod
+    def histogram(cls, name, doc='', labelnames=(), **kwargs) -> JmHistogram:
+        return cls.get_or_create(JmHistogram, name, doc, labelnames, **kwargs)
+
+    @classmethod
+    def rate(cls, name, doc='', labelnames=(), **kwargs) -> JmRate:
+        return cls.get_or_create(JmRate, name, doc, labelnames, **kwargs)
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return JmModuleConfig.FLAG_ENABLE_METRICS is True
+
+    @classmethod
+    def render_prometheus(cls) -> str:
+        """
+        导出为Prometheus文本格式
+        """
+        lines = []
+        for name in sorted(cls.REGISTRY):
+            lines.extend(cls.REGISTRY[name].render())
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Dict[str, Any]]:
+        return {name: metric.snapshot() for name, metric in cls.REGISTRY.items()}
+
+    @classmethod
+    def reset(cls):
+        with cls.registry_lock:
+            cls.REGISTRY.clear()
+
+    # 下面是下载核心使用的指标
+
+    @classmethod
+    def record_request(cls, kind, domain, success: bool, cost: float, nbytes: int):
+        if not cls.enabled():
+            return
+        cls.counter('jm_request_total', '请求数', ('kind', 'domain', 'result')) \
+            .inc(kind=kind, domain=domain, result='ok' if success else 'error')
+        cls.histogram('jm_request_seconds', '单次请求耗时（秒）', ('kind',)).observe(cost, kind=kind)
+        if nbytes:
+            cls.counter('jm_download_bytes_total', '下载的字节数', ('kind',)).inc(nbytes, kind=kind)
+
+    @classmethod
+    def record_retry(cls, domain):
+        if not cls.enabled():
+            return
+        cls.counter('jm_request_retry_total', '请求重试次数', ('domain',)).inc(domain=domain)
+
+    @classmethod
+    def record_request_inflight(cls, kind, delta):
+        if not cls.enabled():
+            return
+        cls.gauge('jm_request_inflight', '进行中的请求数', ('kind',)).inc(delta, kind=kind)
+
+    @classmethod
+    def record_cache(cls, cache, hit: bool):
+        if not cls.enabled():
+            return
+        cls.counter('jm_cache_total', '缓存命中情况', ('cache', 'result')) \
+            .inc(cache=cache, result='hit' if hit else 'miss')
+
+    @classmethod
+    def record_image(cls, result):
+        """
+        :param result: downloaded / cached / failed
+        """
+        if not cls.enabled():
+            return
+        cls.counter('jm_image_total', '处理的图片数', ('result',)).inc(result=result)
+        if result == 'downloaded':
+            cls.rate('jm_images_per_second', '最近60秒平均每秒下载的图片数').mark()
+
+    @classmethod
+    def record_queue_depth(cls, stage, delta):
+        if not cls.enabled():
+            return
+        cls.gauge('jm_queue_depth', '等待或正在执行的下载任务数', ('stage',)).inc(delta, stage=stage)
+
+    @classmethod
+    def record_connection(cls, postman, reused: bool):
+        if not cls.enabled():
+            return
+        cls.counter('jm_connection_total', 'postman发出请求时使用的连接', ('postman', 'result')) \
+            .inc(postman=postman, result='reused' if reused else 'new')
+
+    @classmethod
+    def time_image_decode(cls):
+        return cls.histogram('jm_image_decode_seconds', '图片解密耗时（秒）').time() \
+            if cls.enabled() else JmMetricNoopTimer()
+
+    @classmethod
+    def time_image_write(cls):
+        return cls.histogram('jm_image_write_seconds', '图片写入磁盘耗时（秒）').time() \
+            if cls.enabled() else JmMetricNoopTimer()
+
+
+class JmMetricNoopTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class JmSpan:
+    """
+    追踪中的一个阶段，用with包裹，退出时写入追踪文件
+    """
+
+    def __init__(self, name: str, cat: str, args: dict, parent: Optional['JmSpan']):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.span_id = JmTracer.next_span_id()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = None
+
+    def __enter__(self):
+        import time
+        JmTracer.push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        import time
+        duration = time.perf_counter() - self.start
+        JmTracer.pop(self)
+        if exc_val is not None:
+            self.args['error'] = f'{exc_type.__name__}: {exc_val}'
+        JmTracer.write_span(self, duration)
+
+
+class JmTracer:
+    """
+    轻量的追踪器，通过 JmModuleConfig.FLAG_ENABLE_TRACE = True 开启
+
+    用法:
+    with JmTracer.span('photo', 'download', id=photo.id):
+        ...
+
+    同一线程内的span按调用关系嵌套；
+    跨线程时（例如章节线程里下载图片），由调度方用 JmTracer.attach(parent) 把父span带到子线程。
+    """
+
+    lock = Lock()
+    open_lock = Lock()
+    local = thread_local()
+    file = None
+    filepath = None
+    chrome_format = True
+    span_counter = 0
+    # perf_counter的起点，Chrome trace的时间戳从这里开始计
+    epoch = None
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return JmModuleConfig.FLAG_ENABLE_TRACE is True
+
+    @classmethod
+    def span(cls, name: str, cat: str = 'jmcomic', **args):
+        if not cls.enabled():
+            return JmMetricNoopTimer()
+        if cls.epoch is None:
+            import time
+            cls.epoch = time.perf_counter()
+        return JmSpan(name, cat, args, cls.current_span())
+
+    @classmethod
+    def stack(cls) -> list:
+        stack = getattr(cls.local, 'stack', None)
+        if stack is None:
+            stack = cls.local.stack = []
+        return stack
+
+    @classmethod
+    def current_span(cls) -> Optional[JmSpan]:
+        stack = cls.stack()
+        return stack[-1] if stack else None
+
+    @classmethod
+    def push(cls, span: JmSpan):
+        cls.stack().append(span)
+
+    @classmethod
+    def pop(cls, span: JmSpan):
+        stack = cls.stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        elif span in stack:
+            stack.remove(span)
+
+    @classmethod
+    def attach(cls, parent: Optional[JmSpan]):
+        """
+        在当前线程中以parent为父span，返回上下文管理器
+        """
+        return JmSpanAttachment(parent)
+
+    @classmethod
+    def next_span_id(cls) -> int:
+        with cls.lock:
+            cls.span_counter += 1
+            return cls.span_counter
+
+    @classmethod
+    def open(cls, filepath: Optional[str] = None):
+        """
+        打开追踪文件，写入span前会自动调用
+        """
+        import os
+        import time
+        import atexit
+
+        filepath = filepath or JmModuleConfig.VAR_TRACE_FILE or f'./jmcomic_trace_{os.getpid()}.json'
+        cls.close()
+        mkdir_if_not_exists(os.path.dirname(os.path.abspath(filepath)))
+        cls.filepath = filepath
+        cls.chrome_format = not filepath.endswith('.jsonl')
+        cls.epoch = cls.epoch or time.perf_counter()
+        cls.file = open(filepath, 'w', encoding='utf-8')
+        if cls.chrome_format:
+            # Chrome trace event的数组格式允许省略结尾的 ]，进程中途退出时文件也能打开
+            cls.file.write('[\n')
+        atexit.unregister(cls.close)
+        atexit.register(cls.close)
+        jm_log('trace.open', f'追踪文件: [{os.path.abspath(filepath)}]')
+
+    @classmethod
+    def close(cls):
+        with cls.lock:
+            if cls.file is None:
+                return
+            if cls.chrome_format:
+                cls.file.write('{}]\n')
+            cls.file.close()
+            cls.file = None
+
+    @classmethod
+    def write_span(cls, span: JmSpan, duration: float):
+        import json
+        import threading
+
+        if cls.file is None:
+            with cls.open_lock:
+                if cls.file is None:
+                    cls.open()
+
+        args = {k: str(v) if not isinstance(v, (int, float, bool)) else v for k, v in span.args.items()}
+        thread = threading.current_thread()
+
+        if cls.chrome_format:
+            import os
+            event = {
+                'name': span.name,
+                'cat': span.cat,
+                'ph': 'X',
+                'ts': round((span.start - cls.epoch) * 1e6, 1),
+                'dur': round(duration * 1e6, 1),
+                'pid': os.getpid(),
+                'tid': thread.ident,
+                'args': {**args, 'span_id': span.span_id, 'parent_id': span.parent_id},
+            }
+        else:
+            event = {
+                'name': span.name,
+                'cat': span.cat,
+                'span_id': span.span_id,
+                'parent_id': span.parent_id,
+                'start': round(span.start - cls.epoch, 6),
+                'duration': round(duration, 6),
+                'thread': thread.name,
+                'args': args,
+            }
+
+        line = json.dumps(event, ensure_ascii=False) + (',\n' if cls.chrome_format else '\n')
+        with cls.lock:
+            if cls.file is not None:
+                cls.file.write(line)
+
+
+class JmSpanAttachment:
+
+    def __init__(self, parent: Optional[JmSpan]):
+        self.parent = parent
+
+    def __enter__(self):
+        if self.parent is not None:
+            JmTracer.push(self.parent)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.parent is not None:
+            JmTracer.pop(self.parent)
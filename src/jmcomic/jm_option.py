@@ -190,6 +190,86 @@ class DirRule:
         return fix_windir_name(cls.get_rule_parser(rule)(album, photo, rule)).strip()
 
 
+class PostProcessExecutor:
+    """
+    后处理线程池，在后台执行 after_photo / after_album 插件（压缩、转pdf、拼长图等），
+    让下载线程不用等待插件执行完毕，下载和打包可以同时进行。
+
+    队列有上限，排队的任务满了之后，提交任务的下载线程会阻塞，直到有任务完成（背压），
+    避免下载远快于打包时任务无限堆积。
+
+    任务按key（本子对象）分组，wait(key)只等待这个本子的任务，wait()等待全部任务。
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        from concurrent.futures import ThreadPoolExecutor
+        from threading import BoundedSemaphore, Lock, local
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jm-post-process')
+        self.slots = BoundedSemaphore(workers + queue_size)
+        self.lock = Lock()
+        # key -> 未完成的future
+        self.pending: Dict[Any, list] = {}
+        self.local = local()
+
+    def in_worker(self) -> bool:
+        return getattr(self.local, 'in_worker', False)
+
+    def submit(self, key, func: Callable, *args, **kwargs):
+        if self.in_worker():
+            # 插件内部又触发了插件（例如插件中下载了别的本子），直接执行，避免等待自身所在的线程池
+            func(*args, **kwargs)
+            return
+
+        self.slots.acquire()
+        parent_span = JmTracer.current_span()
+
+        def run():
+            self.local.in_worker = True
+            try:
+                with JmTracer.attach(parent_span):
+                    func(*args, **kwargs)
+            finally:
+                self.local.in_worker = False
+                JmMetrics.record_queue_depth('post_process', -1)
+
+        try:
+            future = self.pool.submit(run)
+        except BaseException:
+            self.slots.release()
+            raise
+
+        JmMetrics.record_queue_depth('post_process', 1)
+        with self.lock:
+            self.pending.setdefault(key, []).append(future)
+        future.add_done_callback(lambda f: self.on_done(key, f))
+
+    def on_done(self, key, future):
+        self.slots.release()
+        with self.lock:
+            futures = self.pending.get(key, None)
+            if futures is None:
+                return
+            if future in futures:
+                futures.remove(future)
+            if len(futures) == 0:
+                self.pending.pop(key, None)
+
+    def wait(self, key=None):
+        """
+        等待任务完成，key为None时等待全部任务（包括等待期间新提交的任务）
+        """
+        from concurrent.futures import wait
+        while True:
+            with self.lock:
+                if key is None:
+                    futures = [f for ls in self.pending.values() for f in ls]
+                else:
+                    futures = list(self.pending.get(key, []))
+            if len(futures) == 0:
+                return
+            wait(futures)
+
+
 class JmOption:
 
     def __init__(self,
@@ -213,6 +293,9 @@ class JmOption:
 
         # 需要主线程等待完成的插件
         self.need_wait_plugins = []
+        # 后台执行 after_photo / after_album 插件的线程池，见 decide_post_process_executor
+        self.post_process_executor: Optional[PostProcessExecutor] = None
+        self.post_process_executor_lock = Lock()
 
         if call_after_init_plugin:
             self.call_all_plugin('after_init', safe=True)
@@ -243,6 +326,36 @@ class JmOption:
     def decide_photo_batch_count(self, album: JmAlbumDetail):
         return self.download.threading.photo
 
+    def decide_post_process_executor(self) -> Optional[PostProcessExecutor]:
+        """
+        download.threading.post_process 大于0时，after_photo / after_album 插件在后台线程池中执行，
+        为0时（默认）在下载线程中同步执行
+        """
+        threading = self.download.threading
+        workers = threading.get('post_process', 0) or 0
+        if workers <= 0:
+            return None
+
+        if self.post_process_executor is None:
+            with self.post_process_executor_lock:
+                if self.post_process_executor is None:
+                    self.post_process_executor = PostProcessExecutor(
+                        workers,
+                        threading.get('post_process_queue', None) or workers * 4,
+                    )
+
+        return self.post_process_executor
+
+    def wait_post_process(self, album=None):
+        """
+        等待后台执行的插件完成
+
+        :param album: 只等待这个本子的插件，为None时等待全部
+        """
+        executor = self.post_process_executor
+        if executor is not None:
+            executor.wait(album)
+
     # noinspection PyMethodMayBeStatic
     def decide_image_filename(self, image: JmImageDetail) -> str:
         """
@@ -280,6 +393,24 @@ class JmOption:
         suffix = self.decide_image_suffix(image) if consider_custom_suffix else image.img_file_suffix
         return os.path.join(save_dir, fix_windir_name(self.decide_image_filename(image)) + suffix)
 
+    def decide_photo_archive_path(self, photo: JmPhotoDetail) -> str:
+        """
+        download.archive 模式下，章节压缩包的路径
+        """
+        archive = self.download.archive
+        suffix = fix_suffix(archive.suffix)
+
+        if archive.dir is None:
+            # 和章节文件夹同级: {base_dir}/{本子}/{章节}.cbz
+            photo_dir = os.path.normpath(self.decide_image_save_dir(photo, ensure_exists=False))
+            mkdir_if_not_exists(os.path.dirname(photo_dir))
+            return photo_dir + suffix
+
+        archive_dir = JmcomicText.parse_to_abspath(archive.dir)
+        mkdir_if_not_exists(archive_dir)
+        filename = DirRule.apply_rule_to_filename(photo.from_album, photo, archive.filename_rule)
+        return os.path.join(archive_dir, filename + suffix)
+
     def decide_download_cache(self, _image: JmImageDetail) -> bool:
         return self.download.cache
 
@@ -454,6 +585,7 @@ class JmOption:
             domain_list=decide_domain_list(),
             retry_times=retry_times,
             domain_retry_strategy=domain_retry_strategy,
+            timeout=self.client.get('timeout', None),
         )
 
         # enable cache
@@ -485,7 +617,7 @@ class JmOption:
             domain_list = JmModuleConfig.DOMAIN_HTML_LIST
             if domain_list is not None:
                 return domain_list
-            return [JmModuleConfig.get_html_domain()]
+            return JmModuleConfig.get_html_domain_all_concurrently()
 
         ExceptionTool.raises(f'没有配置域名，且是无法识别的client类型: {client_key}')
 
@@ -535,11 +667,45 @@ class JmOption:
 
     # 下面的方法为调用插件提供支持
 
+    # 可以在后台执行的插件组
+    POST_PROCESS_GROUPS = ('after_photo', 'after_album')
+
     def call_all_plugin(self, group: str, safe=True, **extra):
         plugin_list: List[dict] = self.plugins.get(group, [])
         if plugin_list is None or len(plugin_list) == 0:
             return
 
+        if group in self.POST_PROCESS_GROUPS and safe is True:
+            executor = self.decide_post_process_executor()
+            if executor is not None:
+                self.submit_post_process(executor, group, plugin_list, extra)
+                return
+
+        self.call_plugin_list(group, plugin_list, safe, extra)
+
+    def submit_post_process(self, executor: PostProcessExecutor, group: str, plugin_list: List[dict], extra: dict):
+        """
+        把插件提交到后台线程池执行。
+
+        同一个本子的 after_album 插件会等这个本子的 after_photo 插件全部完成后再执行，
+        插件配置 background: false 时，该插件仍在当前线程中执行（同样在等待之后）。
+        """
+        album = extra['album'] if group == 'after_album' else extra['photo'].from_album
+        if group == 'after_album':
+            executor.wait(album)
+
+        background = []
+        for pinfo in plugin_list:
+            if pinfo.get('background', True) is True:
+                background.append(pinfo)
+            else:
+                self.call_plugin_list(group, [pinfo], True, extra)
+
+        if len(background) != 0:
+            # 同一组内的插件仍按配置顺序依次执行
+            executor.submit(album, self.call_plugin_list, group, background, True, extra)
+
+    def call_plugin_list(self, group: str, plugin_list: List[dict], safe: bool, extra: dict):
         # 保证 jm_plugin.py 被加载
         from .jm_plugin import JmOptionPlugin
 
@@ -582,7 +748,8 @@ class JmOption:
             jm_log('plugin.invoke', f'调用插件: [{pclass.plugin_key}]')
 
             # 调用插件功能
-            plugin.invoke(**kwargs)
+            with JmTracer.span(f'plugin.{pclass.plugin_key}', 'plugin'):
+                plugin.invoke(**kwargs)
 
         except PluginValidationException as e:
             # 插件抛出的参数校验异常
@@ -673,6 +840,7 @@ class JmOption:
 
     def wait_all_plugins_finish(self):
         from .jm_plugin import JmOptionPlugin
-        for plugin in self.need_wait_plugins:
+        self.wait_post_process()
+        for plugin in list(self.need_wait_plugins):
             plugin: JmOptionPlugin
             plugin.wait_until_finish()
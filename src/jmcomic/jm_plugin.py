@@ -311,6 +311,12 @@ class ZipPlugin(JmOptionPlugin):
 
     plugin_key = 'zip'
 
+    # 本身已经是压缩格式的文件，deflate几乎不能再减小体积（<1%），compression=auto时直接存储
+    store_suffixes = frozenset({
+        '.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif', '.heic', '.jxl',
+        '.zip', '.cbz', '.pdf',
+    })
+
     # noinspection PyAttributeOutsideInit
     def invoke(self,
                downloader,
@@ -323,13 +329,24 @@ class ZipPlugin(JmOptionPlugin):
                zip_dir='./',
                dir_rule=None,
                encrypt=None,
+               compression='auto',
+               compress_workers=0,
+               append=False,
                ) -> None:
+        """
+        :param compression: auto: 图片等已压缩的格式直接存储，其余文件deflate; store: 全部直接存储; deflate: 全部deflate
+        :param compress_workers: 大于1时，用多个线程并行读取和压缩文件，再按顺序写入压缩包
+        :param append: level=album时，本子压缩包已存在则只追加新章节，章节顺序变化时才重写整个压缩包
+        """
 
         from .jm_downloader import JmDownloader
         downloader: JmDownloader
         self.downloader = downloader
         self.level = level
         self.delete_original_file = delete_original_file
+        self.compression = compression
+        self.compress_workers = compress_workers
+        self.append = append
 
         # 确保压缩文件所在文件夹存在
         zip_dir = JmcomicText.parse_to_abspath(zip_dir)
@@ -340,7 +357,8 @@ class ZipPlugin(JmOptionPlugin):
 
         if level == 'album':
             zip_path = self.decide_filepath(album, None, filename_rule, suffix, zip_dir, dir_rule)
-            self.zip_album(album, photo_dict, zip_path, path_to_delete, encrypt)
+            if not self.zip_album(album, photo_dict, zip_path, path_to_delete, encrypt):
+                return
 
         elif level == 'photo':
             for photo, image_list in photo_dict.items():
@@ -350,15 +368,17 @@ class ZipPlugin(JmOptionPlugin):
         else:
             ExceptionTool.raises(f'Not Implemented Zip Level: {level}')
 
-        self.after_zip(path_to_delete)
+        self.after_zip(path_to_delete, photo_dict)
 
     # noinspection PyMethodMayBeStatic
     def get_downloaded_photo(self, downloader, album, photo):
-        return (
-            downloader.download_success_dict[album]
-            if album is not None  # after_album
-            else downloader.download_success_dict[photo.from_album]  # after_photo
-        )
+        # 返回副本: 插件在后台执行时，其他章节仍在下载，会修改 download_success_dict
+        if album is not None:
+            # after_album
+            return dict(downloader.download_success_dict[album])
+
+        # after_photo，只处理当前章节
+        return {photo: list(downloader.download_success_dict[photo.from_album][photo])}
 
     def zip_photo(self, photo, image_list: list, zip_path: str, path_to_delete, encrypt_dict):
         """
@@ -369,10 +389,10 @@ class ZipPlugin(JmOptionPlugin):
             else os.path.dirname(image_list[0][0])
 
         with self.open_zip_file(zip_path, encrypt_dict) as f:
-            for file in files_of_dir(photo_dir):
-                abspath = os.path.join(photo_dir, file)
-                relpath = os.path.relpath(abspath, photo_dir)
-                f.write(abspath, relpath)
+            self.write_members(f, [
+                (abspath, os.path.relpath(abspath, photo_dir))
+                for abspath in (os.path.join(photo_dir, file) for file in files_of_dir(photo_dir))
+            ])
 
         self.log(f'压缩章节[{photo.photo_id}]成功 → {zip_path}', 'finish')
         path_to_delete.append(self.unified_path(photo_dir))
@@ -381,30 +401,262 @@ class ZipPlugin(JmOptionPlugin):
     def unified_path(f):
         return fix_filepath(f, os.path.isdir(f))
 
-    def zip_album(self, album, photo_dict: dict, zip_path, path_to_delete, encrypt_dict):
+    def zip_album(self, album, photo_dict: dict, zip_path, path_to_delete, encrypt_dict) -> bool:
         """
         压缩album文件夹
+
+        :return: 是否写入了压缩包，为False时不能删除本次下载的文件
         """
 
         album_dir = self.option.dir_rule.decide_album_root_dir(album)
-        with self.open_zip_file(zip_path, encrypt_dict) as f:
-            for photo in photo_dict.keys():
-                # 定位到章节所在文件夹
-                photo_dir = self.unified_path(self.option.decide_image_save_dir(photo))
-                # 章节文件夹标记为删除
-                path_to_delete.append(photo_dir)
-                for file in files_of_dir(photo_dir):
-                    abspath = os.path.join(photo_dir, file)
-                    relpath = os.path.relpath(abspath, album_dir)
-                    f.write(abspath, relpath)
-        self.log(f'压缩本子[{album.album_id}]成功 → {zip_path}', 'finish')
-
-    def after_zip(self, path_to_delete: List[str]):
-        # 删除所有原文件
+        # 按章节在本子中的顺序写入
+        photo_list = sorted(photo_dict.keys(), key=lambda p: p.album_index)
+        # 章节 -> 章节文件夹在压缩包中的路径前缀
+        photo_prefix = {
+            photo.photo_id: self.member_prefix(self.option.decide_image_save_dir(photo), album_dir)
+            for photo in photo_list
+        }
+
+        # 压缩包注释中的索引记录了已压缩的章节，见 JmZipAppender
+        index = JmZipAppender.read_index(zip_path) if self.append else None
+        if index is not None and not self.can_append_album(album, index.get('photos', []), photo_list):
+            # 章节顺序变了，需要重写；已压缩、但本次没有下载的章节要从旧压缩包中复制过来
+            return self.rebuild_album(album, photo_list, photo_prefix, album_dir, zip_path, index,
+                                      path_to_delete, encrypt_dict)
+
+        appending = index is not None
+        if appending:
+            old_photos = index['photos']
+            old_photo_set = set(old_photos)
+            for photo in photo_list:
+                if photo.photo_id in old_photo_set:
+                    # 已压缩的章节不再写入，但本次重新下载的章节文件夹同样需要删除
+                    path_to_delete.append(self.unified_path(self.option.decide_image_save_dir(photo)))
+            photo_list = [p for p in photo_list if p.photo_id not in old_photo_set]
+            writer = JmZipAppender(zip_path)
+            index = {
+                'photos': old_photos + [p.photo_id for p in photo_list],
+                'dirs': {**index.get('dirs', {}), **{p.photo_id: photo_prefix[p.photo_id] for p in photo_list}},
+            }
+        else:
+            writer = self.open_zip_file(zip_path, encrypt_dict)
+            index = {'photos': [p.photo_id for p in photo_list], 'dirs': photo_prefix}
+
+        members = self.collect_photo_members(photo_list, album_dir, path_to_delete)
+        with writer as f:
+            self.write_members(f, members)
+            JmZipAppender.write_index(f, index)
+
+        if appending:
+            self.log(f'本子[{album.album_id}]追加{len(photo_list)}个章节 → {zip_path}', 'finish')
+        else:
+            self.log(f'压缩本子[{album.album_id}]成功 → {zip_path}', 'finish')
+        return True
+
+    def collect_photo_members(self, photo_list, album_dir: str, path_to_delete) -> List[Tuple[str, str]]:
+        """
+        章节文件夹中的文件 → [(文件路径, 压缩包内的路径)]，章节文件夹标记为删除
+        """
+        members = []
+        for photo in photo_list:
+            # 定位到章节所在文件夹
+            photo_dir = self.unified_path(self.option.decide_image_save_dir(photo))
+            # 章节文件夹标记为删除
+            path_to_delete.append(photo_dir)
+            for file in files_of_dir(photo_dir):
+                abspath = os.path.join(photo_dir, file)
+                members.append((abspath, os.path.relpath(abspath, album_dir)))
+        return members
+
+    @staticmethod
+    def member_prefix(photo_dir: str, album_dir: str) -> str:
+        """
+        章节文件夹中的文件在压缩包内的路径前缀（zip中的路径分隔符为 /）
+        """
+        return os.path.relpath(photo_dir, album_dir).replace(os.sep, '/').rstrip('/') + '/'
+
+    def rebuild_album(self, album, photo_list, photo_prefix: Dict[str, str], album_dir: str, zip_path: str,
+                      index: dict, path_to_delete, encrypt_dict) -> bool:
+        """
+        重写本子压缩包: 本次下载的章节从文件夹写入，其余已压缩的章节从旧压缩包复制，
+        先写到临时文件，完成后再替换旧压缩包，中途出错时旧压缩包不受影响。
+
+        旧压缩包中的文件无法确定属于哪个章节（旧版本的索引没有记录章节文件夹），
+        或者和本次写入的文件重名时，保留旧压缩包不动，只打印警告。
+        """
+        import zipfile
+
+        old_photos = index.get('photos', [])
+        old_dirs = index.get('dirs', {})
+        new_ids = set(photo_prefix)
+        kept_photos = [photo_id for photo_id in old_photos if photo_id not in new_ids]
+
+        with zipfile.ZipFile(zip_path) as old_zf:
+            old_infos = old_zf.infolist()
+
+        # 本次重新写入的章节，它们在旧压缩包中的文件不再需要
+        replaced_prefixes = tuple(old_dirs[photo_id] for photo_id in old_photos
+                                  if photo_id in new_ids and photo_id in old_dirs)
+        kept_infos = [info for info in old_infos if not info.filename.startswith(replaced_prefixes)]
+
+        new_prefixes = tuple(photo_prefix.values())
+        conflicts = [info.filename for info in kept_infos if info.filename.startswith(new_prefixes)]
+        if conflicts:
+            self.log(f'本子[{album.album_id}]的章节顺序变了，但旧压缩包中的文件和本次下载的章节文件夹重名，'
+                     f'无法确定属于哪个章节，保留旧压缩包不动，本次下载的文件不会删除: {zip_path}, 例如: {conflicts[:3]}',
+                     'warning')
+            return False
+
+        # 按章节在本子中的顺序排列，不在本子中的旧章节放在最后
+        position = {episode[0]: i for i, episode in enumerate(album.episode_list)}
+        all_photos = sorted(kept_photos + [p.photo_id for p in photo_list],
+                            key=lambda photo_id: position.get(photo_id, len(position)))
+        photo_of_id = {p.photo_id: p for p in photo_list}
+        dirs = {**{photo_id: old_dirs[photo_id] for photo_id in kept_photos if photo_id in old_dirs}, **photo_prefix}
+
+        part_path = zip_path + '.part'
+        try:
+            with zipfile.ZipFile(zip_path) as old_zf, self.open_zip_file(part_path, encrypt_dict) as f:
+                copied = set()
+
+                def copy_old(infos):
+                    for info in infos:
+                        if info.filename not in copied:
+                            copied.add(info.filename)
+                            f.writestr(info, old_zf.read(info))
+
+                for photo_id in all_photos:
+                    if photo_id in photo_of_id:
+                        self.write_members(f, self.collect_photo_members(
+                            [photo_of_id[photo_id]], album_dir, path_to_delete))
+                    elif photo_id in old_dirs:
+                        copy_old([info for info in kept_infos if info.filename.startswith(old_dirs[photo_id])])
+
+                # 无法确定章节的旧文件
+                copy_old(kept_infos)
+                JmZipAppender.write_index(f, {'photos': all_photos, 'dirs': dirs})
+        except BaseException:
+            if file_exists(part_path):
+                os.remove(part_path)
+            raise
+
+        os.replace(part_path, zip_path)
+        self.log(f'本子[{album.album_id}]章节顺序变化，重写压缩包'
+                 f'（写入{len(photo_list)}个章节，保留{len(kept_photos)}个已压缩的章节） → {zip_path}', 'finish')
+        return True
+
+    # noinspection PyMethodMayBeStatic
+    def can_append_album(self, album: JmAlbumDetail, old_photos: List[str], photo_list: List[JmPhotoDetail]) -> bool:
+        """
+        新章节都排在已压缩的章节之后时，才可以追加；否则章节顺序（以及按序号命名的章节文件夹）变了，需要重写
+        """
+        position = {episode[0]: i for i, episode in enumerate(album.episode_list)}
+        if any(photo_id not in position for photo_id in old_photos):
+            return False
+
+        old_positions = [position[photo_id] for photo_id in old_photos]
+        if old_positions != sorted(old_positions):
+            return False
+
+        last = max(old_positions, default=-1)
+        return all(position.get(p.photo_id, -1) > last for p in photo_list if p.photo_id not in old_photos)
+
+    def decide_compress_type(self, filepath: str) -> int:
+        import zipfile
+
+        if self.compression == 'store':
+            return zipfile.ZIP_STORED
+        if self.compression == 'deflate':
+            return zipfile.ZIP_DEFLATED
+        if self.compression != 'auto':
+            ExceptionTool.raises(f'Not Implemented Zip Compression: {self.compression}')
+
+        return zipfile.ZIP_STORED \
+            if os.path.splitext(filepath)[1].lower() in self.store_suffixes \
+            else zipfile.ZIP_DEFLATED
+
+    def write_members(self, f, members: List[Tuple[str, str]]):
+        """
+        把文件写入压缩包
+
+        :param f: ZipFile
+        :param members: [(文件路径, 压缩包内的路径)]
+        """
+        workers = self.compress_workers or 0
+        if workers <= 1 or len(members) <= 1 or not JmZipAppender.supported():
+            for abspath, relpath in members:
+                f.write(abspath, relpath, compress_type=self.decide_compress_type(abspath))
+            return
+
+        # 多线程读取文件、计算crc、压缩（zlib计算时会释放GIL），主线程按原顺序写入压缩包
+        # 同时在处理中的文件数有上限，避免压缩大本子时把整个本子读进内存
+        from concurrent.futures import ThreadPoolExecutor
+        from collections import deque
+
+        window = workers * 2
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='zip-compress') as executor:
+            for abspath, relpath in members:
+                if len(pending) >= window:
+                    self.write_compressed_member(f, *pending.popleft().result())
+                pending.append(executor.submit(
+                    self.compress_member, abspath, relpath, self.decide_compress_type(abspath)
+                ))
+
+            while pending:
+                self.write_compressed_member(f, *pending.popleft().result())
+
+    @staticmethod
+    def compress_member(abspath: str, relpath: str, compress_type: int):
+        """
+        读取并压缩一个文件，返回 (ZipInfo, 压缩后的数据)
+        """
+        import zipfile
+        import zlib
+
+        zinfo = zipfile.ZipInfo.from_file(abspath, relpath)
+        with open(abspath, 'rb') as fp:
+            data = fp.read()
+
+        zinfo.file_size = len(data)
+        zinfo.CRC = zlib.crc32(data)
+        zinfo.compress_type = compress_type
+        zinfo.flag_bits = 0
+
+        if compress_type == zipfile.ZIP_DEFLATED:
+            # 和zipfile一样，写入不带zlib头的原始deflate流
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            data = compressor.compress(data) + compressor.flush()
+
+        zinfo.compress_size = len(data)
+        return zinfo, data
+
+    @staticmethod
+    def write_compressed_member(f, zinfo, data: bytes):
+        """
+        把 compress_member 的结果写入压缩包，写入的内容和 ZipFile.write 相同
+
+        用到了ZipFile的私有状态（_lock、_writecheck、_didModify、start_dir），
+        和 JmZipAppender 一样只在Python 3.8 ~ 3.13中验证过，JmZipAppender.supported() 为False时 write_members 不会调用本方法
+        """
+        with f._lock:
+            f._writecheck(zinfo)
+            f._didModify = True
+            f.fp.seek(f.start_dir)
+            zinfo.header_offset = f.fp.tell()
+            f.fp.write(zinfo.FileHeader())
+            f.fp.write(data)
+            f.start_dir = f.fp.tell()
+            f.filelist.append(zinfo)
+            f.NameToInfo[zinfo.filename] = zinfo
+
+    def after_zip(self, path_to_delete: List[str], photo_dict: Optional[dict] = None):
+        # 删除被压缩的原文件，photo_dict为None时删除downloader下载的所有图片
         dirs = sorted(path_to_delete, reverse=True)
+        photo_dict_ls = [photo_dict] if photo_dict is not None else self.downloader.download_success_dict.values()
         image_paths = [
             path
-            for photo_dict in self.downloader.download_success_dict.values()
+            for photo_dict in photo_dict_ls
             for image_list in photo_dict.values()
             for path, image in image_list
         ]
@@ -724,24 +976,35 @@ class Img2pdfPlugin(JmOptionPlugin):
                dir_rule=None,
                delete_original_file=False,
                encrypt=None,
+               stream=False,
+               processes=0,
                **kwargs,
                ):
+        """
+        :param stream: 使用 JmPdfWriter 逐章节、逐页写入pdf，内存占用固定，不需要安装img2pdf
+        :param processes: stream模式下，after_album时用多少个进程并行编码各章节的图片，0表示在当前线程编码
+        """
         if photo is None and album is None:
             jm_log('wrong_usage', 'img2pdf必须运行在after_photo或after_album时')
 
-        try:
-            import img2pdf
-        except ImportError:
-            self.warning_lib_not_install('img2pdf')
-            return
+        if not stream:
+            try:
+                import img2pdf
+            except ImportError:
+                self.warning_lib_not_install('img2pdf')
+                return
 
         self.delete_original_file = delete_original_file
+        self.stream = stream
+        self.processes = processes
 
         # 处理生成的pdf文件的路径
         pdf_filepath = self.decide_filepath(album, photo, filename_rule, 'pdf', pdf_dir, dir_rule)
 
         # 调用 img2pdf 把 photo_dir 下的所有图片转为pdf
         img_path_ls, img_dir_ls = self.write_img_2_pdf(pdf_filepath, album, photo, encrypt)
+        if len(img_path_ls) == 0:
+            return
         self.log(f'Convert Successfully: JM{album or photo} → {pdf_filepath}')
 
         # 执行删除
@@ -749,32 +1012,79 @@ class Img2pdfPlugin(JmOptionPlugin):
         self.execute_deletion(img_path_ls)
 
     def write_img_2_pdf(self, pdf_filepath, album: JmAlbumDetail, photo: JmPhotoDetail, encrypt):
-        import img2pdf
-
         if album is None:
             img_dir_ls = [self.option.decide_image_save_dir(photo)]
         else:
             img_dir_ls = [self.option.decide_image_save_dir(photo) for photo in album]
 
         img_path_ls = []
+        # 每个章节的图片
+        photo_img_ls = []
 
         for img_dir in img_dir_ls:
             imgs = files_of_dir(img_dir)
             if not imgs:
                 continue
             img_path_ls += imgs
+            photo_img_ls.append(imgs)
 
         if len(img_path_ls) == 0:
             self.log(f'所有文件夹都不存在图片，无法生成pdf：{img_dir_ls}', 'error')
+            return img_path_ls, img_dir_ls
 
-        with open(pdf_filepath, 'wb') as f:
-            f.write(img2pdf.convert(img_path_ls))
+        if self.stream:
+            self.write_pdf_stream(pdf_filepath, photo_img_ls)
+        else:
+            import img2pdf
+            with open(pdf_filepath, 'wb') as f:
+                f.write(img2pdf.convert(img_path_ls))
 
         if encrypt:
             self.encrypt_pdf(pdf_filepath, encrypt)
 
         return img_path_ls, img_dir_ls
 
+    def write_pdf_stream(self, pdf_filepath: str, photo_img_ls: List[List[str]]):
+        """
+        按章节顺序把图片逐页写入pdf
+
+        processes > 1 且有多个章节时，每个章节的图片在子进程中解码、压缩，结果写入临时文件，
+        当前进程按章节顺序把临时文件中的页追加到pdf，同一时刻内存中只有一页的数据。
+        """
+        part_path = pdf_filepath + '.part'
+        try:
+            with JmPdfWriter(part_path) as writer:
+                if self.processes <= 1 or len(photo_img_ls) <= 1:
+                    for img_path in (img_path for imgs in photo_img_ls for img_path in imgs):
+                        writer.add_image(img_path)
+                else:
+                    self.write_pdf_pages_by_process(pdf_filepath, writer, photo_img_ls)
+        except BaseException:
+            if file_exists(part_path):
+                os.remove(part_path)
+            raise
+
+        os.replace(part_path, pdf_filepath)
+
+    def write_pdf_pages_by_process(self, pdf_filepath: str, writer: JmPdfWriter, photo_img_ls: List[List[str]]):
+        from concurrent.futures import ProcessPoolExecutor
+
+        record_paths = [f'{pdf_filepath}.{i}.part' for i in range(len(photo_img_ls))]
+        try:
+            with ProcessPoolExecutor(max_workers=self.processes) as executor:
+                future_ls = [
+                    executor.submit(JmPdfWriter.encode_pages_to_file, imgs, record_path)
+                    for imgs, record_path in zip(photo_img_ls, record_paths)
+                ]
+                for future in future_ls:
+                    record_path = future.result()
+                    writer.add_pages_from_file(record_path)
+                    os.remove(record_path)
+        finally:
+            for record_path in record_paths:
+                if file_exists(record_path):
+                    os.remove(record_path)
+
     def encrypt_pdf(self, pdf_filepath: str, encrypt: dict):
         try:
             import pikepdf
@@ -798,8 +1108,19 @@ class LongImgPlugin(JmOptionPlugin):
                filename_rule='Pid',
                delete_original_file=False,
                dir_rule=None,
+               segment_height=0,
+               segment_pages=0,
+               processes=0,
                **kwargs,
                ):
+        """
+        :param segment_height: 大于0时分段合成，每段长图最多这么多像素高（单张图片超过时单独成段）
+        :param segment_pages: 大于0时分段合成，每段长图最多这么多张图片
+        :param processes: 分段合成时，用多少个进程并行缩放图片，0表示在当前线程缩放
+
+        分段合成时，图片逐张缩放、粘贴到当前段，用完立即关闭，内存中只有一段长图。
+        只有一段时文件名不变，多段时文件名为 {文件名}_001.png, {文件名}_002.png ...
+        """
         if photo is None and album is None:
             jm_log('wrong_usage', 'long_img必须运行在after_photo或after_album时')
 
@@ -810,6 +1131,9 @@ class LongImgPlugin(JmOptionPlugin):
             return
 
         self.delete_original_file = delete_original_file
+        self.segment_height = segment_height
+        self.segment_pages = segment_pages
+        self.processes = processes
 
         # 处理生成的长图文件的路径
         long_img_path = self.decide_filepath(album, photo, filename_rule, 'png', img_dir, dir_rule)
@@ -833,6 +1157,10 @@ class LongImgPlugin(JmOptionPlugin):
         img_paths = itertools.chain(*map(files_of_dir, img_dir_items))
         img_paths = list(filter(lambda x: not x.startswith('.'), img_paths))  # 过滤系统文件
 
+        if self.segment_height > 0 or self.segment_pages > 0:
+            self.write_long_img_segments(long_img_path, img_paths)
+            return img_paths
+
         images = self.open_images(img_paths)
 
         try:
@@ -860,7 +1188,113 @@ class LongImgPlugin(JmOptionPlugin):
 
         return img_paths
 
+    def write_long_img_segments(self, long_img_path: str, img_paths: List[str]):
+        """
+        分段合成长图，见 invoke 的 segment_height / segment_pages
+        """
+        from PIL import Image
+
+        # 只读取图片的尺寸，不解码
+        sizes = []
+        for img_path in img_paths:
+            try:
+                with Image.open(img_path) as img:
+                    sizes.append((img_path, img.width, img.height))
+            except IOError as e:
+                self.log(f"Failed to open image {img_path}: {e}", 'error')
+
+        if not sizes:
+            self.log(f'没有可以合成长图的图片: {long_img_path}', 'error')
+            return
+
+        min_img_width = min(width for _, width, _ in sizes)
+        # (图片路径, 缩放后的高度)
+        items = [(img_path, height if width <= min_img_width else int(height * min_img_width / width))
+                 for img_path, width, height in sizes]
+
+        segments = self.split_segments(items)
+        base, ext = os.path.splitext(long_img_path)
+        item_iter = self.iter_resized_images(items, min_img_width)
+
+        for i, segment in enumerate(segments):
+            long_img = Image.new('RGB', (min_img_width, sum(height for _, height in segment)))
+            y_offset = 0
+            for _ in segment:
+                img = next(item_iter)
+                long_img.paste(img, (0, y_offset))
+                y_offset += img.height
+                img.close()
+
+            segment_path = long_img_path if len(segments) == 1 else f'{base}_{i + 1:03d}{ext}'
+            long_img.save(segment_path)
+            long_img.close()
+            self.log(f'长图分段[{i + 1}/{len(segments)}] ({len(segment)}张) → {segment_path}')
+
+    def split_segments(self, items: List[Tuple[str, int]]) -> List[List[Tuple[str, int]]]:
+        segments = [[]]
+        segment_height = 0
+        for item in items:
+            segment = segments[-1]
+            if segment and (
+                    (self.segment_height > 0 and segment_height + item[1] > self.segment_height)
+                    or (self.segment_pages > 0 and len(segment) >= self.segment_pages)
+            ):
+                segment = []
+                segments.append(segment)
+                segment_height = 0
+
+            segment.append(item)
+            segment_height += item[1]
+
+        return segments
+
+    def iter_resized_images(self, items: List[Tuple[str, int]], width: int):
+        """
+        按顺序返回缩放后的图片，processes > 1 时在子进程中解码、缩放，
+        同时在处理中的图片数有上限，避免缩放结果堆积在内存中
+        """
+        from PIL import Image
+
+        if self.processes <= 1:
+            for img_path, height in items:
+                yield Image.frombytes('RGB', (width, height), self.load_resized_image(img_path, width, height))
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+        from collections import deque
+
+        window = self.processes * 2
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            for img_path, height in items:
+                if len(pending) >= window:
+                    future, future_height = pending.popleft()
+                    yield Image.frombytes('RGB', (width, future_height), future.result())
+                pending.append((executor.submit(self.load_resized_image, img_path, width, height), height))
+
+            while pending:
+                future, future_height = pending.popleft()
+                yield Image.frombytes('RGB', (width, future_height), future.result())
+
+    @staticmethod
+    def load_resized_image(img_path: str, width: int, height: int) -> bytes:
+        """
+        读取图片，缩放为 width × height，返回RGB数据，在子进程中执行
+        """
+        from PIL import Image
+
+        try:
+            resample_method = Image.Resampling.LANCZOS
+        except AttributeError:
+            resample_method = Image.LANCZOS
+
+        with Image.open(img_path) as img:
+            if img.size != (width, height):
+                img = img.resize((width, height), resample=resample_method)
+            return img.convert('RGB').tobytes()
+
     def open_images(self, img_paths: List[str]):
+        from PIL import Image
         images = []
         for img_path in img_paths:
             try:
@@ -1115,6 +1549,11 @@ class DeleteDuplicatedFilesPlugin(JmOptionPlugin):
     """
     plugin_key = 'delete_duplicated_files'
 
+    # 见 invoke
+    index_path = None
+    workers = None
+    keep_one = False
+
     @classmethod
     def calculate_md5(cls, file_path):
         import hashlib
@@ -1146,26 +1585,138 @@ class DeleteDuplicatedFilesPlugin(JmOptionPlugin):
                album=None,
                downloader=None,
                delete_original_file=True,
+               scope='album',
+               index_path=None,
+               workers=None,
+               keep_one=None,
                **kwargs,
                ) -> None:
+        """
+        :param limit: 相同内容的文件出现次数大于等于limit时删除
+        :param scope: album: 只检测本子所在文件夹; library: 检测整个下载根目录（dir_rule.base_dir）
+        :param index_path: 哈希索引（sqlite）的保存路径，再次检测时跳过没有变化的文件，为空时不保存
+        :param workers: 计算哈希的线程数，默认为cpu核数
+        :param keep_one: 每组相同的文件是否保留一份（路径排序后的第一个）。
+                         默认album范围全部删除（本子内重复出现的通常是广告页），
+                         library范围保留一份（重复下载的本子、共用的封面不能全部删掉）
+        """
         if album is None:
             return
 
         self.delete_original_file = delete_original_file
-        # 获取到下载本子所在根目录
-        root_folder = self.option.dir_rule.decide_album_root_dir(album)
+        self.index_path = index_path
+        self.workers = workers
+        self.keep_one = keep_one if keep_one is not None else scope == 'library'
+
+        if scope == 'library':
+            root_folder = self.option.dir_rule.base_dir
+        elif scope == 'album':
+            # 获取到下载本子所在根目录
+            root_folder = self.option.dir_rule.decide_album_root_dir(album)
+        else:
+            ExceptionTool.raises(f'Not Implemented Scope: {scope}')
+
         self.find_duplicated_files_and_delete(limit, root_folder, album)
 
     def find_duplicated_files_and_delete(self, limit: int, root_folder: str, album: Optional[JmAlbumDetail] = None):
-        md5_dict = self.find_duplicate_files(root_folder)
-        # 打印MD5出现次数大于等于limit的文件
-        for md5, paths in md5_dict.items():
-            if len(paths) >= limit:
+        from .jm_dedup import JmFileHashIndex
+
+        index_path = JmcomicText.parse_to_abspath(self.index_path) if self.index_path else None
+
+        with JmFileHashIndex(index_path, self.workers) as index:
+            # 打印出现次数大于等于limit的文件
+            for digest, paths in index.find_duplicates([root_folder], max(limit, 1)).items():
                 prefix = '' if album is None else f'({album.album_id}) '
-                message = [prefix + f'MD5: {md5} 出现次数: {len(paths)}'] + \
+                message = [prefix + f'哈希: {digest} 出现次数: {len(paths)}'] + \
                           [f'  {path}' for path in paths]
                 self.log('\n'.join(message))
+                if self.keep_one:
+                    paths = paths[1:]
                 self.execute_deletion(paths)
+                if self.delete_original_file:
+                    index.forget(paths)
+
+
+class NearDuplicateImagePlugin(JmOptionPlugin):
+    """
+    基于感知哈希的相似图片检测，能找出重新编码、重新上传的本子中内容相同的图片（字节不同，MD5检测不出来），
+    见 jm_dedup.JmImageHashIndex，依赖numpy。
+
+    默认只打印相似的图片；delete_original_file 为 true 时，每组只保留文件最大的一张（通常画质最好），删除其余的。
+    在 after_album 使用时，scope决定检测范围；不传album时（例如 after_init）检测整个下载根目录。
+
+    plugins:
+      after_album:
+        - plugin: near_duplicate_images
+          kwargs:
+            scope: library
+            index_path: ./.jm_image_hash.npz
+            max_distance: 4
+            report_path: ./near_duplicates.json
+    """
+    plugin_key = 'near_duplicate_images'
+
+    def invoke(self,
+               album: JmAlbumDetail = None,
+               downloader=None,
+               scope='album',
+               index_path=None,
+               method='phash',
+               max_distance=4,
+               limit=2,
+               delete_original_file=False,
+               report_path=None,
+               workers=None,
+               **kwargs,
+               ) -> None:
+        """
+        :param scope: album: 只检测本子所在文件夹; library: 检测整个下载根目录（dir_rule.base_dir）
+        :param index_path: 指纹文件（npz）的保存路径，再次检测时只计算新增的图片，为空时不保存
+        :param method: phash / dhash
+        :param max_distance: 指纹的汉明距离不超过此值视为相似（64位指纹）
+        :param limit: 相似的图片至少有几张才处理
+        :param report_path: 把相似图片分组写入json文件
+        :param workers: 解码图片的线程数，默认为cpu核数
+        """
+        from importlib.util import find_spec
+        if find_spec('numpy') is None:
+            self.warning_lib_not_install('numpy')
+            return
+
+        from .jm_dedup import JmImageHashIndex
+        self.delete_original_file = delete_original_file
+
+        if album is None or scope == 'library':
+            root_folder = self.option.dir_rule.base_dir
+        elif scope == 'album':
+            root_folder = self.option.dir_rule.decide_album_root_dir(album)
+        else:
+            ExceptionTool.raises(f'Not Implemented Scope: {scope}')
+
+        index = JmImageHashIndex(
+            JmcomicText.parse_to_abspath(index_path) if index_path else None,
+            method,
+            workers,
+        )
+        index.update([root_folder])
+        # 索引中还有本次检测范围以外的图片，只对范围内的图片分组
+        groups = index.find_groups(max_distance, max(limit, 2), [root_folder])
+
+        prefix = '' if album is None else f'({album.album_id}) '
+        for paths in groups:
+            self.log('\n'.join([prefix + f'相似图片: {len(paths)}张'] + [f'  {path}' for path in paths]))
+            # 保留最大的文件
+            keep = max(paths, key=lambda path: os.path.getsize(path) if file_exists(path) else -1)
+            self.execute_deletion([path for path in paths if path != keep])
+
+        if report_path:
+            import json
+            report_path = JmcomicText.parse_to_abspath(report_path)
+            mkdir_if_not_exists(os.path.dirname(report_path))
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(groups, f, ensure_ascii=False, indent=2)
+
+        self.log(f'{prefix}相似图片检测完成: {len(groups)}组 → {root_folder}')
 
 
 class ReplacePathStringPlugin(JmOptionPlugin):
@@ -1245,7 +1796,7 @@ class AdvancedRetryPlugin(JmOptionPlugin):
                 # 图片url
                 client.update_request_with_specify_domain(kwargs, None, is_image)
 
-            resp = request(url_to_use, **kwargs)
+            resp = client.send_request(request, url_to_use, is_image, **kwargs)
             resp = client.raise_if_resp_should_retry(resp, is_image)
             return resp
 
@@ -1415,78 +1966,468 @@ class MetadataPlugin(JmOptionPlugin):
         return metadata
 
 
+class SkipDuplicatedAlbumPlugin(JmOptionPlugin):
+    """
+    下载前检测同一作品的不同本子（例如不同汉化组的重新上传），在请求任何图片之前跳过或标记，见 jm_dedup.JmAlbumTitleIndex
+
+    配置在 before_album，本子不重复时会立即记入索引（批量下载时，同一作品的其他本子也能被检测到）。
+    索引第一次使用时，会从本地库的 metadata.json（见 metadata 插件）导入已下载的本子。
+
+    plugins:
+      before_album:
+        - plugin: skip_duplicated_album
+          kwargs:
+            action: flag # flag（默认）: 只打印日志，照常下载; skip: 跳过下载
+            index_path: ./.jm_album_title.db # 默认保存在下载根目录
+
+    标题相同不一定是同一个本子（例如同名的不同作品），所以默认只标记，确认误判很少之后再改为skip。
+    """
+    plugin_key = 'skip_duplicated_album'
+
+    from threading import Lock
+    lock = Lock()
+    # 索引文件路径 -> 索引，同一个索引在多次调用之间复用
+    index_cache: Dict[str, Any] = {}
+
+    def invoke(self,
+               album: JmAlbumDetail = None,
+               downloader=None,
+               action='flag',
+               index_path=None,
+               **kwargs,
+               ) -> None:
+        self.require_param(album is not None, 'skip_duplicated_album插件只能在 before_album 使用')
+        self.require_param(action in ('skip', 'flag'), f'不支持的action: {action}')
+
+        index = self.get_index(index_path)
+        duplicates = index.find(album.album_id, album.name, album.authors)
+        if not duplicates:
+            index.add(album.album_id, album.name, album.authors)
+            return
+
+        message = '\n'.join(
+            [f'本子[{album.album_id}] {album.name} 可能和本地库中的本子是同一作品:'] +
+            [f'  [{album_id}] {name}' for album_id, name in duplicates]
+        )
+        if action == 'skip':
+            self.log(message + '\n已跳过下载', 'skip')
+            album.skip = True
+        else:
+            self.log(message, 'flag')
+            index.add(album.album_id, album.name, album.authors)
+
+    def get_index(self, index_path):
+        from .jm_dedup import JmAlbumTitleIndex
+
+        base_dir = self.option.dir_rule.base_dir
+        index_path = JmcomicText.parse_to_abspath(index_path) if index_path \
+            else os.path.join(os.path.abspath(base_dir), '.jm_album_title.db')
+
+        with self.lock:
+            index = self.index_cache.get(index_path, None)
+            if index is None:
+                index = JmAlbumTitleIndex(index_path)
+                if index.is_empty():
+                    count = index.import_library(base_dir)
+                    self.log(f'从本地库导入了{count}个本子 → {index_path}')
+                self.index_cache[index_path] = index
+
+        return index
+
+
+class DownloadHistoryStore:
+    """
+    下载历史的sqlite存储，album_id为主键，查询某个本子是否下载过只需一次索引查找。
+
+    - WAL模式 + 忙等待超时，多线程、多进程同时写入是安全的，不会互相覆盖
+    - 同一进程内，同一个文件只打开一个连接（见 of）
+    - commit_batch > 1 时，攒够这么多条记录再一起提交；查询前、进程退出时会提交剩余的记录
+    - 第一次打开时，导入旧版的 .download_history.json（只导入一次，旧文件保留不动）
+    """
+
+    from threading import Lock
+    cache_lock = Lock()
+    # 文件路径 -> store
+    cache: Dict[str, 'DownloadHistoryStore'] = {}
+
+    fields = ('album_id', 'name', 'episode_count', 'download_time', 'page_count')
+
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None, commit_batch=1):
+        import sqlite3
+        from threading import Lock
+
+        self.db_path = db_path
+        self.commit_batch = commit_batch
+        self.lock = Lock()
+        self.pending: List[tuple] = []
+
+        mkdir_if_not_exists(os.path.dirname(db_path))
+        # isolation_level=None: 自己控制事务
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS history ('
+                          'album_id TEXT PRIMARY KEY, name TEXT, episode_count INTEGER, '
+                          'download_time TEXT, page_count INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+        if legacy_json_path is not None:
+            self.import_legacy_json(legacy_json_path)
+
+    @classmethod
+    def of(cls, db_path: str, legacy_json_path: Optional[str] = None) -> 'DownloadHistoryStore':
+        with cls.cache_lock:
+            store = cls.cache.get(db_path, None)
+            if store is None:
+                store = cls(db_path, legacy_json_path)
+                cls.cache[db_path] = store
+                if len(cls.cache) == 1:
+                    import atexit
+                    atexit.register(cls.flush_all)
+            return store
+
+    @classmethod
+    def flush_all(cls):
+        with cls.cache_lock:
+            stores = list(cls.cache.values())
+        for store in stores:
+            store.flush()
+
+    def import_legacy_json(self, legacy_json_path: str):
+        import sqlite3
+        with self.lock:
+            # IMMEDIATE: 多个进程同时第一次打开时，只有一个会导入
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                imported = self.conn.execute("SELECT value FROM meta WHERE key = 'legacy_json'").fetchone()
+                if imported is None and file_exists(legacy_json_path):
+                    with open(legacy_json_path, 'r', encoding='utf-8') as f:
+                        history = json.load(f)
+                    ExceptionTool.require_true(isinstance(history, dict), '旧版下载历史的格式不是dict')
+                    rows = [
+                        (str(album_id), info.get('name'), info.get('episode_count'),
+                         info.get('download_time'), info.get('page_count'))
+                        for album_id, info in history.items()
+                        if isinstance(info, dict)
+                    ]
+                    # 旧文件的记录比数据库中的旧，不覆盖
+                    self.conn.executemany('INSERT OR IGNORE INTO history VALUES (?, ?, ?, ?, ?)', rows)
+                    jm_log('plugin.download_history', f'导入旧版下载历史{len(rows)}条: {legacy_json_path}')
+
+                if imported is None:
+                    self.conn.execute("INSERT INTO meta VALUES ('legacy_json', ?)", (legacy_json_path,))
+                self.conn.execute('COMMIT')
+            except (OSError, ValueError, JmcomicException, sqlite3.Error) as e:
+                self.conn.execute('ROLLBACK')
+                # 旧文件损坏时不影响新记录的写入，下次打开时会再尝试导入
+                jm_log('plugin.download_history', f'导入旧版下载历史失败: {e}')
+            except BaseException:
+                # KeyboardInterrupt等不能吞掉
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def record(self, album_id: str, name: str, episode_count: int, download_time: str, page_count):
+        with self.lock:
+            self.pending.append((str(album_id), name, episode_count, download_time, page_count))
+            if len(self.pending) >= self.commit_batch:
+                self.flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if not self.pending:
+            return
+
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.conn.executemany('INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?)', self.pending)
+            self.conn.execute('COMMIT')
+        except BaseException:
+            self.conn.execute('ROLLBACK')
+            raise
+        self.pending.clear()
+
+    def get(self, album_id: str) -> Optional[dict]:
+        with self.lock:
+            self.flush_locked()
+            row = self.conn.execute('SELECT * FROM history WHERE album_id = ?', (str(album_id),)).fetchone()
+        return None if row is None else dict(zip(self.fields, row))
+
+    def count(self) -> int:
+        with self.lock:
+            self.flush_locked()
+            return self.conn.execute('SELECT COUNT(*) FROM history').fetchone()[0]
+
+
 class DownloadHistoryPlugin(JmOptionPlugin):
     """
     下载历史记录插件
     记录已下载的专辑ID和章节数，避免重复下载
+
+    记录保存在下载根目录的 .download_history.db（sqlite，见 DownloadHistoryStore），
+    旧版的 .download_history.json 会在第一次使用时导入。
+
+    plugins:
+      after_album:
+        - plugin: download_history
+          kwargs:
+            commit_batch: 1 # 攒够多少条记录再提交，批量下载大量本子时可以调大
     """
     plugin_key = 'download_history'
 
-    def __init__(self, option: JmOption):
-        super().__init__(option)
-        self.history_file = None
-        self.history = {}
+    db_filename = '.download_history.db'
+    legacy_json_filename = '.download_history.json'
 
-    def invoke(self, album: JmAlbumDetail = None, **kwargs):
+    def invoke(self, album: JmAlbumDetail = None, commit_batch=1, **kwargs):
         if album is None:
             return
 
-        self._load_history()
         album_id = str(album.album_id)
         episode_count = len(album.episode_list) if hasattr(album, 'episode_list') else 1
 
-        self.history[album_id] = {
-            'name': album.name,
-            'episode_count': episode_count,
-            'download_time': self._get_current_time(),
-            'page_count': album.page_count
-        }
-        self._save_history()
+        store = self.get_store(self.option)
+        store.commit_batch = commit_batch
+        store.record(
+            album_id,
+            album.name,
+            episode_count,
+            self._get_current_time(),
+            album.page_count,
+        )
         self.log(f'已记录下载历史: {album.name} ({album_id})')
 
-    def _load_history(self):
-        if self.history_file is None:
-            base_dir = self.option.dir_rule.base_dir
-            self.history_file = os.path.join(base_dir, '.download_history.json')
-
-        if os.path.exists(self.history_file):
-            try:
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    self.history = json.load(f)
-            except Exception:
-                self.history = {}
-        else:
-            self.history = {}
-
-    def _save_history(self):
-        try:
-            os.makedirs(os.path.dirname(self.history_file), exist_ok=True)
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            self.log(f'保存下载历史失败: {e}')
+    @classmethod
+    def get_store(cls, option: 'JmOption') -> DownloadHistoryStore:
+        base_dir = os.path.abspath(option.dir_rule.base_dir)
+        return DownloadHistoryStore.of(
+            os.path.join(base_dir, cls.db_filename),
+            os.path.join(base_dir, cls.legacy_json_filename),
+        )
 
     def _get_current_time(self):
         from datetime import datetime
         return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
+    @classmethod
+    def get_history(cls, option: 'JmOption', album_id: str) -> Optional[dict]:
+        """获取已下载专辑的记录，未下载返回None"""
+        return cls.get_store(option).get(album_id)
+
     @classmethod
     def is_downloaded(cls, option: 'JmOption', album_id: str) -> bool:
         """检查专辑是否已下载"""
-        instance = cls(option)
-        instance._load_history()
-        return str(album_id) in instance.history
+        return cls.get_history(option, album_id) is not None
 
     @classmethod
     def get_episode_count(cls, option: 'JmOption', album_id: str) -> int:
         """获取已下载专辑的章节数"""
-        instance = cls(option)
-        instance._load_history()
-        album_id = str(album_id)
-        if album_id in instance.history:
-            return instance.history[album_id].get('episode_count', 0)
+        history = cls.get_history(option, album_id)
+        if history is not None:
+            return history.get('episode_count') or 0
         return 0
 
 
-JmModuleConfig.register_plugin(MetadataPlugin)
-JmModuleConfig.register_plugin(DownloadHistoryPlugin)
+class ProfilerPlugin(JmOptionPlugin):
+    """
+    用采样profiler包裹本子的下载，结束后输出折叠栈文件，可用 flamegraph.pl 或 speedscope.app 查看
+
+    需要同时配置在 before_album（phase: start）和 after_album（phase: stop）：
+
+    plugins:
+      before_album:
+        - plugin: profiler
+          kwargs:
+            phase: start
+            interval: 0.005 # 采样间隔（秒）
+      after_album:
+        - plugin: profiler
+          kwargs:
+            phase: stop
+            dir: ./profile # 输出目录，文件名为 {本子id}.folded
+
+    本子被跳过或下载抛出异常时 after_album 不会执行，
+    这时未结束的采样会在downloader的with语句结束时停止并丢弃（见 JmDownloader.add_exit_callback）。
+    """
+    plugin_key = 'profiler'
+
+    from threading import Lock
+    lock = Lock()
+    # (downloader, 本子id) -> 正在运行的profiler
+    running: Dict[Tuple[int, str], Any] = {}
+
+    def invoke(self,
+               album: JmAlbumDetail = None,
+               downloader=None,
+               phase=None,
+               dir=None,
+               interval=0.005,
+               include_idle=True,
+               **kwargs,
+               ) -> None:
+        from .jm_profiler import JmSamplingProfiler
+
+        self.require_param(album is not None, 'profiler插件只能在 before_album / after_album 使用')
+        self.require_param(phase in ('start', 'stop'),
+                           'profiler插件需要指定phase: before_album中为start，after_album中为stop')
+        key = (id(downloader), album.id)
+
+        if phase == 'stop':
+            with self.lock:
+                profiler = self.running.pop(key, None)
+            if profiler is None:
+                self.log(f'本子[{album.id}]没有正在运行的采样，忽略', 'skip')
+                return
+
+            profiler.stop()
+            filepath = os.path.join(self.decide_dir(dir), f'{album.id}.folded')
+            profiler.write_collapsed(filepath)
+            self.log(f'采样结束: [{album.id}]，共{profiler.sample_count}次 → [{filepath}]')
+            return
+
+        if album.skip:
+            # 本子已经被前面的插件跳过，after_album不会执行
+            return
+
+        profiler = JmSamplingProfiler(interval, include_idle).start()
+        with self.lock:
+            stale = self.running.pop(key, None)
+            self.running[key] = profiler
+        if stale is not None:
+            stale.stop()
+            self.log(f'丢弃上一次未结束的采样: [{album.id}]', 'discard')
+
+        if downloader is not None:
+            downloader.add_exit_callback(lambda: self.discard(key, profiler))
+        self.log(f'开始采样: [{album.id}]')
+
+    @classmethod
+    def discard(cls, key, profiler):
+        """
+        停止并丢弃没有走到 phase: stop 的采样
+        """
+        with cls.lock:
+            if cls.running.get(key, None) is not profiler:
+                return
+            cls.running.pop(key)
+
+        profiler.stop()
+        jm_log('plugin.profiler.discard', f'本子[{key[1]}]没有执行after_album，丢弃未结束的采样')
+
+    def decide_dir(self, dir):
+        if dir is None:
+            return os.path.join(self.option.dir_rule.base_dir, 'profile')
+        return JmcomicText.parse_to_abspath(dir)
+
+
+class MemorySnapshotPlugin(JmOptionPlugin):
+    """
+    用tracemalloc对比本子下载前后的内存，输出增长最多的代码位置，
+    以及 download_success_dict、CLIENT_CACHE等结构的大小，用于排查长时间运行时的内存上涨
+
+    和profiler插件一样，需要同时配置在 before_album（phase: start）和 after_album（phase: stop）:
+
+    plugins:
+      before_album:
+        - plugin: memory_snapshot
+          kwargs:
+            phase: start
+      after_album:
+        - plugin: memory_snapshot
+          kwargs:
+            phase: stop
+            limit: 20 # 输出前几个位置
+            dir: ./memory # 可选，把结果写入 {本子id}.txt
+
+    没有需要对比的快照时会关闭本插件开启的tracemalloc，避免一直拖慢内存分配。
+    """
+    plugin_key = 'memory_snapshot'
+
+    from threading import Lock
+    lock = Lock()
+    # (downloader, 本子id) -> 下载前的快照
+    snapshots: Dict[Tuple[int, str], Any] = {}
+    # tracemalloc是否由本插件开启
+    owns_tracing = False
+
+    def invoke(self,
+               album: JmAlbumDetail = None,
+               downloader=None,
+               phase=None,
+               limit=20,
+               dir=None,
+               **kwargs,
+               ) -> None:
+        from .jm_profiler import JmMemoryTracker
+
+        self.require_param(album is not None, 'memory_snapshot插件只能在 before_album / after_album 使用')
+        self.require_param(phase in ('start', 'stop'),
+                           'memory_snapshot插件需要指定phase: before_album中为start，after_album中为stop')
+        key = (id(downloader), album.id)
+
+        if phase == 'start':
+            if album.skip:
+                # 本子已经被前面的插件跳过，after_album不会执行
+                return
+
+            import tracemalloc
+            with self.lock:
+                if not tracemalloc.is_tracing():
+                    MemorySnapshotPlugin.owns_tracing = True
+                snapshot = JmMemoryTracker.take_snapshot()
+                self.snapshots[key] = snapshot
+            if downloader is not None:
+                downloader.add_exit_callback(lambda: self.discard(key, snapshot))
+            return
+
+        with self.lock:
+            old_snapshot = self.snapshots.pop(key, None)
+        if old_snapshot is None:
+            self.log(f'本子[{album.id}]没有下载前的快照，忽略', 'skip')
+            return
+
+        lines = [f'本子[{album.id}]下载前后的内存变化:']
+        lines.extend(JmMemoryTracker.diff(old_snapshot, JmMemoryTracker.take_snapshot(), limit))
+        lines.append('结构大小:')
+        lines.extend(f'  {k}: {v}' for k, v in JmMemoryTracker.structure_sizes(downloader).items())
+        report = '\n'.join(lines)
+        self.stop_tracing_if_idle()
+
+        if dir is not None:
+            dir = JmcomicText.parse_to_abspath(dir)
+            mkdir_if_not_exists(dir)
+            with open(os.path.join(dir, f'{album.id}.txt'), 'w', encoding='utf-8') as f:
+                f.write(report)
+
+        self.log(report)
+
+    @classmethod
+    def discard(cls, key, snapshot):
+        """
+        丢弃没有走到 phase: stop 的快照
+        """
+        with cls.lock:
+            if cls.snapshots.get(key, None) is not snapshot:
+                return
+            cls.snapshots.pop(key)
+
+        jm_log('plugin.memory_snapshot.discard', f'本子[{key[1]}]没有执行after_album，丢弃下载前的快照')
+        cls.stop_tracing_if_idle()
+
+    @classmethod
+    def stop_tracing_if_idle(cls):
+        from .jm_profiler import JmMemoryTracker
+        with cls.lock:
+            if len(cls.snapshots) == 0 and cls.owns_tracing:
+                JmMemoryTracker.stop()
+                cls.owns_tracing = False
+
+
+# 注册本文件中的全部插件
+# jm_plugin 是延迟加载的（见 __init__.py），所以插件在本文件被加载时注册，而不是在 import jmcomic 时
+for _plugin_class in list(globals().values()):
+    if isinstance(_plugin_class, type) \
+            and _plugin_class is not JmOptionPlugin \
+            and issubclass(_plugin_class, JmOptionPlugin):
+        JmModuleConfig.register_plugin(_plugin_class)
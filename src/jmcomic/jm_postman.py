@@ -0,0 +1,332 @@
+# 该文件存放jmcomic自定义的Postman实现，会注册到common的Postman注册表中，
+# 可以通过option配置 client.postman.type 选用
+from threading import Lock
+
+from .jm_client_interface import *
+
+
+def register_postman(clazz):
+    """
+    把Postman实现类注册到common的注册表，使 Postmans.create 能根据 type 找到它
+    """
+    from common import ComponentRegistry
+    ComponentRegistry.get_all_impl(Postman)[clazz.postman_key] = clazz
+    return clazz
+
+
+@register_postman
+class CurlCffiPoolPostman(AbstractPostman):
+    """
+    连接池模式的curl_cffi postman，option配置示例:
+
+    client:
+      postman:
+        type: curl_cffi_pool
+        meta_data:
+          impersonate: chrome
+          pool:
+            size: 8  # 每个host最多保留的空闲keep-alive会话数
+            dns_cache_timeout: 600  # DNS缓存时间（秒）
+            prewarm: true  # client初始化时预热API域名和图片域名的连接
+
+    默认的curl_cffi postman每次请求都会新建会话，每张图片都要重新握手TLS。
+    本类按host维护keep-alive会话池，请求时借出一个空闲会话，用完后归还。
+
+    下载线程是按章节/图片临时创建的，线程结束后线程本地的会话就会丢失，
+    所以会话不绑定在线程上，而是由池子借出、归还，归还后可以被其他线程继续复用。
+    """
+    postman_key = 'curl_cffi_pool'
+
+    DEFAULT_POOL_CONFIG = {
+        'size': 8,
+        'dns_cache_timeout': 600,
+        'prewarm': True,
+    }
+
+    def __init__(self, kwargs) -> None:
+        kwargs = dict(kwargs)
+        pool_config = kwargs.pop('pool', None) or {}
+        super().__init__(kwargs)
+        self.pool_config = {**self.DEFAULT_POOL_CONFIG, **pool_config}
+        self.pool_lock = Lock()
+        # host -> 空闲会话列表，后进先出，最近用过的连接最可能还活着
+        self.idle_sessions: Dict[str, List] = {}
+        self.stats_lock = Lock()
+        self.stats = {
+            'request': 0,
+            'session_created': 0,
+            'connection_new': 0,
+            'connection_reused': 0,
+        }
+
+    def __get__(self):
+        return lambda url, **kwargs: self.request('GET', url, **kwargs)
+
+    def __post__(self):
+        return lambda url, **kwargs: self.request('POST', url, **kwargs)
+
+    def copy(self):
+        return self.__class__({**self.meta_data, 'pool': dict(self.pool_config)})
+
+    def request(self, method, url, **kwargs):
+        host = self.host_of(url)
+        session = self.acquire_session(host)
+        try:
+            resp = session.request(method, url, **kwargs)
+            self.record_connection(resp)
+            return resp
+        finally:
+            self.release_session(host, session)
+
+    def acquire_session(self, host):
+        with self.pool_lock:
+            sessions = self.idle_sessions.get(host, None)
+            if sessions:
+                return sessions.pop()
+
+        return self.new_session()
+
+    def release_session(self, host, session):
+        with self.pool_lock:
+            sessions = self.idle_sessions.setdefault(host, [])
+            if len(sessions) < self.pool_config['size']:
+                sessions.append(session)
+                return
+
+        # 池子已满，多出来的会话直接关闭
+        session.close()
+
+    def new_session(self):
+        from curl_cffi import CurlOpt, CurlInfo
+        from curl_cffi.requests import Session
+
+        with self.stats_lock:
+            self.stats['session_created'] += 1
+
+        return Session(
+            # 会话会在不同线程之间流转，因此只使用一个curl句柄
+            use_thread_local_curl=False,
+            # cookies交由meta_data管理，和默认的curl_cffi postman行为一致
+            discard_cookies=True,
+            curl_options={CurlOpt.DNS_CACHE_TIMEOUT: self.pool_config['dns_cache_timeout']},
+            # 本次请求新建的连接数，为0说明复用了keep-alive连接
+            curl_infos=[CurlInfo.NUM_CONNECTS],
+        )
+
+    def record_connection(self, resp):
+        from curl_cffi import CurlInfo
+
+        new_connections = resp.infos.get(CurlInfo.NUM_CONNECTS, 1)
+
+        with self.stats_lock:
+            self.stats['request'] += 1
+            if new_connections == 0:
+                self.stats['connection_reused'] += 1
+            else:
+                self.stats['connection_new'] += new_connections
+
+        JmMetrics.record_connection(self.postman_key, new_connections == 0)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        连接复用的统计，connection_reused / request 即为keep-alive复用率
+        """
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def prewarm(self, url_list: List[str]):
+        """
+        在后台线程中预先建立到给定地址的连接，建立好的会话会留在池子里
+        """
+        if self.pool_config['prewarm'] is not True or len(url_list) == 0:
+            return
+
+        def do_prewarm(url):
+            kwargs = self.merge_kwargs({'allow_redirects': False})
+            kwargs.pop('cookies', None)
+            try:
+                self.request('HEAD', url, **kwargs)
+            except Exception as e:
+                jm_log('postman.prewarm.error', f'预热连接失败: [{url}], 异常: {e}')
+
+        from threading import Thread
+        for url in url_list:
+            Thread(target=do_prewarm, args=(url,), daemon=True).start()
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        from urllib.parse import urlsplit
+        return urlsplit(url).netloc
+
+
+class HttpxResponse:
+    """
+    把httpx的响应适配为jmcomic使用的curl_cffi响应接口
+    """
+
+    def __init__(self, resp):
+        self.resp = resp
+
+    @property
+    def url(self) -> str:
+        return str(self.resp.url)
+
+    @property
+    def redirect_count(self) -> int:
+        return len(self.resp.history)
+
+    @property
+    def request(self) -> 'HttpxRequest':
+        return HttpxRequest(self.resp.request)
+
+    def __getattr__(self, item):
+        return getattr(self.resp, item)
+
+
+class HttpxRequest:
+    """
+    httpx的请求对象的url是httpx.URL，jmcomic按字符串使用（例如 JmApiClient.raise_if_resp_should_retry）
+    """
+
+    def __init__(self, request):
+        self.req = request
+
+    @property
+    def url(self) -> str:
+        return str(self.req.url)
+
+    def __getattr__(self, item):
+        return getattr(self.req, item)
+
+
+@register_postman
+class HttpxPostman(AbstractPostman):
+    """
+    基于httpx的HTTP/2 postman，option配置示例:
+
+    client:
+      postman:
+        type: httpx
+        meta_data:
+          httpx:
+            http2: true
+            max_connections: 16  # 连接总数上限
+            max_keepalive_connections: 16
+
+    所有请求共用一个httpx.Client，同一个CDN host的大量图片请求会复用少量HTTP/2连接（多路复用）。
+    需要安装h2: pip install httpx[http2]，没有安装时退回HTTP/1.1并打印警告。
+
+    httpx不支持浏览器指纹模拟，impersonate配置会被忽略；
+    proxies只在创建httpx.Client时生效，取 https 代理，其次 http 代理。
+    """
+    postman_key = 'httpx'
+
+    DEFAULT_HTTPX_CONFIG = {
+        'http1': True,
+        'http2': True,
+        'max_connections': 16,
+        'max_keepalive_connections': 16,
+    }
+
+    # httpx.Client.request 支持的参数，其余参数（例如impersonate）会被丢弃
+    REQUEST_KWARGS = {'params', 'headers', 'data', 'json', 'files', 'content', 'timeout'}
+
+    def __init__(self, kwargs) -> None:
+        kwargs = dict(kwargs)
+        httpx_config = kwargs.pop('httpx', None) or {}
+        super().__init__(kwargs)
+        self.httpx_config = {**self.DEFAULT_HTTPX_CONFIG, **httpx_config}
+        self.check_http2_support()
+        self.client_lock = Lock()
+        self.client = None
+        self.stats_lock = Lock()
+        # http_version -> 请求数
+        self.stats: Dict[str, int] = {}
+
+    def __get__(self):
+        return lambda url, **kwargs: self.request('GET', url, **kwargs)
+
+    def __post__(self):
+        return lambda url, **kwargs: self.request('POST', url, **kwargs)
+
+    def copy(self):
+        return self.__class__({**self.meta_data, 'httpx': dict(self.httpx_config)})
+
+    def check_http2_support(self):
+        """
+        没有安装h2时 httpx.Client(http2=True) 会在每次请求时才抛ImportError，
+        被client的重试机制当成域名不可用，所以在创建postman时提前检查，退回HTTP/1.1
+        """
+        if self.httpx_config['http2'] is not True:
+            return
+
+        from importlib.util import find_spec
+        if find_spec('h2') is not None:
+            return
+
+        jm_log('postman.httpx', '没有安装h2，httpx退回HTTP/1.1，启用HTTP/2需要安装: pip install httpx[http2]')
+        self.httpx_config['http2'] = False
+        self.httpx_config['http1'] = True
+
+    def get_client(self):
+        if self.client is not None:
+            return self.client
+
+        with self.client_lock:
+            if self.client is None:
+                self.client = self.new_client()
+
+        return self.client
+
+    def new_client(self):
+        import httpx
+
+        conf = self.httpx_config
+        proxies = self.meta_data.get('proxies', None) or {}
+
+        return httpx.Client(
+            http1=conf['http1'],
+            http2=conf['http2'],
+            limits=httpx.Limits(
+                max_connections=conf['max_connections'],
+                max_keepalive_connections=conf['max_keepalive_connections'],
+            ),
+            proxy=proxies.get('https', None) or proxies.get('http', None),
+            verify=self.meta_data.get('verify', True),
+        )
+
+    def request(self, method, url, **kwargs):
+        resp = self.get_client().request(method, url, **self.to_httpx_kwargs(kwargs))
+
+        with self.stats_lock:
+            self.stats[resp.http_version] = self.stats.get(resp.http_version, 0) + 1
+
+        return HttpxResponse(resp)
+
+    def to_httpx_kwargs(self, kwargs: dict) -> dict:
+        import httpx
+
+        ret = {k: v for k, v in kwargs.items() if k in self.REQUEST_KWARGS}
+        ret['follow_redirects'] = kwargs.get('allow_redirects', True)
+
+        # curl_cffi风格的 (connect, read) 期限
+        timeout = ret.get('timeout', None)
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            ret['timeout'] = httpx.Timeout(read, connect=connect)
+
+        # httpx不再推荐按请求传cookies，这里转为Cookie请求头
+        cookies = kwargs.get('cookies', None)
+        if cookies:
+            headers = dict(ret.get('headers', None) or {})
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in cookies.items())
+            ret['headers'] = headers
+
+        return ret
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        各HTTP版本的请求数，例如 {'HTTP/2': 100}
+        """
+        with self.stats_lock:
+            return dict(self.stats)
@@ -0,0 +1,206 @@
+# 该文件存放jmcomic的性能剖析工具：采样profiler和内存快照，
+# 不会在import jmcomic时加载，由插件（profiler / memory_snapshot）和web后端按需导入
+import os
+import sys
+import threading
+from threading import Lock
+
+from .jm_metrics import *
+
+
+class JmSamplingProfiler:
+    """
+    采样profiler，在后台线程中按固定间隔采集所有线程的调用栈，
+    统计结果可导出为折叠栈（collapsed stack）格式，可用 flamegraph.pl 或 speedscope.app 生成火焰图。
+
+    采集的是墙钟时间，等待网络、锁、IO的线程也会被计入，适合分析下载这种IO密集的场景。
+
+    用法:
+    with JmSamplingProfiler() as profiler:
+        download_album(123)
+    profiler.write_collapsed('./profile.folded')
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle=True):
+        """
+        :param interval: 采样间隔（秒）
+        :param include_idle: 是否记录处于等待状态的线程（栈顶为 wait/sleep/select 等）
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Dict[str, int] = {}
+        self.sample_count = 0
+        self.lock = Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    IDLE_FUNCTIONS = {'wait', 'sleep', 'select', 'poll', 'accept', 'recv', 'recv_into', 'acquire', '_wait_for_tstate_lock'}
+
+    def start(self):
+        if self.thread is not None:
+            return self
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='jm-sampling-profiler', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread is None:
+            return self
+
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        return self
+
+    def run(self):
+        self_ident = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            self.sample(self_ident)
+
+    def sample(self, skip_ident=None):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        frames = sys._current_frames()
+
+        collected = []
+        for ident, frame in frames.items():
+            if ident == skip_ident:
+                continue
+
+            if not self.include_idle and frame.f_code.co_name in self.IDLE_FUNCTIONS:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(self.format_frame(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}'))
+            stack.reverse()
+            collected.append(';'.join(stack))
+
+        with self.lock:
+            self.sample_count += 1
+            for key in collected:
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    @staticmethod
+    def format_frame(frame) -> str:
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+    def collapsed(self) -> str:
+        """
+        折叠栈格式，每行: 线程名;外层函数;...;内层函数 采样次数
+        """
+        with self.lock:
+            items = sorted(self.stacks.items(), key=lambda kv: -kv[1])
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+    def write_collapsed(self, filepath: str):
+        mkdir_if_not_exists(os.path.dirname(os.path.abspath(filepath)))
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        jm_log('profiler.write', f'采样{self.sample_count}次，折叠栈已写入: [{filepath}]')
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @classmethod
+    def profile_for(cls, seconds: float, interval: float = 0.005, include_idle=True) -> 'JmSamplingProfiler':
+        """
+        阻塞地采样seconds秒，返回profiler
+        """
+        profiler = cls(interval, include_idle).start()
+        profiler.stop_event.wait(seconds)
+        return profiler.stop()
+
+
+class JmMemoryTracker:
+    """
+    基于tracemalloc的内存快照工具，用于定位长时间运行时内存上涨的来源
+
+    tracemalloc只记录开始追踪之后的分配，并且会让内存分配变慢，因此只在需要排查时开启。
+    """
+
+    @classmethod
+    def start(cls, nframes=10):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(nframes)
+
+    @classmethod
+    def stop(cls):
+        import tracemalloc
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @classmethod
+    def take_snapshot(cls):
+        import tracemalloc
+        cls.start()
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+
+    @classmethod
+    def diff(cls, old_snapshot, new_snapshot, limit=20, key_type='lineno') -> List[str]:
+        """
+        对比两个快照，返回内存增长最多的位置
+        """
+        stats = new_snapshot.compare_to(old_snapshot, key_type)
+        return [str(stat) for stat in stats[:limit]]
+
+    @classmethod
+    def top(cls, snapshot=None, limit=20, key_type='lineno') -> List[str]:
+        """
+        当前占用内存最多的位置
+        """
+        snapshot = snapshot or cls.take_snapshot()
+        return [str(stat) for stat in snapshot.statistics(key_type)[:limit]]
+
+    @classmethod
+    def current_rss(cls) -> Optional[int]:
+        """
+        当前进程的常驻内存（字节），无法获取时返回None
+        """
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            pass
+
+        try:
+            import resource
+            # linux上单位是KB，macOS上是字节，这里取的是峰值
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss if sys.platform == 'darwin' else maxrss * 1024
+        except ImportError:
+            return None
+
+    @classmethod
+    def structure_sizes(cls, downloader=None) -> Dict[str, Any]:
+        """
+        下载过程中可能持续增长的结构的大小
+        """
+        sizes = {'rss': cls.current_rss()}
+
+        if downloader is not None:
+            success_dict = downloader.download_success_dict
+            sizes['download_success_dict.album'] = len(success_dict)
+            sizes['download_success_dict.photo'] = sum(len(v) for v in success_dict.values())
+            sizes['download_success_dict.image'] = sum(len(images)
+                                                       for photo_dict in success_dict.values()
+                                                       for images in photo_dict.values())
+            sizes['download_failed_image'] = len(downloader.download_failed_image)
+
+            cache = getattr(downloader.client, 'CLIENT_CACHE', None)
+            if cache is not None:
+                sizes['CLIENT_CACHE'] = len(cache)
+
+        return sizes
@@ -1,5 +1,3 @@
-from PIL import Image
-
 from .jm_exception import *
 
 
@@ -9,7 +7,8 @@ class JmcomicText:
         (compile(r'(photos?|albums?)/(\d+)'), 2),
         (compile(r'id=(\d+)'), 1),
     ]
-    pattern_html_jm_pub_domain = compile(r'[\w-]+\.\w+/?\w+')
+    # (?<![\w-]) 只允许从单词开头匹配，避免在很长的无 . 文本上逐位回溯
+    pattern_html_jm_pub_domain = compile(r'(?<![\w-])[\w-]+\.\w+/?\w+')
 
     pattern_html_photo_photo_id = compile(r'<meta property="og:url" content=".*?/photo/(\d+)/?.*?">')
     pattern_html_photo_scramble_id = compile(r'var scramble_id = (\d+);')
@@ -27,7 +26,10 @@ class JmcomicText:
     pattern_html_album_scramble_id = compile(r'var scramble_id = (\d+);')
     pattern_html_album_name = compile(r'id="book-name"[^>]*?>([\s\S]*?)<')
     pattern_html_album_description = compile(r'叙述：([\s\S]*?)</h2>')
-    pattern_html_album_episode_list = compile(r'data-album="(\d+)"[^>]*>[\s\S]*?第(\d+)[话話]([\s\S]*?)<[\s\S]*?>')
+    # 章节名的查找不会越过下一个章节，章节名中没有 第x话 时不会扫描到页面末尾
+    pattern_html_album_episode_list = compile(
+        r'data-album="(\d+)"[^>]*>(?:(?!data-album=")[\s\S])*?第(\d+)[话話]([^<]*)<[^>]*>'
+    )
     pattern_html_album_page_count = compile(r'<span class="pagecount">.*?:(\d+)</span>')
     pattern_html_album_pub_date = compile(r'>上架日期 : (.*?)</span>')
     pattern_html_album_update_date = compile(r'>更新日期 : (.*?)</span>')
@@ -59,10 +61,28 @@ class JmcomicText:
     # 評論(div)
     pattern_html_album_comment_count = compile(r'<div class="badge"[^>]*?id="total_video_comments">(\d+)</div>'), 0
 
+    # 字段所在的页面区域: 字段名前缀 -> [(区域起点的标记, 区域内的字段名)]
+    # reflect_field_dict 用 str.find 定位区域起点，字段正则从起点开始匹配，不再扫描区域之前的脚本和推荐内容，
+    # 区域内匹配不上的字段会再匹配一次全文。
+    # 从起点开始的search只有在字段在整个页面中最多出现一次时，结果才和全文search相同，
+    # 所以这里只能列出这样的字段；findall的 _list 字段和多级pattern的字段不使用区域（见 field_plan）。
+    # 修改后用 scripts/bench_html_parser.py --corpus 检查区域解析和全文解析的结果是否一致。
+    html_field_regions = {
+        'pattern_html_album_': [
+            ('id="book-name"', ('name', 'description', 'page_count', 'pub_date', 'update_date', 'comment_count')),
+        ],
+        'pattern_html_photo_': [
+            ('var scramble_id = ', ('scramble_id', 'series_id', 'sort', 'page_arr')),
+            ('/media/albums/blank', ('data_original_0',)),
+        ],
+    }
+    # (cls, 字段名前缀) -> 字段计划，见 field_plan
+    _field_plan_cache = {}
+
     # 提取接口返回值信息
     pattern_ajax_favorite_msg = compile(r'</button>(.*?)</div>')
     # 提取api接口返回值里的json，防止返回值里有无关日志导致json解析报错
-    pattern_api_response_json_object = compile(r'\{[\s\S]*?}')
+    pattern_api_response_json_object = compile(r'\{[^}]*}')
 
     @classmethod
     def parse_to_jm_domain(cls, text: str):
@@ -135,10 +155,58 @@ class JmcomicText:
             JmModuleConfig.album_class()
         )
 
+    @classmethod
+    def field_plan(cls, cls_field_prefix: str) -> List[Tuple[str, Any, Any, Optional[str]]]:
+        """
+        解析字段的计划，每个类每个前缀只构建一次
+
+        :return: [(字段名, pattern, 默认值, 区域起点的标记)]
+        """
+        key = (cls, cls_field_prefix)
+        plan = cls._field_plan_cache.get(key)
+        if plan is not None:
+            return plan
+
+        field_anchor = {}
+        for anchor, field_names in cls.html_field_regions.get(cls_field_prefix, []):
+            for field_name in field_names:
+                field_anchor.setdefault(field_name, anchor)
+
+        plan = []
+        pattern_name: str
+        for pattern_name, pattern in cls.__dict__.items():
+            if not pattern_name.startswith(cls_field_prefix):
+                continue
+
+            # 支持如果不匹配，使用默认值
+            if isinstance(pattern, tuple):
+                pattern, default = pattern
+            else:
+                default = None
+
+            field_name = pattern_name[pattern_name.index(cls_field_prefix) + len(cls_field_prefix):]
+            anchor = field_anchor.get(field_name, None)
+            if field_name.endswith('_list') or isinstance(pattern, list):
+                # findall和多级pattern会丢掉起点之前的匹配，不能只在区域内匹配
+                anchor = None
+            plan.append((field_name, pattern, default, anchor))
+
+        cls._field_plan_cache[key] = plan
+        return plan
+
     @classmethod
     def reflect_new_instance(cls, html: str, cls_field_prefix: str, clazz: type):
+        return clazz(**cls.reflect_field_dict(html, cls_field_prefix))
+
+    @classmethod
+    def reflect_field_dict(cls, html: str, cls_field_prefix: str, use_region=True) -> Dict[str, Any]:
+        """
+        用前缀为 cls_field_prefix 的正则解析html中的字段
 
-        def match_field(field_name: str, pattern: Union[Pattern, List[Pattern]], text):
+        :param use_region: 是否按 html_field_regions 从区域起点开始匹配，为False时全部匹配全文，用于检查两者结果一致
+        """
+
+        def match_field(field_name: str, pattern: Union[Pattern, List[Pattern]], text, pos=0):
 
             if isinstance(pattern, list):
                 # 如果是 pattern 是 List[re.Pattern]，
@@ -147,36 +215,35 @@ class JmcomicText:
                 last_pattern = pattern[len(pattern) - 1]
                 # 缩小文本
                 for i in range(0, len(pattern) - 1):
-                    match: Match = pattern[i].search(text)
+                    match: Match = pattern[i].search(text, pos)
                     if match is None:
                         return None
                     text = match[0]
+                    pos = 0
 
                 return last_pattern.findall(text)
 
             if field_name.endswith("_list"):
-                return pattern.findall(text)
+                return pattern.findall(text, pos)
             else:
-                match = pattern.search(text)
+                match = pattern.search(text, pos)
                 if match is not None:
                     return match[1]
                 return None
 
         field_dict = {}
-        pattern_name: str
-        for pattern_name, pattern in cls.__dict__.items():
-            if not pattern_name.startswith(cls_field_prefix):
-                continue
-
-            # 支持如果不匹配，使用默认值
-            if isinstance(pattern, tuple):
-                pattern, default = pattern
-            else:
-                default = None
-
-            # 获取字段名和值
-            field_name = pattern_name[pattern_name.index(cls_field_prefix) + len(cls_field_prefix):]
-            field_value = match_field(field_name, pattern, html)
+        region_start = {}
+        for field_name, pattern, default, anchor in cls.field_plan(cls_field_prefix):
+            # 先在区域内匹配，匹配不上再匹配全文
+            pos = 0
+            if anchor is not None and use_region:
+                if anchor not in region_start:
+                    region_start[anchor] = max(html.find(anchor), 0)
+                pos = region_start[anchor]
+
+            field_value = match_field(field_name, pattern, html, pos)
+            if not field_value and pos != 0:
+                field_value = match_field(field_name, pattern, html)
 
             if field_value is None:
                 if default is None:
@@ -194,7 +261,7 @@ class JmcomicText:
             # 保存字段
             field_dict[field_name] = field_value
 
-        return clazz(**field_dict)
+        return field_dict
 
     @classmethod
     def format_url(cls, path, domain):
@@ -375,15 +442,23 @@ class JmcomicText:
     # noinspection PyTypeChecker
     @classmethod
     def try_parse_json_object(cls, resp_text: str) -> dict:
-        import json
         text = resp_text.strip()
         if text.startswith('{') and text.endswith('}'):
             # fast case
-            return json.loads(text)
+            return JmModuleConfig.json_loads(text)
+
+        start, end = text.find('{'), text.rfind('}') + 1
+        if 0 <= start < end:
+            # json前后有无关日志，直接解析最外层的 {...}，大多数情况下不需要走下面的正则
+            try:
+                return JmModuleConfig.json_loads(text[start:end])
+            except Exception as e:
+                jm_log('parse_json_object.error', e)
 
-        for match in cls.pattern_api_response_json_object.finditer(text):
+        # 只在最后一个 } 之前查找，返回值被截断时不会让每个 { 都扫描到末尾
+        for match in cls.pattern_api_response_json_object.finditer(text, 0, end):
             try:
-                return json.loads(match.group(0))
+                return JmModuleConfig.json_loads(match.group(0))
             except Exception as e:
                 jm_log('parse_json_object.error', e)
 
@@ -472,15 +547,18 @@ class JmPageTool:
     pattern_html_search_shorten_for = compile(r'<div class="well well-sm">([\s\S]*)<div class="row">')
 
     # 用来提取搜索页面的album的信息
+    # 每一项的查找都不会越过下一个本子的链接，某一项缺少tags时不会扫描到页面末尾
     pattern_html_search_album_info_list = compile(
-        r'<a href="/album/(\d+)/[\s\S]*?title="(.*?)"([\s\S]*?)<div class="title-truncate tags .*>([\s\S]*?)</div>'
+        r'<a href="/album/(\d+)/(?:(?!<a href="/album/(?!\1/))[\s\S])*?title="(.*?)"'
+        r'((?:(?!<a href="/album/(?!\1/))[\s\S])*?)'
+        r'<div class="title-truncate tags .*>([\s\S]*?)</div>'
     )
 
-    # 用来提取分类页面的album的信息
+    # 用来提取分类页面的album的信息，缺少clearfix时同样不会越过下一个本子的链接
     pattern_html_category_album_info_list = compile(
         r'<a href="/album/(\d+)/[^>]*>[^>]*?'
         r'title="(.*?)"[^>]*>[ \n]*</a>[ \n]*'
-        r'<div class="label-loveicon">([\s\S]*?)'
+        r'<div class="label-loveicon">((?:(?!<a href="/album/(?!\1/))[\s\S])*?)'
         r'<div class="clearfix">'
     )
 
@@ -492,10 +570,10 @@ class JmPageTool:
 
     pattern_html_search_total = compile(r'class="text-white">(\d+)</span> A漫.'), 0
 
-    # 收藏页面的本子结果
+    # 收藏页面的本子结果，查找不会越过下一个收藏项
     pattern_html_favorite_content = compile(
-        r'<div id="favorites_album_[^>]*?>[\s\S]*?'
-        r'<a href="/album/(\d+)/[^"]*">[\s\S]*?'
+        r'<div id="favorites_album_[^>]*?>(?:(?!<div id="favorites_album_|<a href="/album/)[\s\S])*?'
+        r'<a href="/album/(\d+)/[^"]*">(?:(?!<div id="favorites_album_)[\s\S])*?'
         r'<div class="video-title title-truncate">([^<]*?)'
         r'</div>'
     )
@@ -826,24 +904,45 @@ class JmImageTool:
             cls.save_image(cls.open_image(resp.content), filepath)
 
     @classmethod
-    def save_image(cls, image: Image, filepath: str):
+    def save_image(cls, image: 'Image', filepath: str):
         """
         保存图片
 
         :param image: PIL.Image对象
         :param filepath: 保存文件路径
         """
-        image.save(filepath)
+        from .jm_metrics import JmMetrics
+        with JmMetrics.time_image_write():
+            image.save(filepath)
+
+    @classmethod
+    def image_to_bytes(cls, image: 'Image', suffix: str) -> bytes:
+        """
+        把图片编码为suffix对应的格式，返回文件内容
+
+        :param image: PIL.Image对象
+        :param suffix: 图片格式，例如 .jpg
+        """
+        from io import BytesIO
+        from PIL import Image
+        fmt = Image.registered_extensions().get(fix_suffix(suffix).lower(), None)
+        ExceptionTool.require_true(fmt is not None, f'不支持的图片格式: {suffix}')
+
+        buffer = BytesIO()
+        image.save(buffer, format=fmt)
+        return buffer.getvalue()
 
     @classmethod
     def save_directly(cls, resp, filepath):
         from common import save_resp_content
-        save_resp_content(resp, filepath)
+        from .jm_metrics import JmMetrics
+        with JmMetrics.time_image_write():
+            save_resp_content(resp, filepath)
 
     @classmethod
     def decode_and_save(cls,
                         num: int,
-                        img_src: Image,
+                        img_src: 'Image',
                         decoded_save_path: str
                         ) -> None:
         """
@@ -858,7 +957,22 @@ class JmImageTool:
             cls.save_image(img_src, decoded_save_path)
             return
 
+        from .jm_metrics import JmMetrics
+        with JmMetrics.time_image_decode():
+            img_decode = cls.decode_image(num, img_src)
+
+        # 保存到新的解密文件
+        cls.save_image(img_decode, decoded_save_path)
+
+    @classmethod
+    def decode_image(cls, num: int, img_src: 'Image') -> 'Image':
+        """
+        解密图片，返回解密后的新图片
+        :param num: 分割数
+        :param img_src: 原始图片
+        """
         import math
+        from PIL import Image
         w, h = img_src.size
 
         # 创建新的解密图片
@@ -891,12 +1005,12 @@ class JmImageTool:
             #     f'{of_file_name(decoded_save_path, trim_suffix=True)}_{i}{of_file_suffix(decoded_save_path)}'
             # ))
 
-        # 保存到新的解密文件
-        cls.save_image(img_decode, decoded_save_path)
+        return img_decode
 
     @classmethod
     def open_image(cls, fp: Union[str, bytes]):
         from io import BytesIO
+        from PIL import Image
         fp = fp if isinstance(fp, str) else BytesIO(fp)
         return Image.open(fp)
 
@@ -1017,3 +1131,284 @@ class JmCryptoTool:
 
         from hashlib import md5
         return md5(key.encode("utf-8")).hexdigest()
+
+
+class JmZipAppender:
+    """
+    往已有的压缩包（zip/cbz）中追加文件，不重写已有的内容
+
+    压缩包的注释（zip comment）中保存一个小索引（dict），记录压缩包里已有哪些内容，
+    下次打包时读取索引，只追加新增的部分，见 read_index / write_index。
+
+    用法:
+        with JmZipAppender(zip_path, replace_tail='ComicInfo.xml') as zf:
+            zf.write(...)
+            JmZipAppender.write_index(zf, index)
+
+    replace_tail: 压缩包中物理位置在最后的文件，追加时会被截掉，由调用方重新写入（用于更新元数据）。
+    追加过程中出现异常时，压缩包会恢复为追加前的状态。
+
+    截掉末尾文件和出错时恢复需要修改ZipFile的私有状态（start_dir、_didModify），
+    这些字段在Python 3.8 ~ 3.13的zipfile中含义一致；
+    其他版本中找不到这些字段时 supported() 返回False，read_index 也返回None，调用方会重写整个压缩包。
+    """
+
+    index_prefix = b'jmcomic-index:'
+    # ZipFile写文件时用到的私有状态，见 supported
+    private_attrs = ('start_dir', '_didModify', '_writecheck', '_lock')
+    _supported = None
+
+    def __init__(self, zip_path: str, replace_tail: Optional[str] = None, **zip_kwargs):
+        self.zip_path = zip_path
+        self.replace_tail = replace_tail
+        self.zip_kwargs = zip_kwargs
+        self.zf = None
+        # 追加开始的位置，以及该位置之后原有的数据（被截掉的文件 + 中央目录），用于出错时恢复
+        self.backup_offset = None
+        self.backup = None
+
+    def __enter__(self):
+        import zipfile
+        zf = zipfile.ZipFile(self.zip_path, 'a', **self.zip_kwargs)
+
+        try:
+            if self.replace_tail is not None and self.replace_tail in zf.NameToInfo:
+                tail = zf.NameToInfo[self.replace_tail]
+                ExceptionTool.require_true(
+                    max(zf.filelist, key=lambda info: info.header_offset) is tail,
+                    f'{self.replace_tail}不是压缩包中的最后一个文件，无法追加: {self.zip_path}',
+                )
+                zf.filelist.remove(tail)
+                del zf.NameToInfo[self.replace_tail]
+                zf.start_dir = tail.header_offset
+                zf._didModify = True
+
+            self.backup_offset = zf.start_dir
+            zf.fp.seek(self.backup_offset)
+            self.backup = zf.fp.read()
+        except BaseException:
+            zf._didModify = False
+            zf.close()
+            raise
+
+        self.zf = zf
+        return zf
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.zf.close()
+            return
+
+        # 放弃本次追加，把原有的数据写回去
+        self.zf._didModify = False
+        self.zf.close()
+        with open(self.zip_path, 'r+b') as fp:
+            fp.seek(self.backup_offset)
+            fp.write(self.backup)
+            fp.truncate()
+
+    @classmethod
+    def supported(cls) -> bool:
+        """
+        当前Python的zipfile是否有追加（以及 ZipPlugin.write_compressed_member）依赖的私有状态
+        """
+        if cls._supported is None:
+            import io
+            import zipfile
+            with zipfile.ZipFile(io.BytesIO(), 'w') as zf:
+                cls._supported = all(hasattr(zf, attr) for attr in cls.private_attrs)
+        return cls._supported
+
+    @classmethod
+    def read_index(cls, zip_path: str) -> Optional[dict]:
+        """
+        读取压缩包的索引，压缩包不存在、没有索引，或当前Python不支持追加时返回None
+        """
+        if not file_exists(zip_path) or not cls.supported():
+            return None
+
+        import zipfile
+        try:
+            with zipfile.ZipFile(zip_path) as zf:
+                comment = zf.comment
+        except (OSError, zipfile.BadZipFile):
+            return None
+
+        if not comment.startswith(cls.index_prefix):
+            return None
+
+        try:
+            index = JmModuleConfig.json_loads(comment[len(cls.index_prefix):])
+        except ValueError:
+            return None
+
+        return index if isinstance(index, dict) else None
+
+    @classmethod
+    def write_index(cls, zf, index: dict):
+        import json
+        import zipfile
+        comment = cls.index_prefix + json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        # zip注释最长65535字节，放不下时不写索引，下次打包时重写整个压缩包
+        zf.comment = comment if len(comment) <= zipfile.ZIP_MAX_COMMENT else b''
+
+    @staticmethod
+    def is_prefix(old: list, new: list) -> bool:
+        """
+        压缩包已有的内容是否是新内容的前缀，是则可以只追加，否则顺序变了，需要重写
+        """
+        return len(old) <= len(new) and new[:len(old)] == old
+
+
+class JmPdfWriter:
+    """
+    流式写pdf，每添加一页就把这一页的对象写入文件，内存中只保留对象的偏移量，
+    和 img2pdf.convert 在内存中生成整个pdf相比，页数再多内存占用也是固定的。
+
+    jpg图片直接嵌入（DCTDecode），不重新编码；其他格式的图片解码后用zlib无损压缩（FlateDecode）。
+
+    用法:
+        with JmPdfWriter(pdf_path) as writer:
+            for img_path in img_path_ls:
+                writer.add_image(img_path)
+    """
+
+    # 图片没有dpi信息时使用的dpi，和img2pdf一致
+    default_dpi = 96
+
+    def __init__(self, pdf_path: str):
+        self.fp = open(pdf_path, 'wb')
+        # 对象号 -> 在文件中的偏移量，下标0是xref的空闲对象
+        self.offsets: List[int] = [0]
+        self.page_obj_ids: List[int] = []
+
+        self.fp.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        # 1: Catalog，2: Pages（在close时写入，此时才知道所有页）
+        self.catalog_id = self.reserve_obj()
+        self.pages_id = self.reserve_obj()
+        self.write_obj(self.catalog_id, b'<< /Type /Catalog /Pages %d 0 R >>' % self.pages_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.fp.close()
+
+    def reserve_obj(self) -> int:
+        self.offsets.append(0)
+        return len(self.offsets) - 1
+
+    def write_obj(self, obj_id: int, body: bytes, stream: Optional[bytes] = None):
+        self.offsets[obj_id] = self.fp.tell()
+        self.fp.write(b'%d 0 obj\n' % obj_id)
+        self.fp.write(body)
+        if stream is not None:
+            self.fp.write(b'\nstream\n')
+            self.fp.write(stream)
+            self.fp.write(b'\nendstream')
+        self.fp.write(b'\nendobj\n')
+
+    def add_image(self, img_path: str):
+        self.add_page(*self.encode_page(img_path))
+
+    def add_page(self, page: dict, data: bytes):
+        """
+        :param page: encode_page 返回的页面信息
+        :param data: 图片数据
+        """
+        image_id, content_id, page_id = self.reserve_obj(), self.reserve_obj(), self.reserve_obj()
+        width, height = page['width'], page['height']
+
+        image_dict = '<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /%s ' \
+                     '/BitsPerComponent 8 /Filter /%s /Length %d >>' \
+                     % (width, height, page['colorspace'], page['filter'], len(data))
+        self.write_obj(image_id, image_dict.encode('ascii'), data)
+
+        content = ('q %.4f 0 0 %.4f 0 0 cm /Im0 Do Q' % (page['pt_width'], page['pt_height'])).encode('ascii')
+        self.write_obj(content_id, b'<< /Length %d >>' % len(content), content)
+
+        page_dict = '<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.4f %.4f] ' \
+                    '/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>' \
+                    % (self.pages_id, page['pt_width'], page['pt_height'], image_id, content_id)
+        self.write_obj(page_id, page_dict.encode('ascii'))
+        self.page_obj_ids.append(page_id)
+
+    def close(self):
+        if len(self.page_obj_ids) == 0:
+            # 没有页面的pdf不是有效的文档，和 img2pdf.convert([]) 一样报错
+            self.fp.close()
+            os.remove(self.fp.name)
+            ExceptionTool.raises(f'pdf没有任何页面: {self.fp.name}')
+
+        kids = ' '.join('%d 0 R' % page_id for page_id in self.page_obj_ids)
+        self.write_obj(self.pages_id,
+                       ('<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_obj_ids))).encode('ascii'))
+
+        xref_offset = self.fp.tell()
+        self.fp.write(b'xref\n0 %d\n' % len(self.offsets))
+        self.fp.write(b'0000000000 65535 f \n')
+        for offset in self.offsets[1:]:
+            self.fp.write(b'%010d 00000 n \n' % offset)
+        self.fp.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                      % (len(self.offsets), self.catalog_id, xref_offset))
+        self.fp.close()
+
+    @classmethod
+    def encode_page(cls, img_path: str) -> Tuple[dict, bytes]:
+        """
+        读取图片，返回 (页面信息, 写入pdf的图片数据)
+        """
+        from PIL import Image
+        import zlib
+
+        with Image.open(img_path) as image:
+            dpi = image.info.get('dpi', None) or (cls.default_dpi, cls.default_dpi)
+            dpi_x, dpi_y = (float(d) or cls.default_dpi for d in dpi)
+            page = {
+                'width': image.width,
+                'height': image.height,
+                'pt_width': image.width * 72 / dpi_x,
+                'pt_height': image.height * 72 / dpi_y,
+            }
+
+            if image.format == 'JPEG' and image.mode in ('RGB', 'L'):
+                page['filter'] = 'DCTDecode'
+                page['colorspace'] = 'DeviceRGB' if image.mode == 'RGB' else 'DeviceGray'
+                with open(img_path, 'rb') as f:
+                    return page, f.read()
+
+            image = image.convert('L' if image.mode in ('1', 'L') else 'RGB')
+            page['filter'] = 'FlateDecode'
+            page['colorspace'] = 'DeviceRGB' if image.mode == 'RGB' else 'DeviceGray'
+            return page, zlib.compress(image.tobytes())
+
+    @classmethod
+    def encode_pages_to_file(cls, img_path_ls: List[str], record_path: str) -> str:
+        """
+        把一组图片编码后写入临时文件，在子进程中执行，见 add_pages_from_file
+        """
+        import json
+        with open(record_path, 'wb') as f:
+            for img_path in img_path_ls:
+                page, data = cls.encode_page(img_path)
+                page['length'] = len(data)
+                f.write(json.dumps(page).encode('ascii') + b'\n')
+                f.write(data)
+        return record_path
+
+    def add_pages_from_file(self, record_path: str):
+        """
+        把 encode_pages_to_file 写入的页依次添加到pdf，每次只读一页
+        """
+        import json
+        with open(record_path, 'rb') as f:
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                page = json.loads(line)
+                self.add_page(page, f.read(page['length']))
@@ -14,7 +14,7 @@ from datetime import datetime
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 import uvicorn
 
@@ -73,7 +73,7 @@ terminal_outputs: Dict[str, List[str]] = {}
 PROJECT_ROOT = Path(__file__).parent.parent.parent.parent
 sys.path.insert(0, str(PROJECT_ROOT / "src"))
 
-from jmcomic import JmModuleConfig, JmOption
+from jmcomic import JmModuleConfig, JmOption, JmMetrics
 from jmcomic.api import (
     download_album,
     download_photo,
@@ -422,6 +422,49 @@ async def get_terminal_output(task_id: str):
     return {"output": terminal_outputs[task_id]}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """下载核心的运行指标，Prometheus文本格式
+    """
+    return PlainTextResponse(JmMetrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/debug/profile")
+async def profile_server(seconds: float = 10, interval: float = 0.005):
+    """对运行中的服务采样seconds秒，返回折叠栈文本，可用 flamegraph.pl 或 speedscope.app 查看
+    """
+    from jmcomic.jm_profiler import JmSamplingProfiler
+
+    if not 0 < seconds <= 300:
+        raise HTTPException(status_code=400, detail="seconds 必须在 (0, 300] 之间")
+    if not 0.001 <= interval <= 1:
+        raise HTTPException(status_code=400, detail="interval 必须在 [0.001, 1] 之间")
+
+    loop = asyncio.get_running_loop()
+    profiler = await loop.run_in_executor(None, JmSamplingProfiler.profile_for, seconds, interval)
+    return PlainTextResponse(profiler.collapsed())
+
+
+last_memory_snapshot = None
+
+
+@app.get("/api/debug/memory")
+async def memory_snapshot(limit: int = 20):
+    """内存快照，第一次调用开启tracemalloc，之后每次调用返回与上一次快照相比增长最多的位置
+    """
+    global last_memory_snapshot
+    from jmcomic.jm_profiler import JmMemoryTracker
+
+    snapshot = JmMemoryTracker.take_snapshot()
+    result = {
+        "structures": JmMemoryTracker.structure_sizes(),
+        "top": JmMemoryTracker.top(snapshot, limit),
+        "diff": [] if last_memory_snapshot is None else JmMemoryTracker.diff(last_memory_snapshot, snapshot, limit),
+    }
+    last_memory_snapshot = snapshot
+    return result
+
+
 @app.post("/api/shutdown")
 async def shutdown():
     """停止服务